@@ -0,0 +1,588 @@
+import argparse
+import copy
+import importlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from itertools import combinations
+from os.path import join
+
+import main
+import random_agent
+from bitboard import GameState
+from classes import Player
+
+# Stored node counts of the perft command (the rules engines must match them)
+PERFT_REFERENCE_PATH = join(main.path, "perft.json")
+
+parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King - benchmarks")
+subparsers = parser.add_subparsers(dest='command', required=True)
+
+ordering_parser = subparsers.add_parser('ordering', help="nodes per decision of minimax with and without move ordering")
+ordering_parser.add_argument('--agent', type=str, help="minimax agent to benchmark", default='mini_max')
+ordering_parser.add_argument('-n', '--boards', type=int, help="number of seeded boards", default=5)
+ordering_parser.add_argument('--seed', type=int, help="seed of the first board (board i uses seed + i)", default=0)
+ordering_parser.add_argument('--plies', type=int, help="number of positions of every board (first plies of a random game)", default=4)
+ordering_parser.add_argument('-d', '--depth', type=int, help="search depth", default=4)
+
+parallel_parser = subparsers.add_parser('parallel', help="speedup of the parallel search from 1 to N processes")
+parallel_parser.add_argument('--agent', type=str, help="minimax or MCTS agent to benchmark", default='mini_max')
+parallel_parser.add_argument('-w', '--workers', type=int, help="highest number of processes", default=os.cpu_count())
+parallel_parser.add_argument('-n', '--boards', type=int, help="number of seeded boards", default=3)
+parallel_parser.add_argument('--seed', type=int, help="seed of the first board (board i uses seed + i)", default=0)
+parallel_parser.add_argument('--plies', type=int, help="number of positions of every board (first plies of a random game)", default=2)
+parallel_parser.add_argument('-d', '--depth', type=int, help="search depth (minimax agents)", default=5)
+parallel_parser.add_argument('-t', '--time', type=float, help="search time of every position in seconds (MCTS agents)", default=2.0)
+
+perft_parser = subparsers.add_parser('perft', help="leaf nodes to a depth (with the companion moves) and nodes per second of the rules engines")
+perft_parser.add_argument('-n', '--boards', type=int, help="number of seeded boards (plus boards/screenshot.json)", default=3)
+perft_parser.add_argument('--seed', type=int, help="seed of the first board (board i uses seed + i)", default=0)
+perft_parser.add_argument('-d', '--depth', type=int, help="perft depth", default=3)
+perft_parser.add_argument('--engines', type=str, nargs='+', choices=['main', 'agent', 'bitboard'], help="engines to run (default: all)", default=None)
+perft_parser.add_argument('--update', action='store_true', help="store the node counts as the new reference values")
+
+startup_parser = subparsers.add_parser('startup', help="startup time of new processes with and without the graphics")
+startup_parser.add_argument('-r', '--runs', type=int, help="number of runs of every command", default=5)
+
+class PositionRecorder:
+    '''
+    This class is an agent that plays random moves and records the positions it is asked to move in.
+    '''
+
+    def __init__(self, limit):
+        '''
+        This function initializes the recorder.
+
+        Parameters:
+            limit (int): number of positions to record
+        '''
+
+        self.limit = limit
+        self.positions = []
+
+    def get_move(self, cards, player1, player2, companion_cards, choose_companion):
+        '''
+        This function records the position and returns a random move.
+        '''
+
+        if len(self.positions) < self.limit:
+            self.positions.append(copy.deepcopy((cards, player1, player2, companion_cards, choose_companion)))
+
+        return random_agent.get_move(cards, player1, player2, companion_cards, choose_companion)
+
+def make_positions(boards, seed, plies):
+    '''
+    This function makes the benchmark positions: the first plies of random games on seeded boards.
+
+    Parameters:
+        boards (int): number of boards
+        seed (int): seed of the first board
+        plies (int): number of positions of every board
+
+    Returns:
+        positions (list): list of (cards, player1, player2, companion_cards, choose_companion) tuples
+    '''
+
+    positions = []
+
+    for board in range(boards):
+        recorder = PositionRecorder(plies)
+        main.play_game(recorder, recorder, seed=seed + board)
+        positions.extend(recorder.positions)
+
+    return positions
+
+class NodeCounter:
+    '''
+    This class counts the nodes of a minimax agent's search by counting the calls of its minimax function.
+    '''
+
+    def __init__(self, agent):
+        '''
+        This function initializes the counter.
+
+        Parameters:
+            agent (module): the minimax agent
+        '''
+
+        self.agent = agent
+        self.minimax = agent.minimax
+        self.nodes = 0
+
+    def __enter__(self):
+        def counted_minimax(*args, **kwargs):
+            self.nodes += 1
+            return self.minimax(*args, **kwargs)
+
+        # The recursive calls look the function up in the module, so they are counted too
+        self.agent.minimax = counted_minimax
+
+        return self
+
+    def __exit__(self, *exception):
+        self.agent.minimax = self.minimax
+
+def search(agent, position, depth, use_table, use_orderer):
+    '''
+    This function searches a position to a fixed depth. With the table the search is iterative
+    deepening (depth 1 to depth), so every depth starts with the best moves of the previous one.
+
+    Parameters:
+        agent (module): the minimax agent
+        position (tuple): cards, player1, player2, companion_cards and choose_companion
+        depth (int): search depth
+        use_table (bool): use a transposition table
+        use_orderer (bool): use the move ordering (killers, history and captures)
+
+    Returns:
+        score (float): score of the position
+    '''
+
+    cards, player1, player2, companion_cards, choose_companion = copy.deepcopy(position)
+
+    table = agent.TranspositionTable() if use_table else None
+    hasher = agent.ZobristHasher(cards, player1, player2, companion_cards) if use_table else None
+    orderer = agent.MoveOrderer() if use_orderer else None
+
+    for iteration in range(1 if use_table else depth, depth + 1):
+        score, _ = agent.minimax(cards, player1, player2, companion_cards, choose_companion,
+                                 iteration, float("-inf"), float("inf"), True, [],
+                                 hasher, table, None, orderer)
+
+    return score
+
+def benchmark_ordering(args):
+    '''
+    This function compares the nodes per decision of plain alpha-beta, alpha-beta with a
+    transposition table, and alpha-beta with the table and the move ordering.
+
+    Parameters:
+        args (Namespace): command line arguments
+    '''
+
+    agent = importlib.import_module(args.agent)
+    positions = make_positions(args.boards, args.seed, args.plies)
+
+    configurations = [('alpha-beta', False, False), ('+ table', True, False), ('+ table + ordering', True, True)]
+    scores = {}
+
+    print(f"{len(positions)} positions, depth {args.depth}\n")
+    print(f"{'Search':<20} {'Nodes':>12} {'Nodes/decision':>15} {'Time (s)':>9} {'Nodes/s':>10}")
+
+    for name, use_table, use_orderer in configurations:
+        with NodeCounter(agent) as counter:
+            start_time = time.perf_counter()
+            scores[name] = [search(agent, position, args.depth, use_table, use_orderer) for position in positions]
+            elapsed = time.perf_counter() - start_time
+
+        print(f"{name:<20} {counter.nodes:>12} {counter.nodes / len(positions):>15.0f} {elapsed:>9.2f} {counter.nodes / elapsed:>10.0f}")
+
+    # Ordering changes the number of nodes, not the result
+    for name, _, _ in configurations[1:]:
+        different = sum(score != expected for score, expected in zip(scores[name], scores['alpha-beta']))
+
+        if different:
+            print(f"\n{name}: {different} positions with a different score than plain alpha-beta")
+
+def worker_counts(workers):
+    '''
+    This function gets the numbers of processes to benchmark: 1, 2, 4, ... and the highest number.
+
+    Parameters:
+        workers (int): highest number of processes
+
+    Returns:
+        counts (list): numbers of processes
+    '''
+
+    counts = []
+    count = 1
+
+    while count < workers:
+        counts.append(count)
+        count *= 2
+
+    return counts + [workers]
+
+def benchmark_parallel(args):
+    '''
+    This function compares the parallel search of an agent with 1 to N processes. A minimax
+    agent searches every position to a fixed depth (speedup of the time), an MCTS agent
+    searches every position for a fixed time (speedup of the iterations).
+
+    Parameters:
+        args (Namespace): command line arguments
+    '''
+
+    agent = importlib.import_module(args.agent)
+    positions = make_positions(args.boards, args.seed, args.plies)
+    is_mcts = hasattr(agent, 'search_tree')
+
+    if is_mcts:
+        print(f"{len(positions)} positions, {args.time} s each\n")
+        print(f"{'Processes':>9} {'Iterations':>11} {'Iterations/s':>13} {'Speedup':>8}")
+
+    else:
+        print(f"{len(positions)} positions, depth {args.depth}\n")
+        print(f"{'Processes':>9} {'Time (s)':>9} {'Speedup':>8}")
+
+    baseline = None
+
+    for workers in worker_counts(args.workers):
+        agent.WORKERS = workers
+
+        if is_mcts:
+            iterations = 0
+
+            for cards, player1, player2, companion_cards, choose_companion in positions:
+                state = GameState.from_cards(cards, companion_cards, player1, player2, 1, choose_companion)
+                iterations += agent.search(state, time.perf_counter() + args.time)[1]
+
+            rate = iterations / (args.time * len(positions))
+            baseline = baseline or rate
+
+            print(f"{workers:>9} {iterations:>11} {rate:>13.0f} {rate / baseline:>8.2f}")
+
+        else:
+            # Start every run with an empty table (the processes of the pool get a copy of it)
+            # and start the processes before the clock
+            agent.transposition_table.clear()
+
+            if workers > 1:
+                agent.get_search_pool()
+
+            start_time = time.perf_counter()
+
+            for position in positions:
+                agent.search(*copy.deepcopy(position), True, None, args.depth)
+
+            elapsed = time.perf_counter() - start_time
+            baseline = baseline or elapsed
+
+            print(f"{workers:>9} {elapsed:>9.2f} {baseline / elapsed:>8.2f}")
+
+    agent.close_search_pool()
+
+def perft_companion_moves(cards, companion_cards):
+    '''
+    This function generates every valid companion move of main.py's rules (main.py
+    only validates the moves of the agents, so the moves are made here in the same
+    way as GameState.get_companion_moves).
+
+    Parameters:
+        cards (list): list of Card objects
+        companion_cards (dict): dictionary of companion cards
+
+    Returns:
+        moves (list): list of companion moves
+    '''
+
+    moves = []
+
+    locations = sorted(card.get_location() for card in cards if card.get_name() != 'Varys')
+    locations_with_varys = sorted(card.get_location() for card in cards) # Ramsay can swap Varys
+
+    for companion in companion_cards:
+        if companion in ('Jon', 'Sandor'):
+            moves.extend([companion, location] for location in locations)
+
+        elif companion in ('Gendry', 'Melisandre'):
+            moves.append([companion])
+
+        elif companion == 'Ramsay':
+            moves.extend([companion, first, second] for first, second in combinations(locations_with_varys, 2))
+
+        elif companion == 'Jaqen':
+            others = [other for other in companion_cards if other != 'Jaqen']
+
+            for first, second in combinations(locations, 2):
+                moves.extend([companion, first, second, other] for other in others)
+
+    return moves
+
+def perft_main(cards, player1, player2, companion_cards, turn, choose_companion, selected_house, depth):
+    '''
+    This function counts the leaf nodes to a depth with the rules of main.py (the turn
+    loop of main.play_game on copies of the state).
+
+    Parameters:
+        cards (list): list of Card objects
+        player1 (Player): player 1
+        player2 (Player): player 2
+        companion_cards (dict): dictionary of companion cards
+        turn (int): player to move
+        choose_companion (bool): flag to choose a companion card
+        selected_house (str/None): house of the last normal move
+        depth (int): remaining depth
+
+    Returns:
+        nodes (int): number of leaf nodes
+    '''
+
+    if depth == 0:
+        return 1
+
+    moves = perft_companion_moves(cards, companion_cards) if choose_companion else main.get_possible_moves(cards)
+    nodes = 0
+
+    for move in moves:
+        child_cards, child_player1, child_player2, child_companions = copy.deepcopy((cards, player1, player2, companion_cards))
+        player = child_player1 if turn == 1 else child_player2
+
+        child_turn, child_choose, child_house = 3 - turn, False, selected_house
+
+        if choose_companion:
+            del child_companions[move[0]]
+
+            is_house = main.make_companion_move(child_cards, child_companions, move, player)
+            main.remove_unusable_companion_cards(child_cards, child_companions)
+            main.set_banners(child_player1, child_player2, is_house if is_house is not None else selected_house, turn)
+
+            # Melisandre gives the player another turn
+            if move[0] == 'Melisandre':
+                child_turn = turn
+
+        else:
+            child_house = main.make_move(child_cards, move, player)
+            main.remove_unusable_companion_cards(child_cards, child_companions)
+            main.set_banners(child_player1, child_player2, child_house, turn)
+
+            if main.house_card_count(child_cards, child_house) == 0 and len(child_companions) != 0:
+                child_turn, child_choose = turn, True
+
+        nodes += perft_main(child_cards, child_player1, child_player2, child_companions,
+                            child_turn, child_choose, child_house, depth - 1)
+
+    return nodes
+
+def perft_agent(agent, cards, player1, player2, companion_cards, choose_companion, maximizing_player, depth, undo_stack):
+    '''
+    This function counts the leaf nodes to a depth with the helper rules of a minimax
+    agent (the moves and the make/undo functions its search uses).
+
+    Parameters:
+        agent (module): the minimax agent
+        cards (list): list of Card objects (changed and restored)
+        player1 (Player): player 1
+        player2 (Player): player 2
+        companion_cards (dict): dictionary of companion cards
+        choose_companion (bool): flag to choose a companion card
+        maximizing_player (bool): True if player 1 moves
+        depth (int): remaining depth
+        undo_stack (list): undo records of the moves made
+
+    Returns:
+        nodes (int): number of leaf nodes
+    '''
+
+    if depth == 0:
+        return 1
+
+    moves = agent.get_companion_moves(cards, companion_cards) if choose_companion else agent.get_valid_moves(cards)
+    current_player = player1 if maximizing_player else player2
+    nodes = 0
+
+    for move in moves:
+        next_choose_companion = agent.make_search_move(cards, companion_cards, move, choose_companion, current_player, undo_stack)
+        nodes += perft_agent(agent, cards, player1, player2, companion_cards, next_choose_companion,
+                             not maximizing_player, depth - 1, undo_stack)
+        agent.undo_move(cards, companion_cards, undo_stack)
+
+    return nodes
+
+def perft_bitboard(state, depth):
+    '''
+    This function counts the leaf nodes to a depth with the bitboard game state.
+
+    Parameters:
+        state (GameState): state of the game
+        depth (int): remaining depth
+
+    Returns:
+        nodes (int): number of leaf nodes
+    '''
+
+    if depth == 0:
+        return 1
+
+    nodes = 0
+
+    for move in state.get_legal_moves():
+        child = state.copy()
+        child.play(move)
+        nodes += perft_bitboard(child, depth - 1)
+
+    return nodes
+
+def run_perft(engine, cards, companion_cards, depth):
+    '''
+    This function runs perft from the start of a board with an engine.
+
+    Parameters:
+        engine (str): main, agent or bitboard
+        cards (list): list of Card objects
+        companion_cards (dict): dictionary of companion cards
+        depth (int): perft depth
+
+    Returns:
+        nodes (int): number of leaf nodes
+    '''
+
+    cards, companion_cards = copy.deepcopy((cards, companion_cards))
+    player1, player2 = Player('player1'), Player('player2')
+
+    if engine == 'main':
+        return perft_main(cards, player1, player2, companion_cards, 1, False, None, depth)
+
+    elif engine == 'agent':
+        return perft_agent(importlib.import_module('mini_max'), cards, player1, player2, companion_cards, False, True, depth, [])
+
+    return perft_bitboard(GameState.from_cards(cards, companion_cards, player1, player2), depth)
+
+# Engines of the perft command and the rules they follow (engines with the same rules must
+# count the same nodes; the agents' helper rules skip Melisandre's extra turn and the unusable
+# companion cards, so they have their own reference values)
+PERFT_ENGINES = {'main': 'game', 'agent': 'agent', 'bitboard': 'game'}
+
+def perft_boards(boards, seed):
+    '''
+    This function makes the boards of the perft command: seeded random boards and boards/screenshot.json.
+
+    Parameters:
+        boards (int): number of seeded boards
+        seed (int): seed of the first board
+
+    Returns:
+        boards (list): list of (name, cards, companion_cards) tuples
+    '''
+
+    perft_boards = []
+
+    for board in range(boards):
+        random.seed(seed + board)
+        perft_boards.append((f"seed {seed + board}", *main.make_board()))
+
+    perft_boards.append(("screenshot", *main.load_board('screenshot')))
+
+    return perft_boards
+
+def benchmark_perft(args):
+    '''
+    This function counts the leaf nodes of every board to a depth with every rules engine,
+    prints their nodes per second, and checks the counts against the stored reference values.
+
+    Parameters:
+        args (Namespace): command line arguments
+    '''
+
+    engines = args.engines or list(PERFT_ENGINES)
+    boards = perft_boards(args.boards, args.seed)
+
+    reference = {}
+
+    if os.path.exists(PERFT_REFERENCE_PATH):
+        with open(PERFT_REFERENCE_PATH, 'r') as file:
+            reference = json.load(file)
+
+    print(f"{len(boards)} boards, depth {args.depth}\n")
+    print(f"{'Engine':<10} {'Board':<12} {'Nodes':>10} {'Time (s)':>9} {'Nodes/s':>10}  Reference")
+
+    failures = []
+
+    for engine in engines:
+        rules = PERFT_ENGINES[engine]
+        total_nodes = total_time = 0
+
+        for name, cards, companion_cards in boards:
+            start_time = time.perf_counter()
+            nodes = run_perft(engine, cards, companion_cards, args.depth)
+            elapsed = time.perf_counter() - start_time
+
+            total_nodes += nodes
+            total_time += elapsed
+
+            counts = reference.setdefault(rules, {}).setdefault(name, {})
+            expected = counts.get(str(args.depth))
+
+            if args.update:
+                counts[str(args.depth)] = nodes
+                status = "stored"
+
+            elif expected is None:
+                status = "none"
+
+            elif nodes == expected:
+                status = "ok"
+
+            else:
+                status = f"FAIL (expected {expected})"
+                failures.append(f"{engine} on {name}: {nodes} nodes, expected {expected}")
+
+            print(f"{engine:<10} {name:<12} {nodes:>10} {elapsed:>9.2f} {nodes / elapsed:>10.0f}  {status}")
+
+        print(f"{engine:<10} {'total':<12} {total_nodes:>10} {total_time:>9.2f} {total_nodes / total_time:>10.0f}\n")
+
+    if args.update:
+        with open(PERFT_REFERENCE_PATH, 'w') as file:
+            json.dump(reference, file, indent=4)
+
+    if failures:
+        sys.exit("Node counts differ from the reference values:\n" + "\n".join(failures))
+
+# Commands of the startup benchmark: the imports of a process and a headless game, without the
+# graphics (as main.py loads them now) and with them (as every process loaded them before)
+STARTUP_GAME = "main.main(main.parser.parse_args(['--headless', '--player1', 'random_agent', '--player2', 'random_agent', '--seed', '0']))"
+STARTUP_COMMANDS = [('import main', "import main"),
+                    ('import main + graphics', "import main, pygraphics"),
+                    ('headless game', "import main; " + STARTUP_GAME),
+                    ('headless game + graphics', "import main, pygraphics; " + STARTUP_GAME)]
+
+def run_startup(code):
+    '''
+    This function runs Python code in a new process.
+
+    Parameters:
+        code (str): the code
+
+    Returns:
+        elapsed (float): time of the process in seconds
+        pygame (bool): True if the process imported pygame
+    '''
+
+    code += "; import sys; print('pygame' in sys.modules)"
+
+    start_time = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', code], cwd=main.path, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start_time
+
+    return elapsed, process.stdout.split()[-1] == 'True'
+
+def benchmark_startup(args):
+    '''
+    This function compares the startup time of new processes with and without the graphics
+    (pygame is only imported by main.py when a window is opened).
+
+    Parameters:
+        args (Namespace): command line arguments
+    '''
+
+    print(f"{args.runs} runs of every command\n")
+    print(f"{'Command':<26} {'Min (s)':>8} {'Median (s)':>11} {'pygame':>7}")
+
+    for name, code in STARTUP_COMMANDS:
+        runs = [run_startup(code) for _ in range(args.runs)]
+        times = [elapsed for elapsed, _ in runs]
+
+        print(f"{name:<26} {min(times):>8.3f} {statistics.median(times):>11.3f} {'yes' if runs[0][1] else 'no':>7}")
+
+COMMANDS = {'ordering': benchmark_ordering, 'parallel': benchmark_parallel, 'perft': benchmark_perft,
+            'startup': benchmark_startup}
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    COMMANDS[args.command](args)
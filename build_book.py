@@ -0,0 +1,172 @@
+import argparse
+import concurrent.futures
+import copy
+import importlib
+import os
+import random
+import time
+
+import main
+from bitboard import GameState
+from classes import Player
+from opening_book import OpeningBook, BOOK_PATH
+
+parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King - opening book builder")
+parser.add_argument('-n', '--boards', type=int, help="number of seeded boards (the boards of tournament.py with the same seed)", default=100)
+parser.add_argument('--seed', type=int, help="seed of the first board (board i uses seed + i)", default=0)
+parser.add_argument('-p', '--plies', type=int, help="number of plies of every board in the book (1 for the first move only)", default=2)
+parser.add_argument('-t', '--time', type=float, help="search time of every position in seconds", default=60.0)
+parser.add_argument('-d', '--depth', type=int, help="highest search depth (default: as deep as the time allows)", default=None)
+parser.add_argument('--agent', type=str, help="minimax agent that searches the positions", default='mini_max')
+parser.add_argument('-w', '--workers', type=int, help="number of worker processes", default=os.cpu_count())
+parser.add_argument('-o', '--output', type=str, help="file of the book (new moves are added to it)", default=BOOK_PATH)
+
+def book_positions(cards, companion_cards, plies):
+    '''
+    This function finds the positions of the first plies of a board with the rules of
+    main.py (the turn loop of main.play_game on copies of the state).
+
+    Parameters:
+        cards (list): list of Card objects of the initial board
+        companion_cards (dict): dictionary of companion cards
+        plies (int): number of plies (1 for the initial position only)
+
+    Returns:
+        positions (list): list of (cards, player1, player2, companion_cards, turn, choose_companion) tuples
+    '''
+
+    positions = []
+    frontier = [(cards, Player('player1'), Player('player2'), companion_cards, 1, False, None)]
+
+    for ply in range(plies):
+        next_frontier = []
+
+        for position in frontier:
+            cards, player1, player2, companion_cards, turn, choose_companion, selected_house = position
+
+            if len(main.get_possible_moves(cards)) == 0 and (not choose_companion or len(companion_cards) == 0):
+                continue
+
+            positions.append(position[:6])
+
+            if ply + 1 == plies:
+                continue
+
+            if choose_companion:
+                moves = GameState.from_cards(cards, companion_cards).get_companion_moves()
+
+            else:
+                moves = main.get_possible_moves(cards)
+
+            for move in moves:
+                child_cards, child_player1, child_player2, child_companions = copy.deepcopy((cards, player1, player2, companion_cards))
+                player = child_player1 if turn == 1 else child_player2
+
+                child_turn, child_choose, child_house = 3 - turn, False, selected_house
+
+                if choose_companion:
+                    del child_companions[move[0]]
+
+                    is_house = main.make_companion_move(child_cards, child_companions, move, player)
+                    main.remove_unusable_companion_cards(child_cards, child_companions)
+                    main.set_banners(child_player1, child_player2, is_house if is_house is not None else selected_house, turn)
+
+                    # Melisandre gives the player another turn
+                    if move[0] == 'Melisandre':
+                        child_turn = turn
+
+                else:
+                    child_house = main.make_move(child_cards, move, player)
+                    main.remove_unusable_companion_cards(child_cards, child_companions)
+                    main.set_banners(child_player1, child_player2, child_house, turn)
+
+                    if main.house_card_count(child_cards, child_house) == 0 and len(child_companions) != 0:
+                        child_turn, child_choose = turn, True
+
+                next_frontier.append((child_cards, child_player1, child_player2, child_companions,
+                                      child_turn, child_choose, child_house))
+
+        frontier = next_frontier
+
+    return positions
+
+def search_position(agent, position, search_time, depth):
+    '''
+    This function searches a position of the book (in a worker process).
+
+    Parameters:
+        agent (str): name of the minimax agent
+        position (tuple): cards, player1, player2, companion_cards, turn and choose_companion
+        search_time (float): search time in seconds
+        depth (int/None): highest search depth
+
+    Returns:
+        move (int/list): best move
+        depth (int): depth of the deepest search that finished
+    '''
+
+    agent = importlib.import_module(agent)
+
+    cards, player1, player2, companion_cards, turn, choose_companion = position
+
+    return agent.search(cards, player1, player2, companion_cards, choose_companion, turn == 1,
+                        time.perf_counter() + search_time, depth)
+
+def build_book(boards=100, seed=0, plies=2, search_time=60.0, depth=None, agent='mini_max', workers=None, output=BOOK_PATH):
+    '''
+    This function searches the first positions of the seeded boards on a process pool
+    and adds their best moves to the book (saved after every position, so an
+    interrupted build keeps its moves).
+
+    Parameters:
+        boards (int): number of seeded boards
+        seed (int): seed of the first board
+        plies (int): number of plies of every board
+        search_time (float): search time of every position in seconds
+        depth (int/None): highest search depth
+        agent (str): name of the minimax agent
+        workers (int/None): number of worker processes (None for the number of CPUs)
+        output (str): file of the book
+
+    Returns:
+        book (OpeningBook): the book
+    '''
+
+    positions = []
+
+    for board in range(boards):
+        # The same boards as main.play_game with the seed
+        random.seed(seed + board)
+        cards, companion_cards = main.make_board()
+
+        positions.extend(book_positions(cards, companion_cards, plies))
+
+    book = OpeningBook(output)
+    book.load()
+
+    print(f"{len(positions)} positions of {boards} boards, {search_time:g} s each")
+
+    start_time = time.perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(search_position, agent, position, search_time, depth): position for position in positions}
+
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            cards, player1, player2, companion_cards, turn, choose_companion = futures[future]
+            move, finished_depth = future.result()
+
+            if move is not None:
+                book.add(GameState.from_cards(cards, companion_cards, player1, player2, turn, choose_companion), move, finished_depth)
+                book.save()
+
+            # Print the progress
+            print(f"\r{done}/{len(positions)} positions", end='', flush=True)
+
+    print(f"\n{len(positions)} positions in {time.perf_counter() - start_time:.1f} s, {len(book.positions)} positions in {output}")
+
+    return book
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    build_book(args.boards, args.seed, args.plies, args.time, args.depth, args.agent, args.workers, args.output)
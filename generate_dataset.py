@@ -0,0 +1,317 @@
+import argparse
+import concurrent.futures
+import glob
+import importlib
+import itertools
+import json
+import os
+import random
+import time
+from os.path import abspath, join, dirname
+
+import numpy as np
+
+import main
+import random_agent
+from endgame import EndgameSolver
+from opening_book import OpeningBook
+from transposition import ZobristHasher
+from features import encode_states
+
+# Set the path of the file
+path = dirname(abspath(__file__))
+
+parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King - self-play dataset generator")
+parser.add_argument('-o', '--output', type=str, help="folder of the dataset (new chunks are added to it)", default=join(path, "datasets", "selfplay"))
+parser.add_argument('-n', '--games', type=int, help="number of games", default=1000)
+parser.add_argument('--seed', type=int, help="seed of the first game (game i uses seed + i)", default=0)
+parser.add_argument('--agents', type=str, nargs=2, help="AI files of player 1 and player 2", default=['gen_mini_max', 'gen_mini_max'])
+parser.add_argument('-t', '--time', type=float, help="time budget of a move of the agents in seconds", default=0.1)
+parser.add_argument('-e', '--epsilon', type=float, help="chance of a random move instead of the agent's move (for more varied positions)", default=0.1)
+parser.add_argument('--score-agent', type=str, help="minimax agent that scores the positions", default='gen_mini_max')
+parser.add_argument('-d', '--depth', type=int, help="depth of the search that scores the positions", default=3)
+parser.add_argument('-c', '--chunk', type=int, help="number of positions of a chunk file", default=100000)
+parser.add_argument('-w', '--workers', type=int, help="number of worker processes", default=os.cpu_count())
+
+# Agents of the worker process (set by init_worker)
+agents = None
+score_agent = None
+
+# Companion cards as in characters.json
+with open(join(path, "assets", "characters.json"), 'r') as file:
+    COMPANION_CARDS = json.load(file)['Companion']
+
+class ExploringAgent:
+    '''
+    This class plays the moves of an agent, and a random move with a small chance.
+    Both players of a game have the same agent name, so the engine gives the agent
+    its player (see set_turn).
+    '''
+
+    def __init__(self, agent, epsilon):
+        '''
+        This function initializes the agent.
+
+        Parameters:
+            agent (module): the agent
+            epsilon (float): chance of a random move
+        '''
+
+        self.agent = agent
+        self.epsilon = epsilon
+        self.turn = None # Player of the next move (given by the engine)
+
+    def set_turn(self, turn):
+        '''
+        This function sets the player of the next move (called by the game engine before get_move).
+
+        Parameters:
+            turn (int): player of the agent (1 or 2)
+        '''
+
+        self.turn = turn
+
+    def get_move(self, cards, player1, player2, companion_cards, choose_companion):
+        '''
+        This function gets the move of the agent (or a random move).
+
+        Parameters:
+            cards (list): list of Card objects
+            player1 (Player): player 1
+            player2 (Player): player 2
+            companion_cards (dict): dictionary of companion cards
+            choose_companion (bool): flag to choose a companion card
+
+        Returns:
+            move (int/list): the move
+        '''
+
+        if random.random() < self.epsilon:
+            return random_agent.get_move(cards, player1, player2, companion_cards, choose_companion)
+
+        # Give the agent its player (the names of both players are the same)
+        if self.turn is not None and hasattr(self.agent, 'set_turn'):
+            self.agent.set_turn(self.turn)
+
+        return self.agent.get_move(cards, player1, player2, companion_cards, choose_companion)
+
+def load_worker_agent(name, move_time):
+    '''
+    This function loads an agent into the worker process with the time budget of the
+    dataset, without the opening book (the openings would all be the same) and without
+    the endgame table on disk (the workers would write to it at the same time).
+
+    Parameters:
+        name (str): name of the AI file
+        move_time (float): time budget of a move in seconds
+
+    Returns:
+        agent (module): the agent
+    '''
+
+    agent = importlib.import_module(name)
+
+    if hasattr(agent, 'TIME_BUDGET'):
+        agent.TIME_BUDGET = move_time
+
+    if hasattr(agent, 'WORKERS'):
+        agent.WORKERS = 1
+
+    if hasattr(agent, 'opening_book'):
+        agent.opening_book = OpeningBook(None)
+
+    if hasattr(agent, 'endgame_solver'):
+        agent.endgame_solver = EndgameSolver(None)
+
+    return agent
+
+def init_worker(agent_names, move_time, epsilon, score_name):
+    '''
+    This function loads the agents of a worker process.
+
+    Parameters:
+        agent_names (list): AI files of player 1 and player 2
+        move_time (float): time budget of a move in seconds
+        epsilon (float): chance of a random move
+        score_name (str): minimax agent that scores the positions
+    '''
+
+    global agents, score_agent
+
+    agents = [ExploringAgent(load_worker_agent(name, move_time), epsilon) for name in agent_names]
+    score_agent = importlib.import_module(score_name)
+
+def score_state(state, depth):
+    '''
+    This function scores a position with a fixed-depth search of the score agent.
+
+    Parameters:
+        state (GameState): state of the game
+        depth (int): depth of the search
+
+    Returns:
+        score (float): score of the position (positive is better for player 1)
+    '''
+
+    cards = state.to_cards()
+    player1, player2 = state.to_players()
+    companion_cards = state.get_companion_cards(COMPANION_CARDS)
+
+    score_agent.transposition_table.new_search()
+    score_agent.move_orderer.new_search()
+
+    score, _ = score_agent.minimax(cards, player1, player2, companion_cards, state.choose_companion,
+                                   depth, float("-inf"), float("inf"), state.turn == 1, [],
+                                   ZobristHasher(cards, player1, player2, companion_cards),
+                                   score_agent.transposition_table, None, score_agent.move_orderer)
+
+    return score
+
+def play_dataset_game(seed, depth):
+    '''
+    This function plays a game and labels its positions (in a worker process).
+
+    Parameters:
+        seed (int): seed of the game
+        depth (int): depth of the search that scores the positions
+
+    Returns:
+        arrays (dict): features, result (1 if player 1 won, -1 if player 2 won, 0 for
+            no winner), score (search score, positive is better for player 1), depth
+            and game (seed) of every position before the end of the game
+    '''
+
+    record = main.play_game(agents[0], agents[1], seed=seed)['record']
+
+    # The positions before every move (the position after the last move has no moves)
+    states = [record.get_start_state()] + [state.copy() for _, state in record.get_states()][:-1]
+    states = [state for state in states if not state.is_game_over()]
+
+    result = 1 if record.winner == 1 else -1 if record.winner == 2 else 0
+
+    return {'features': encode_states(states),
+            'result': np.full(len(states), result, dtype=np.int8),
+            'score': np.array([score_state(state, depth) for state in states], dtype=np.float32),
+            'depth': np.full(len(states), depth, dtype=np.int8),
+            'game': np.full(len(states), seed, dtype=np.int32)}
+
+class ChunkWriter:
+    '''
+    This class collects the positions and writes them to numbered .npz chunks, so at most
+    one chunk of positions is kept in memory. New chunks are added after the existing ones.
+    '''
+
+    def __init__(self, folder, chunk_size):
+        '''
+        This function initializes the writer.
+
+        Parameters:
+            folder (str): folder of the chunks
+            chunk_size (int): number of positions of a chunk
+        '''
+
+        os.makedirs(folder, exist_ok=True)
+
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.arrays = [] # Arrays of the games not written yet
+        self.positions = 0 # Positions not written yet
+        self.chunks = len(glob.glob(join(folder, 'chunk_*.npz'))) # Number of the next chunk
+        self.written = 0 # Positions written by this writer
+
+    def add(self, arrays):
+        '''
+        This function adds the positions of a game (a full chunk is written).
+
+        Parameters:
+            arrays (dict): arrays of the positions (see play_dataset_game)
+        '''
+
+        self.arrays.append(arrays)
+        self.positions += len(arrays['result'])
+
+        if self.positions >= self.chunk_size:
+            self.write()
+
+    def write(self):
+        '''
+        This function writes the collected positions to the next chunk (to a temporary file
+        first, so a reader never sees a part of a chunk).
+        '''
+
+        if not self.arrays:
+            return
+
+        filename = join(self.folder, f'chunk_{self.chunks:05d}.npz')
+
+        with open(filename + '.tmp', 'wb') as file:
+            np.savez_compressed(file, **{name: np.concatenate([arrays[name] for arrays in self.arrays]) for name in self.arrays[0]})
+
+        os.replace(filename + '.tmp', filename)
+
+        self.chunks += 1
+        self.written += self.positions
+        self.arrays = []
+        self.positions = 0
+
+def generate_dataset(output, games=1000, seed=0, agent_names=('gen_mini_max', 'gen_mini_max'), move_time=0.1, epsilon=0.1,
+                     score_name='gen_mini_max', depth=3, chunk_size=100000, workers=None):
+    '''
+    This function plays headless games on a process pool and streams their labeled
+    positions to the chunks of a dataset. At most two games per worker are submitted
+    at a time, so the positions of the games waiting to be written stay few.
+
+    Parameters:
+        output (str): folder of the dataset
+        games (int): number of games
+        seed (int): seed of the first game
+        agent_names (tuple): AI files of player 1 and player 2
+        move_time (float): time budget of a move in seconds
+        epsilon (float): chance of a random move
+        score_name (str): minimax agent that scores the positions
+        depth (int): depth of the search that scores the positions
+        chunk_size (int): number of positions of a chunk
+        workers (int/None): number of worker processes (None for the number of CPUs)
+
+    Returns:
+        positions (int): number of positions written
+    '''
+
+    writer = ChunkWriter(output, chunk_size)
+    start_time = time.perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                initargs=(list(agent_names), move_time, epsilon, score_name)) as executor:
+        seeds = iter(range(seed, seed + games))
+        window = 2 * (workers or os.cpu_count())
+        pending = {executor.submit(play_dataset_game, game_seed, depth) for game_seed in itertools.islice(seeds, window)}
+        done = 0
+
+        while pending:
+            finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in finished:
+                writer.add(future.result())
+                done += 1
+
+                # Submit the next game
+                game_seed = next(seeds, None)
+
+                if game_seed is not None:
+                    pending.add(executor.submit(play_dataset_game, game_seed, depth))
+
+            # Print the progress
+            positions = writer.written + writer.positions
+            print(f"\r{done}/{games} games, {positions} positions ({positions / (time.perf_counter() - start_time):.1f} positions/s)", end='', flush=True)
+
+    writer.write()
+
+    print(f"\n{writer.written} positions in {writer.chunks} chunks of {output}")
+
+    return writer.written
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    generate_dataset(args.output, args.games, args.seed, args.agents, args.time, args.epsilon, args.score_agent,
+                     args.depth, args.chunk, args.workers)
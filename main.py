@@ -1,32 +1,42 @@
 import argparse
-import importlib
-import concurrent.futures
 import random
 from os import name as os_name
 from os import system as os_system
+from os import makedirs
 from os.path import abspath, join, dirname
 import sys
 import json
 import copy
+import csv
+import time
 
 # Add the utils folder to the path
 sys.path.append(join(dirname(abspath(__file__)), "utils"))
 
-# Import the utils
-import pygraphics
+# Import the utils (pygraphics is imported by main when a window is opened,
+# so headless games, tournaments and agent workers do not load pygame)
 from classes import Card, Player
+from rules import SAME_LINE, BETWEEN
+from agent_worker import AgentWorker
+from game_record import GameRecord, save_record
 
 # Set the path of the file
 path = dirname(abspath(__file__))
 
 TIMEOUT = 10  # Time limit for the AI agent
 
+agent_workers = {} # Worker processes of the AI agents (reused between games)
+
 parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King")
 parser.add_argument('--player1', metavar='p1', type=str, help="either human or an AI file", default='human')
 parser.add_argument('--player2', metavar='p2', type=str, help="either human or an AI file", default='human')
 parser.add_argument('-l', '--load', type=str, help="file containing starting board setup (for repeatability)", default=None)
 parser.add_argument('-s', '--save', type=str, help="file to save board setup to", default=None)
 parser.add_argument('-v', '--video', type=str, help="name of the video file to save", default=None)
+parser.add_argument('--headless', action='store_true', help="play an AI vs AI game without graphics and print the result")
+parser.add_argument('--seed', type=int, help="seed of the random generator (for repeatability)", default=None)
+parser.add_argument('--stats', type=str, help="file to save the search statistics of the AI moves to (.json or .csv)", default=None)
+parser.add_argument('-r', '--record', type=str, help="file to append the record of the game to (see replay.py)", default=None)
 
 def make_board():
     '''
@@ -137,20 +147,11 @@ def get_possible_moves(cards):
     # Get the location of Varys
     varys_location = find_varys(cards)
 
-    # Get the row and column of Varys
-    varys_row, varys_col = varys_location // 6, varys_location % 6
-
-    moves = []
-
-    # Get the cards in the same row or column as Varys
-    for card in cards:
-        if card.get_name() == 'Varys':
-            continue
-
-        row, col = card.get_location() // 6, card.get_location() % 6
+    # Squares in the same row or column as Varys
+    same_line = SAME_LINE[varys_location]
 
-        if row == varys_row or col == varys_col:
-            moves.append(card.get_location())
+    # Get the cards in the same row or column as Varys (Varys himself is not on his own line)
+    moves = [card.get_location() for card in cards if same_line[card.get_location()]]
 
     return moves
 
@@ -272,65 +273,36 @@ def make_move(cards, move, player):
         house (str): house of the selected card
     '''
 
-    # Get the location of Varys
-    varys_location = find_varys(cards)
+    # Find Varys and the selected card
+    for card in cards:
+        if card.get_name() == 'Varys':
+            varys_card = card
 
-    # Find the row and column of Varys
-    varys_row, varys_col = varys_location // 6, varys_location % 6
+        elif card.get_location() == move:
+            selected_card = card
 
-    # Get the row and column of the move
-    move_row, move_col = move // 6, move % 6
+    selected_house = selected_card.get_house()
 
-    # Find the selected card
-    selected_card = find_card(cards, move)
-    
-    removing_cards = []
+    # Get the squares between Varys and the selected card
+    between = BETWEEN[varys_card.get_location()][move]
 
-    # Find the cards that should be removed
-    for i in range(len(cards)):
-        if cards[i].get_name() == 'Varys':
-            varys_index = i
-            continue
-        
-        # If the card is between Varys and the selected card and has the same house as the selected card
-        if varys_row == move_row and varys_col < move_col:
-            if cards[i].get_location() // 6 == varys_row and varys_col < cards[i].get_location() % 6 < move_col and cards[i].get_house() == selected_card.get_house():
-                removing_cards.append(cards[i])
+    # Find the cards between Varys and the selected card that have the same house as the selected card
+    removing_cards = [card for card in cards if card.get_house() == selected_house and between >> card.get_location() & 1]
 
-                # Add the card to the player's cards
-                player.add_card(cards[i])
-        
-        elif varys_row == move_row and varys_col > move_col:
-            if cards[i].get_location() // 6 == varys_row and move_col < cards[i].get_location() % 6 < varys_col and cards[i].get_house() == selected_card.get_house():
-                removing_cards.append(cards[i])
-
-                # Add the card to the player's cards
-                player.add_card(cards[i])
-        
-        elif varys_col == move_col and varys_row < move_row:
-            if cards[i].get_location() % 6 == varys_col and varys_row < cards[i].get_location() // 6 < move_row and cards[i].get_house() == selected_card.get_house():
-                removing_cards.append(cards[i])
-
-                # Add the card to the player's cards
-                player.add_card(cards[i])
-        
-        elif varys_col == move_col and varys_row > move_row:
-            if cards[i].get_location() % 6 == varys_col and move_row < cards[i].get_location() // 6 < varys_row and cards[i].get_house() == selected_card.get_house():
-                removing_cards.append(cards[i])
+    # Add the cards to the player's cards
+    for card in removing_cards:
+        player.add_card(card)
 
-                # Add the card to the player's cards
-                player.add_card(cards[i])
-    
     # Add the selected card to the player's cards
     player.add_card(selected_card)
 
     # Set the location of Varys
-    cards[varys_index].set_location(move)
-        
+    varys_card.set_location(move)
+
     # Remove the cards
     for card in removing_cards:
         cards.remove(card)
-    
+
     # Remove the selected card
     cards.remove(selected_card)
 
@@ -653,35 +625,322 @@ def validate_agent_move(cards, companion_cards, given_move):
     
     return True # All checks passed
 
-def try_get_move(agent, cards, player1, player2, companion_cards, choose_companion):
+def try_get_move(agent, cards, player1, player2, companion_cards, choose_companion, stats=None, turn=None):
     '''
     This function tries to get the move from the AI agent.
 
     Parameters:
-        agent (module): AI agent
+        agent (AgentWorker/module): AI agent (a worker process or an agent running in this process)
         cards (list): list of Card objects
         player1 (Player): player 1
         player2 (Player): player 2
         companion_cards (dict): dictionary of companion cards
         choose_companion (bool): flag to choose a companion card
+        stats (list/None): list to add the statistics of the move to (see save_stats)
+        turn (int/None): player of the agent (1 or 2), given to agents with the set_turn function
 
     Returns:
-        move (int/list): move from the AI agent
+        move (int/list): move from the AI agent (None if it did not answer in TIMEOUT seconds)
     '''
-    
-    # Try to get the move from the AI agent in TIMEOUT seconds
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(agent.get_move, copy.deepcopy(cards), copy.deepcopy(player1),
-                                 copy.deepcopy(player2), copy.deepcopy(companion_cards), choose_companion)
 
-        try:
-            move = future.result(timeout=TIMEOUT)
-        
-        except concurrent.futures.TimeoutError:
+    start_time = time.perf_counter()
+
+    if isinstance(agent, AgentWorker):
+        # The worker is killed and restarted if it does not answer in TIMEOUT seconds
+        move = agent.get_move(cards, player1, player2, companion_cards, choose_companion, TIMEOUT, turn)
+        agent_stats = agent.last_stats
+
+    else:
+        # Tell the agent its player (agents without set_turn find it from the player names)
+        if turn is not None and hasattr(agent, 'set_turn'):
+            agent.set_turn(turn)
+
+        # An agent in this process gets copies of the state and cannot be stopped,
+        # so a move that took more than TIMEOUT seconds is ignored
+        move = agent.get_move(copy.deepcopy(cards), copy.deepcopy(player1), copy.deepcopy(player2),
+                              copy.deepcopy(companion_cards), choose_companion)
+
+        if time.perf_counter() - start_time > TIMEOUT:
             move = None
-    
+
+        agent_stats = agent.get_move_stats() if hasattr(agent, 'get_move_stats') else None
+
+    if stats is not None:
+        stats.append({'move_number': len(stats) + 1,
+                      'agent': get_agent_name(agent.agent_name if isinstance(agent, AgentWorker) else agent),
+                      'cards': len(cards),
+                      'companion_cards': len(companion_cards),
+                      'choose_companion': choose_companion,
+                      'move': move,
+                      'time': round(time.perf_counter() - start_time, 4),
+                      **(agent_stats or {})})
+
     return move
-            
+
+def enable_agent_stats(agent, enabled):
+    '''
+    This function switches the search statistics of an AI agent on or off
+    (agents without the enable_stats function have no statistics).
+
+    Parameters:
+        agent (AgentWorker/module): AI agent
+        enabled (bool): True to collect the statistics of every move
+    '''
+
+    if isinstance(agent, AgentWorker):
+        agent.enable_stats(enabled)
+
+    elif hasattr(agent, 'enable_stats'):
+        agent.enable_stats(enabled)
+
+def seed_agent(agent, seed, turn):
+    '''
+    This function seeds the random generator of an AI agent in a worker process from the
+    seed of the game and the player of the agent (an agent in this process uses the
+    random generator seeded by the game).
+
+    Parameters:
+        agent (AgentWorker/module): AI agent
+        seed (int): seed of the game
+        turn (int): player of the agent (1 or 2)
+    '''
+
+    if isinstance(agent, AgentWorker):
+        agent.seed(f"{seed}:{turn}")
+
+def save_stats(stats, filename):
+    '''
+    This function saves the statistics of the AI moves of a game, one row per move.
+    A .csv file gets one column per statistic, any other file is saved as JSON.
+
+    Parameters:
+        stats (list): statistics of the moves (see try_get_move)
+        filename (str): path of the file
+    '''
+
+    makedirs(dirname(abspath(filename)), exist_ok=True)
+
+    if not filename.endswith('.csv'):
+        with open(filename, 'w') as file:
+            json.dump(stats, file, indent=4)
+
+        return
+
+    # Columns in the order they first appear (agents can have different statistics)
+    columns = list(dict.fromkeys(column for row in stats for column in row))
+
+    with open(filename, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+
+        for row in stats:
+            writer.writerow({key: json.dumps(value) if isinstance(value, (list, dict)) else value for key, value in row.items()})
+
+def load_agent(agent):
+    '''
+    This function loads an AI agent. An AI file is loaded once into a worker process
+    (reused by later games), an already loaded agent runs in this process.
+
+    Parameters:
+        agent (str/module): name of the AI file or an already loaded agent
+
+    Returns:
+        agent (AgentWorker/module): AI agent
+
+    Raises:
+        ImportError: if the AI file is not found
+        AttributeError: if the AI file does not have the get_move function
+    '''
+
+    if isinstance(agent, str):
+        if agent not in agent_workers:
+            agent_workers[agent] = AgentWorker(agent)
+
+        return agent_workers[agent]
+
+    if not hasattr(agent, 'get_move'):
+        raise AttributeError("AI file does not have the get_move function.")
+
+    return agent
+
+def get_agent_name(agent):
+    '''
+    This function gets the name of an AI agent (as stored in the Player objects).
+
+    Parameters:
+        agent (str/module): name of the AI file or an already loaded agent
+
+    Returns:
+        name (str): name of the agent
+    '''
+
+    if isinstance(agent, str):
+        return agent
+
+    return getattr(agent, '__name__', type(agent).__name__)
+
+def play_game(agent1, agent2, board=None, seed=None, stats_file=None, record_file=None):
+    '''
+    This function plays a game between two AI agents without graphics.
+    It runs the same turn loop as main, without drawing, waiting or storing frames.
+
+    Parameters:
+        agent1 (str/module): AI agent of player 1 (name of the AI file or a loaded agent)
+        agent2 (str/module): AI agent of player 2 (name of the AI file or a loaded agent)
+        board (str/list/None): name of a board file, list of Card objects, or None for a random board
+        seed (int/None): seed of the random generator (for the board and the agents)
+        stats_file (str/None): file to save the search statistics of the moves to (see save_stats)
+        record_file (str/None): file to append the record of the game to (see game_record.save_record)
+
+    Returns:
+        result (dict): result of the game with the keys
+            winner (int): 1 if player 1 wins, 2 if player 2 wins
+            agents (list): names of the agents of player 1 and player 2
+            seed (int/None): the given seed
+            banners (list): banners of player 1 and player 2 (dictionaries of houses)
+            cards (list): number of captured cards of every house for player 1 and player 2
+            moves (list): moves in order, as dictionaries of turn, move (None if the time ran out or the move
+                was not valid, with the invalid move under invalid) and time (seconds)
+            record (GameRecord): record of the game (for replays)
+    '''
+
+    if seed is not None:
+        random.seed(seed)
+
+    if board is None:
+        # Create a new board
+        cards, companion_cards = make_board()
+
+    elif isinstance(board, str):
+        # Load the board from the file
+        cards, companion_cards = load_board(board)
+
+    else:
+        # Copy the given cards, so the board can be reused
+        cards = copy.deepcopy(board)
+
+        with open(join(path, "assets", "characters.json"), 'r') as file:
+            companion_cards = json.load(file)['Companion']
+
+    # Load the agents
+    agents = {1: load_agent(agent1), 2: load_agent(agent2)}
+
+    # Collect the search statistics of the agents (the workers are reused, so switch them off otherwise)
+    stats = [] if stats_file is not None else None
+
+    for agent in agents.values():
+        enable_agent_stats(agent, stats is not None)
+
+    # Seed the agents in their worker processes
+    if seed is not None:
+        for turn, agent in agents.items():
+            seed_agent(agent, seed, turn)
+
+    # Set up the players
+    player1 = Player(get_agent_name(agent1))
+    player2 = Player(get_agent_name(agent2))
+
+    # Start the record of the game
+    record = GameRecord(cards, [player1.get_agent(), player2.get_agent()], seed)
+
+    turn = 1 # 1: player 1's turn, 2: player 2's turn
+    choose_companion = False # Set Choose Companion flag
+    selected_house = None # House of the last normal move
+    moves_made = [] # Moves of the game
+
+    while True:
+        # Get the possible moves for the player
+        moves = get_possible_moves(cards)
+
+        # Check if the player has no moves left to make
+        if (len(moves) == 0 and ((not choose_companion) or (len(companion_cards) == 0))):
+            break
+
+        # Get the move from the AI agent
+        start_time = time.perf_counter()
+        move = try_get_move(agents[turn], cards, player1, player2, companion_cards, choose_companion, stats, turn)
+        move_time = time.perf_counter() - start_time
+
+        # Check if the move is valid
+        if choose_companion:
+            valid = (isinstance(move, (list, tuple)) and len(move) > 0 and move[0] in companion_cards.keys()
+                     and validate_agent_move(cards, companion_cards, move))
+
+        else:
+            valid = move in moves
+
+        # If the move is None or not valid, change the turn (an agent that keeps giving
+        # the same invalid move would otherwise be asked again forever)
+        if not valid:
+            moves_made.append({'turn': turn, 'move': None, 'time': move_time})
+            record.add_move(None)
+
+            if move is not None:
+                moves_made[-1]['invalid'] = move
+            turn = 2 if turn == 1 else 1
+            continue
+
+        # If the move is companion card
+        if choose_companion:
+            moves_made.append({'turn': turn, 'move': list(move), 'time': move_time})
+            record.add_move(move)
+
+            # Remove the companion card from the list
+            del companion_cards[move[0]]
+
+            # Make the companion move
+            is_house = make_companion_move(cards, companion_cards, move, player1 if turn == 1 else player2)
+
+            # Remove the companion cards that cannot be used
+            remove_unusable_companion_cards(cards, companion_cards)
+
+            # Set the banners for the players
+            set_banners(player1, player2, is_house if is_house is not None else selected_house, turn)
+
+            # Melisandre gives the player another turn
+            if move[0] != 'Melisandre':
+                # Change the turn
+                turn = 2 if turn == 1 else 1
+
+            choose_companion = False # Reset the flag
+
+        else:
+            moves_made.append({'turn': turn, 'move': move, 'time': move_time})
+            record.add_move(move)
+
+            # Make the move
+            selected_house = make_move(cards, move, player1 if turn == 1 else player2)
+
+            # Remove the companion cards that cannot be used
+            remove_unusable_companion_cards(cards, companion_cards)
+
+            # Set the banners for the players
+            set_banners(player1, player2, selected_house, turn)
+
+            # If there are no cards of the house and there are companion cards left
+            if house_card_count(cards, selected_house) == 0 and len(companion_cards) != 0:
+                choose_companion = True # Player must choose a companion card
+
+            else:
+                # Change the turn
+                turn = 2 if turn == 1 else 1
+
+    if stats is not None:
+        save_stats(stats, stats_file)
+
+    record.winner = calculate_winner(player1, player2)
+
+    if record_file is not None:
+        save_record(record, record_file)
+
+    return {'winner': record.winner,
+            'agents': [player1.get_agent(), player2.get_agent()],
+            'seed': seed,
+            'banners': [dict(player1.get_banners()), dict(player2.get_banners())],
+            'cards': [{house: len(cards) for house, cards in player.get_cards().items()} for player in (player1, player2)],
+            'moves': moves_made,
+            'record': record}
+
 def main(args):
     '''
     This function runs the game.
@@ -690,6 +949,39 @@ def main(args):
         args (Namespace): command line arguments
     '''
 
+    if args.headless:
+        if args.player1 == 'human' or args.player2 == 'human':
+            print("Headless games need two AI agents.")
+            return
+
+        board = None
+
+        if args.load:
+            try:
+                # Load the board from the file
+                board, _ = load_board(args.load)
+
+            except FileNotFoundError:
+                print("File not found. Creating a new board.")
+
+        try:
+            result = play_game(args.player1, args.player2, board, args.seed, args.stats, args.record)
+
+        except (ImportError, AttributeError) as error:
+            print(error)
+            return
+
+        # Print the result of the game
+        print(json.dumps({key: value for key, value in result.items() if key not in ('moves', 'record')}))
+
+        return
+
+    # Load the graphics (pygame) and the video recording
+    import pygraphics
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
     if args.load:
         try:
             # Load the board from the file
@@ -714,6 +1006,30 @@ def main(args):
     # Set up the graphics
     board = pygraphics.init_board()
 
+    file_name = args.video # Name of the video file
+
+    if file_name is None: # If not provided
+        # Set the name of the video file as Agent1_vs_Agent2
+        if args.player1 != 'human':
+            file_name = args.player1[max(0, args.player1.find('/'), args.player1.find('\\')):]
+        
+        else:
+            file_name = args.player1
+        
+        file_name += '_vs_'
+
+        if args.player2 != 'human':
+            file_name += args.player2[max(0, args.player2.find('/'), args.player2.find('\\')):]
+        
+        else:
+            file_name += args.player2
+
+    try:
+        pygraphics.start_video(file_name) # Start the video of the game (written as the game goes)
+    
+    except:
+        print("Error starting video.")
+
     # Clear the screen
     clear_screen()
 
@@ -728,15 +1044,15 @@ def main(args):
         player1_agent = None
     
     else:
-        # Check if the AI file exists
+        # Load the AI file into its worker process
         try:
-            player1_agent = importlib.import_module(args.player1)
+            player1_agent = load_agent(args.player1)
         
         except ImportError:
             print("AI file not found.")
             return
         
-        if not hasattr(player1_agent, 'get_move'):
+        except AttributeError:
             print("AI file does not have the get_move function.")
             return
     
@@ -744,22 +1060,38 @@ def main(args):
         player2_agent = None
     
     else:
-        # Check if the AI file exists
+        # Load the AI file into its worker process
         try:
-            player2_agent = importlib.import_module(args.player2)
+            player2_agent = load_agent(args.player2)
         
         except ImportError:
             print("AI file not found.")
             return
         
-        if not hasattr(player2_agent, 'get_move'):
+        except AttributeError:
             print("AI file does not have the get_move function.")
             return
     
+    # Collect the search statistics of the AI agents
+    stats = [] if args.stats else None
+
+    for agent in (player1_agent, player2_agent):
+        if agent is not None:
+            enable_agent_stats(agent, stats is not None)
+
+    # Seed the AI agents in their worker processes
+    if args.seed is not None:
+        for turn, agent in ((1, player1_agent), (2, player2_agent)):
+            if agent is not None:
+                seed_agent(agent, args.seed, turn)
+
     # Set up the players
     player1 = Player(args.player1)
     player2 = Player(args.player2)
 
+    # Start the record of the game
+    record = GameRecord(cards, [args.player1, args.player2], args.seed)
+
     # Set up the turn
     turn = 1 # 1: player 1's turn, 2: player 2's turn
 
@@ -784,6 +1116,15 @@ def main(args):
             # Show the board for 5 seconds
             pygraphics.show_board(5)
 
+            # Save the search statistics of the AI moves
+            if stats is not None:
+                save_stats(stats, args.stats)
+
+            # Save the record of the game
+            if args.record:
+                record.winner = winner
+                save_record(record, args.record)
+
             break
 
         # Get the player's move
@@ -795,10 +1136,11 @@ def main(args):
             
             else:
                 # Get the move from the AI agent
-                move = try_get_move(player1_agent, cards, player1, player2, companion_cards, choose_companion)
+                move = try_get_move(player1_agent, cards, player1, player2, companion_cards, choose_companion, stats, 1)
 
                 # If the move is None, change the turn
                 if move is None:
+                    record.add_move(None)
                     turn = 2
                     continue
         
@@ -810,10 +1152,11 @@ def main(args):
             
             else:
                 # Get the move from the AI agent
-                move = try_get_move(player2_agent, cards, player1, player2, companion_cards, choose_companion)
+                move = try_get_move(player2_agent, cards, player1, player2, companion_cards, choose_companion, stats, 2)
 
                 # If the move is None, change the turn
                 if move is None:
+                    record.add_move(None)
                     turn = 1
                     continue
         
@@ -863,6 +1206,8 @@ def main(args):
                 elif not validate_agent_move(cards, companion_cards, move):
                     continue
 
+                record.add_move(move) # Add the move to the record
+
                 # Remove the companion card from the list
                 del companion_cards[move[0]]
 
@@ -897,6 +1242,8 @@ def main(args):
 
         # Check if the move is valid
         if move in moves:
+            record.add_move(move) # Add the move to the record
+
             # Make the move
             selected_house = make_move(cards, move, player1 if turn == 1 else player2)
 
@@ -932,26 +1279,8 @@ def main(args):
     # Close the board
     pygraphics.close_board()
 
-    file_name = args.video # Name of the video file
-
-    if file_name is None: # If not provided
-        # Set the name of the video file as Agent1_vs_Agent2
-        if player1.get_agent() != 'human':
-            file_name = player1.get_agent()[max(0, player1.get_agent().find('/'), player1.get_agent().find('\\')):]
-        
-        else:
-            file_name = player1.get_agent()
-        
-        file_name += '_vs_'
-
-        if player2.get_agent() != 'human':
-            file_name += player2.get_agent()[max(0, player2.get_agent().find('/'), player2.get_agent().find('\\')):]
-        
-        else:
-            file_name += player2.get_agent()
-    
     try:
-        pygraphics.save_video(file_name) # Save the video of the game
+        pygraphics.save_video() # Finish the video of the game
     
     except:
         print("Error saving video.")
@@ -0,0 +1,470 @@
+import atexit
+import math
+import random
+import sys
+import time
+from os.path import abspath, join, dirname
+
+# Add the utils folder to the path (for the bitboard game state)
+sys.path.append(join(dirname(abspath(__file__)), "utils"))
+
+from bitboard import GameState, COMPANIONS, COMPANION_BITS, iterate_squares
+from search_pool import create_pool
+from endgame import EndgameSolver, SolverTimeout
+from opening_book import OpeningBook
+
+TIME_BUDGET = 8.0 # Time budget of a move in seconds (the engine's TIMEOUT is 10 s)
+EXPLORATION = 1.4 # Exploration constant of UCT
+
+# Progressive widening: a companion node with n visits has at most
+# WIDENING_CONSTANT * n ** WIDENING_EXPONENT children
+WIDENING_CONSTANT = 2.0
+WIDENING_EXPONENT = 0.5
+
+GREEDY_RATE = 0.5 # Chance that a playout takes the normal move with the most captured cards
+
+# Number of processes of the search (more than 1 grows an independent tree in every
+# process and adds up the visits of the root moves)
+WORKERS = 1
+
+# Highest number of cards on the board (not Varys) to solve exactly, and the share
+# of the time budget the solver gets before the search takes over
+ENDGAME_CARDS = 10
+ENDGAME_SHARE = 0.5
+
+STATS = False # Keep the iterations and the time of every move (see get_move_stats)
+
+search_pool = None # Process pool of the parallel search
+search_pool_workers = 0 # Number of processes of the pool
+
+endgame_solver = EndgameSolver() # Exact endgame solver (its solved positions are kept between moves)
+opening_book = OpeningBook() # Opening book of the seeded boards (see build_book.py)
+
+last_stats = None # Statistics of the last move (None if STATS is off)
+engine_turn = None # Player of the next move as given by the engine (None to find it from the agent names)
+
+class Node:
+    '''
+    This class is a node of the search tree.
+    '''
+
+    __slots__ = ('move', 'parent', 'player', 'children', 'untried', 'widening', 'visits', 'wins')
+
+    def __init__(self, move=None, parent=None, player=None):
+        '''
+        This function initializes the node.
+
+        Parameters:
+            move (int/list/None): move that leads to the node (None for the root)
+            parent (Node/None): parent node
+            player (int/None): player who made the move (None for the root)
+        '''
+
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.children = []
+        self.untried = None # Moves without a child (set when the node is first reached)
+        self.widening = False # Flag for progressive widening (companion nodes)
+        self.visits = 0
+        self.wins = 0.0 # Wins of the player who made the move (0.5 for no winner)
+
+    def can_expand(self):
+        '''
+        This function checks if a child should be added before selecting one.
+
+        Returns:
+            expand (bool): True if the node has untried moves and room for another child
+        '''
+
+        if not self.untried:
+            return False
+
+        if not self.widening:
+            return True
+
+        return len(self.children) < WIDENING_CONSTANT * (self.visits + 1) ** WIDENING_EXPONENT
+
+    def select_child(self):
+        '''
+        This function selects the child with the highest UCT value.
+
+        Returns:
+            child (Node): the selected child
+        '''
+
+        log_visits = math.log(self.visits)
+
+        return max(self.children, key=lambda child: child.wins / child.visits + EXPLORATION * math.sqrt(log_visits / child.visits))
+
+def random_companion_move(state):
+    '''
+    This function makes a random companion move (like random_agent, but always valid).
+
+    Parameters:
+        state (GameState): state of the game
+
+    Returns:
+        move (list): the companion move
+    '''
+
+    companions = [companion for companion in COMPANIONS if state.companions & COMPANION_BITS[companion]]
+    companion = random.choice(companions)
+
+    cards = list(iterate_squares(state.occupied()))
+
+    if companion in ('Jon', 'Sandor'):
+        return [companion, random.choice(cards)]
+
+    elif companion == 'Ramsay':
+        return [companion] + sorted(random.sample(cards + [state.varys], 2))
+
+    elif companion == 'Jaqen':
+        others = [other for other in companions if other != 'Jaqen']
+        return [companion] + sorted(random.sample(cards, 2)) + [random.choice(others)]
+
+    return [companion]
+
+def playout_move(state):
+    '''
+    This function chooses the move of a playout: a random move, or the normal move
+    that captures the most cards.
+
+    Parameters:
+        state (GameState): state of the game
+
+    Returns:
+        move (int/list): the move
+    '''
+
+    if state.choose_companion:
+        return random_companion_move(state)
+
+    moves = list(iterate_squares(state.moves_mask()))
+
+    if random.random() < GREEDY_RATE:
+        random.shuffle(moves) # Break the ties randomly
+        return max(moves, key=lambda move: state.capture_mask(move).bit_count())
+
+    return random.choice(moves)
+
+def playout(state):
+    '''
+    This function plays the game to the end.
+
+    Parameters:
+        state (GameState): state of the game (changed by the playout)
+
+    Returns:
+        winner (int/None): 1 if player 1 wins, 2 if player 2 wins (None if nobody has a banner)
+    '''
+
+    while not state.is_game_over():
+        state.play(playout_move(state))
+
+    return state.calculate_winner()
+
+def run_iteration(root, root_state):
+    '''
+    This function runs one iteration of the search: selection, expansion, playout and backpropagation.
+
+    Parameters:
+        root (Node): root of the tree
+        root_state (GameState): state of the root
+    '''
+
+    state = root_state.copy()
+    node = root
+    path = [root]
+
+    while not state.is_game_over():
+        # The moves of a node are generated when it is first reached
+        if node.untried is None:
+            node.untried = state.get_legal_moves()
+            random.shuffle(node.untried)
+
+            # Companion nodes can have thousands of moves, so they grow with their visits
+            node.widening = state.choose_companion
+
+        # Expansion
+        if node.can_expand():
+            move = node.untried.pop()
+            player = state.turn
+
+            state.play(move)
+
+            node = Node(move, node, player)
+            node.parent.children.append(node)
+            path.append(node)
+
+            break
+
+        # Selection
+        node = node.select_child()
+        state.play(node.move)
+        path.append(node)
+
+    winner = playout(state)
+
+    # Backpropagation
+    for node in path:
+        node.visits += 1
+
+        if winner is None:
+            node.wins += 0.5
+
+        elif winner == node.player:
+            node.wins += 1
+
+def move_key(move):
+    '''
+    This function gets a hashable form of a move (to add up the visits of the trees).
+
+    Parameters:
+        move (int/list): normal move (location) or companion move (list)
+
+    Returns:
+        key (int/tuple): the move as an int or a tuple
+    '''
+
+    return move if isinstance(move, int) else tuple(move)
+
+def search_tree(state, deadline, seed=None):
+    '''
+    This function grows a search tree from a state until the deadline.
+
+    Parameters:
+        state (GameState): state of the root
+        deadline (float): time.perf_counter() value to stop at (the same clock in every process)
+        seed (int/None): seed of the random generator (every process of the pool needs its own)
+
+    Returns:
+        visits (dict): number of visits of every root move (by move_key)
+        iterations (int): number of iterations
+    '''
+
+    if seed is not None:
+        random.seed(seed)
+
+    root = Node()
+    iterations = 0
+
+    while time.perf_counter() < deadline:
+        run_iteration(root, state)
+        iterations += 1
+
+    return {move_key(child.move): child.visits for child in root.children}, iterations
+
+def get_search_pool():
+    '''
+    This function gets the process pool of the parallel search (with WORKERS processes).
+
+    Returns:
+        pool (ProcessPoolExecutor): the pool
+    '''
+
+    global search_pool, search_pool_workers
+
+    if search_pool is None or search_pool_workers != WORKERS:
+        close_search_pool()
+
+        search_pool = create_pool(WORKERS)
+        search_pool_workers = WORKERS
+
+    return search_pool
+
+def close_search_pool():
+    '''
+    This function stops the processes of the search pool (when the program exits).
+    '''
+
+    global search_pool
+
+    if search_pool is not None:
+        search_pool.shutdown()
+        search_pool = None
+
+atexit.register(close_search_pool)
+
+def search(state, deadline):
+    '''
+    This function searches a state until the deadline. With WORKERS > 1 every process
+    of the pool grows its own tree (root parallelization) and their visits are added up.
+
+    Parameters:
+        state (GameState): state of the root
+        deadline (float): time.perf_counter() value to stop at
+
+    Returns:
+        move (int/list/None): the most visited move
+        iterations (int): number of iterations of all the trees
+    '''
+
+    moves = {move_key(move): move for move in state.get_legal_moves()}
+
+    if len(moves) <= 1:
+        return next(iter(moves.values()), None), 0
+
+    if WORKERS > 1:
+        pool = get_search_pool()
+        futures = [pool.submit(search_tree, state, deadline, random.getrandbits(64)) for _ in range(WORKERS)]
+        results = [future.result() for future in futures]
+
+    else:
+        results = [search_tree(state, deadline)]
+
+    # Add up the visits of the root moves
+    visits = {}
+
+    for tree_visits, _ in results:
+        for key, count in tree_visits.items():
+            visits[key] = visits.get(key, 0) + count
+
+    if not visits: # Not even one iteration finished
+        return next(iter(moves.values())), 0
+
+    return moves[max(visits, key=visits.get)], sum(iterations for _, iterations in results)
+
+def is_own_agent(agent):
+    '''
+    This function checks if a player is played by this agent.
+
+    Parameters:
+        agent (str): agent of the player (name of the AI file)
+
+    Returns:
+        own (bool): True if the agent is this file
+    '''
+
+    return agent.replace('\\', '/').split('/')[-1].split('.')[-1] == __name__.split('.')[-1]
+
+def set_turn(turn):
+    '''
+    This function sets the player of the next move (called by the game engine before get_move).
+
+    Parameters:
+        turn (int): player of the agent (1 or 2)
+    '''
+
+    global engine_turn
+
+    engine_turn = turn
+
+def get_turn(player1, player2):
+    '''
+    This function finds the player of the agent: the one given by the engine (see set_turn),
+    else the player whose agent is this file (player 1 if both are this agent).
+
+    Parameters:
+        player1 (Player): player 1
+        player2 (Player): player 2
+
+    Returns:
+        turn (int): player of the agent (1 or 2)
+    '''
+
+    global engine_turn
+
+    if engine_turn is not None:
+        turn, engine_turn = engine_turn, None
+
+        return turn
+
+    return 2 if is_own_agent(player2.get_agent()) and not is_own_agent(player1.get_agent()) else 1
+
+def enable_stats(enabled):
+    '''
+    This function switches the statistics of the moves on or off (called by the game engine).
+
+    Parameters:
+        enabled (bool): True to keep the statistics of every move
+    '''
+
+    global STATS
+
+    STATS = enabled
+
+def get_move_stats():
+    '''
+    This function gets the statistics of the last move (called by the game engine after get_move).
+
+    Returns:
+        stats (dict/None): solver (search, endgame or book), elapsed, iterations (the nodes of the
+            endgame solver) and iterations per second, or None if STATS is off
+    '''
+
+    return last_stats
+
+def get_move(cards, player1, player2, companion_cards, choose_companion):
+    '''
+    This function gets the move of the player with Monte Carlo tree search.
+
+    Parameters:
+        cards (list): list of Card objects
+        player1 (Player): player 1
+        player2 (Player): player 2
+        companion_cards (dict): dictionary of companion cards
+        choose_companion (bool): flag to choose a companion card
+
+    Returns:
+        move (int/list): the move of the player
+    '''
+
+    global last_stats
+
+    start_time = time.perf_counter()
+    deadline = start_time + TIME_BUDGET
+    last_stats = None
+
+    turn = get_turn(player1, player2)
+
+    state = GameState.from_cards(cards, companion_cards, player1, player2, turn, choose_companion)
+
+    # A position of the opening book: play its deep-searched move
+    move = opening_book.get_move(state)
+
+    if move is not None:
+        if STATS:
+            last_stats = make_stats('book', 0, start_time)
+
+        return move
+
+    # Few cards left: solve the game exactly
+    if state.occupied().bit_count() <= ENDGAME_CARDS:
+        solver_nodes = endgame_solver.nodes
+
+        try:
+            move, _ = endgame_solver.get_best_move(state, time.perf_counter() + TIME_BUDGET * ENDGAME_SHARE)
+
+            if STATS:
+                last_stats = make_stats('endgame', endgame_solver.nodes - solver_nodes, start_time)
+
+            return move
+
+        except SolverTimeout:
+            pass
+
+    move, iterations = search(state, deadline)
+
+    if STATS:
+        last_stats = make_stats('search', iterations, start_time)
+
+    return move
+
+def make_stats(solver, iterations, start_time):
+    '''
+    This function makes the statistics of a move.
+
+    Parameters:
+        solver (str): part of the agent that chose the move (search, endgame or book)
+        iterations (int): iterations of the search (nodes of the endgame solver)
+        start_time (float): time.perf_counter() value at the start of the move
+
+    Returns:
+        stats (dict): the statistics (see get_move_stats)
+    '''
+
+    elapsed = time.perf_counter() - start_time
+
+    return {'solver': solver, 'elapsed': round(elapsed, 4), 'iterations': iterations,
+            'iterations_per_second': round(iterations / elapsed) if elapsed > 0 else 0}
@@ -1,4 +1,43 @@
+import atexit
 import copy
+import multiprocessing
+import sys
+import time
+from os.path import abspath, join, dirname
+
+import numpy as np
+
+# Add the utils folder to the path (for the shared search helpers)
+sys.path.append(join(dirname(abspath(__file__)), "utils"))
+
+from rules import SAME_LINE, BETWEEN
+from transposition import ZobristHasher, TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from move_ordering import MoveOrderer
+from search_pool import create_pool
+from bitboard import GameState, HOUSE_INDEX
+from endgame import EndgameSolver, SolverTimeout
+from opening_book import OpeningBook
+from search_stats import SearchStats
+from features import (position_features, BOARD_OFFSET, CAPTURED_OFFSET, BANNER_OFFSET, VARYS_OFFSET,
+                      COMPANION_OFFSET, COMPANION_FEATURES, TURN_OFFSET)
+
+# Time budget of a move in seconds (the engine's TIMEOUT is 10 s, the rest is left for the engine)
+TIME_BUDGET = 8.0
+
+# Number of processes of the search (more than 1 splits the root moves between them)
+WORKERS = 1
+
+# Highest number of cards on the board (not Varys) to solve exactly, and the share
+# of the time budget the solver gets before the search takes over
+ENDGAME_CARDS = 10
+ENDGAME_SHARE = 0.5
+
+# Number of leaves of the first batch of a frontier node scored by leaf_model
+# (the next batches are twice as large; see evaluate_frontier), 0 to score every leaf alone
+FRONTIER_BATCH = 1
+
+# Count the nodes, cutoffs, table hits and branching factor of every move (see get_move_stats)
+STATS = False
 
 # -------------------------------
 #         HELPER FUNCTIONS
@@ -21,15 +60,9 @@ def get_valid_moves(cards):
     if varys_location is None:
         return []
 
-    varys_row, varys_col = divmod(varys_location, 6)
-    moves = []
-    for c in cards:
-        if c.get_name() == "Varys":
-            continue
-        row, col = divmod(c.get_location(), 6)
-        if row == varys_row or col == varys_col:
-            moves.append(c.get_location())
-    return moves
+    # Same row/column lookup (Varys is not on his own line)
+    same_line = SAME_LINE[varys_location]
+    return [c.get_location() for c in cards if same_line[c.get_location()]]
 
 from itertools import combinations
 
@@ -138,9 +171,8 @@ def make_normal_move(cards, move_location, current_player):
     selected_card = cards[selected_index]
     house_chosen = selected_card.get_house()
 
-    # Gather "in-between" cards that match the house, following main game logic:
-    vrow, vcol = divmod(varys_card.get_location(), 6)
-    srow, scol = divmod(move_location, 6)
+    # Squares strictly between Varys and the selected card (precomputed table)
+    between = BETWEEN[varys_card.get_location()][move_location]
 
     # Add the selected card to the player's holdings
     current_player.add_card(selected_card)
@@ -148,31 +180,13 @@ def make_normal_move(cards, move_location, current_player):
     # We'll track cards that will be removed from board
     removed_indices = [selected_index]
 
-    # Check in-between
+    # Gather "in-between" cards that match the house, following main game logic
     for i, c in enumerate(cards):
         if i == varys_index or i == selected_index:
             continue
-        row, col = divmod(c.get_location(), 6)
-        if c.get_house() == house_chosen:
-            # same row, varys_col < col < scol or scol < col < varys_col ...
-            if vrow == srow:
-                # horizontal move
-                if row == vrow:
-                    if vcol < scol and vcol < col < scol:
-                        current_player.add_card(c)
-                        removed_indices.append(i)
-                    elif scol < vcol and scol < col < vcol:
-                        current_player.add_card(c)
-                        removed_indices.append(i)
-            elif vcol == scol:
-                # vertical move
-                if col == vcol:
-                    if vrow < srow and vrow < row < srow:
-                        current_player.add_card(c)
-                        removed_indices.append(i)
-                    elif srow < vrow and srow < row < vrow:
-                        current_player.add_card(c)
-                        removed_indices.append(i)
+        if c.get_house() == house_chosen and between >> c.get_location() & 1:
+            current_player.add_card(c)
+            removed_indices.append(i)
 
     # Move Varys to the new location
     varys_card.set_location(move_location)
@@ -187,6 +201,189 @@ def make_normal_move(cards, move_location, current_player):
     # Return the chosen house
     return house_chosen
 
+# -------------------------------
+#     REVERSIBLE MOVES (UNDO)
+# -------------------------------
+
+def new_undo_record(player):
+    """
+    Returns an empty undo record for a move made by `player`:
+       - 'player': the Player whose holdings receive cards
+       - 'added': houses of the cards appended to the player's holdings
+       - 'removed': (index, card) pairs removed from the board list
+       - 'moved': (card, old_location) pairs of cards that changed location
+       - 'companions': snapshot of companion_cards items (None if unchanged)
+       - 'banners': (player, house, old_banner) triples of banners that changed
+    """
+    return {'player': player, 'added': [], 'removed': [], 'moved': [], 'companions': None, 'banners': []}
+
+def remove_card_reversible(cards, card, record):
+    """
+    Removes `card` from the board list and remembers its index in `record`.
+    """
+    for i, c in enumerate(cards):
+        if c is card:
+            del cards[i]
+            record['removed'].append((i, card))
+            return
+
+def make_normal_move_reversible(cards, move_location, current_player, undo_stack):
+    """
+    Same as make_normal_move, but pushes an undo record on `undo_stack` so that
+    undo_move can restore the exact previous state (instead of cloning it).
+    Returns the chosen house (None for an invalid move, which still pushes an empty record).
+    """
+    record = new_undo_record(current_player)
+    undo_stack.append(record)
+
+    # Find Varys and the selected card.
+    varys_card = None
+    selected_card = None
+    for c in cards:
+        if c.get_name() == 'Varys':
+            varys_card = c
+        if c.get_location() == move_location:
+            selected_card = c
+
+    if varys_card is None or selected_card is None:
+        return None  # Invalid
+
+    house_chosen = selected_card.get_house()
+
+    # Squares strictly between Varys and the selected card (precomputed table)
+    between = BETWEEN[varys_card.get_location()][move_location]
+
+    # Captured cards: the selected one plus the in-between cards of the same house
+    captured = [selected_card]
+    for c in cards:
+        if c is not selected_card and c.get_house() == house_chosen and between >> c.get_location() & 1:
+            captured.append(c)
+
+    for c in captured:
+        current_player.add_card(c)
+        record['added'].append(house_chosen)
+
+    # Move Varys to the new location
+    record['moved'].append((varys_card, varys_card.get_location()))
+    varys_card.set_location(move_location)
+
+    # Remove the captured cards from the board (highest index first, so indices stay valid on undo)
+    captured_ids = {id(c) for c in captured}
+    indices = [i for i, c in enumerate(cards) if id(c) in captured_ids]
+    indices.reverse()
+    for i in indices:
+        record['removed'].append((i, cards[i]))
+        del cards[i]
+
+    return house_chosen
+
+def make_companion_move_reversible(cards, companion_cards, chosen_move, current_player, undo_stack):
+    """
+    Same as make_companion_move, but pushes an undo record on `undo_stack`.
+    Returns the captured house (or None), like make_companion_move.
+    """
+    record = new_undo_record(current_player)
+    record['companions'] = list(companion_cards.items())
+    undo_stack.append(record)
+
+    selected_companion = chosen_move[0]
+    house = None
+
+    if selected_companion == 'Jon':
+        target_card = find_card(cards, chosen_move[1])
+        if target_card:
+            house = target_card.get_house()
+            from classes import Card
+            for _ in range(2):
+                current_player.add_card(Card(house=house, name='Jon Snow', location=-1))
+                record['added'].append(house)
+
+    elif selected_companion == 'Gendry':
+        from classes import Card
+        house = 'Baratheon'
+        current_player.add_card(Card(house, 'Gendry', -1))
+        record['added'].append(house)
+
+    elif selected_companion == 'Ramsay':
+        card1 = find_card(cards, chosen_move[1])
+        card2 = find_card(cards, chosen_move[2])
+        if card1 and card2:
+            record['moved'].append((card1, card1.get_location()))
+            record['moved'].append((card2, card2.get_location()))
+            temp = card1.get_location()
+            card1.set_location(card2.get_location())
+            card2.set_location(temp)
+
+    elif selected_companion == 'Sandor':
+        to_remove = find_card(cards, chosen_move[1])
+        if to_remove is not None and to_remove.get_name() != 'Varys':
+            remove_card_reversible(cards, to_remove, record)
+
+    elif selected_companion == 'Jaqen':
+        card1 = find_card(cards, chosen_move[1])
+        card2 = find_card(cards, chosen_move[2])
+        if card1 is not None: remove_card_reversible(cards, card1, record)
+        if card2 is not None: remove_card_reversible(cards, card2, record)
+
+        if chosen_move[3] in companion_cards:
+            del companion_cards[chosen_move[3]]
+
+    # Melisandre has no board effect.
+
+    if selected_companion in companion_cards:
+        del companion_cards[selected_companion]
+
+    return house
+
+def undo_move(cards, companion_cards, undo_stack):
+    """
+    Pops the last undo record and restores the board, the player's holdings
+    and the companion cards to the state before that move. Returns the record.
+    """
+    record = undo_stack.pop()
+
+    # Restore locations (reverse order, in case a card moved twice)
+    for card, location in reversed(record['moved']):
+        card.set_location(location)
+
+    # Put removed cards back, in reverse order of removal
+    for i, card in reversed(record['removed']):
+        cards.insert(i, card)
+
+    # Take back the cards given to the player
+    player_cards = record['player'].get_cards()
+    for house in record['added']:
+        player_cards[house].pop()
+
+    # Give the banners back
+    for player, house, banner in reversed(record['banners']):
+        player.get_banners()[house] = banner
+
+    # Restore the companion cards (keeping their original order)
+    if record['companions'] is not None:
+        companion_cards.clear()
+        companion_cards.update(record['companions'])
+
+    return record
+
+def set_banners_reversible(record, opponent):
+    """
+    Sets the banners of the houses the player of the undo record captured cards of,
+    as main.set_banners: the player gets the banner with more cards than `opponent`,
+    or as many (the player captured the last card). Changes are kept in the record.
+    """
+    player = record['player']
+    player_cards, opponent_cards = player.get_cards(), opponent.get_cards()
+    player_banners, opponent_banners = player.get_banners(), opponent.get_banners()
+    for house in dict.fromkeys(record['added']):
+        if len(player_cards[house]) >= len(opponent_cards[house]):
+            if not player_banners[house]:
+                record['banners'].append((player, house, player_banners[house]))
+                player_banners[house] = 1
+            if opponent_banners[house]:
+                record['banners'].append((opponent, house, opponent_banners[house]))
+                opponent_banners[house] = 0
+
 def find_card(cards, location):
     """
     Utility function: find the Card object in 'cards' with a matching .get_location().
@@ -339,12 +536,141 @@ def evaluate_state(player1, player2):
     """
     return count_player_cards(player1) - count_player_cards(player2)
 
+def evaluate_leaf(cards, player1, player2, companion_cards, choose_companion, maximizing_player):
+    """
+    Evaluation of a leaf of the search: leaf_model if there is one, else evaluate_state.
+    """
+    if leaf_model is None:
+        return evaluate_state(player1, player2)
+    features = position_features(cards, player1, player2, companion_cards, 1 if maximizing_player else 2, choose_companion)
+    return float(leaf_model.evaluate(np.array([features], dtype=np.float64))[0])
+
+def child_features(features, record, player1, companion_cards, next_turn, next_choose_companion):
+    """
+    Returns the features of the position after a move from the features of the
+    position before it and the undo record of the move (which has every card the
+    move removed, captured or moved and every banner it changed).
+    """
+    features = features.copy()
+    for _, card in record['removed']:
+        features[BOARD_OFFSET + HOUSE_INDEX[card.get_house()]] -= 1
+    captured_offset = CAPTURED_OFFSET + (0 if record['player'] is player1 else len(HOUSE_INDEX))
+    for house in record['added']:
+        features[captured_offset + HOUSE_INDEX[house]] += 1
+    for player, house, _ in record['banners']:
+        banner_offset = BANNER_OFFSET + (0 if player is player1 else len(HOUSE_INDEX))
+        features[banner_offset + HOUSE_INDEX[house]] = player.get_banners()[house]
+    for card, _ in record['moved']:
+        if card.get_name() == 'Varys':
+            features[VARYS_OFFSET] = card.get_location()
+    if record['companions'] is not None:
+        features[COMPANION_OFFSET:TURN_OFFSET] = [0] * (TURN_OFFSET - COMPANION_OFFSET)
+        for companion in companion_cards:
+            features[COMPANION_FEATURES[companion]] = 1
+    features[TURN_OFFSET] = next_turn
+    features[TURN_OFFSET + 1] = int(next_choose_companion)
+    return features
+
+def evaluate_frontier(cards, player1, player2, companion_cards, choose_companion,
+                      possible_moves, alpha, beta, maximizing_player, undo_stack, stats=None):
+    """
+    Returns (best_score, best_move) of a node at depth 1, as minimax: the leaves of
+    the moves are scored by leaf_model in batches of the ordered moves (FRONTIER_BATCH
+    moves, then twice as many every batch), with one call of the model per batch.
+    The moves are made and undone without the hasher (leaves are never looked up in
+    the table). A batch that reaches beta (alpha for player2) ends the node, as a
+    cutoff of the alpha-beta loop, and the first of equal moves is the best.
+    """
+    current_player, opponent = (player1, player2) if maximizing_player else (player2, player1)
+    next_turn = 2 if maximizing_player else 1
+
+    # The board is walked once, the leaves only apply the changes of their move
+    features = position_features(cards, player1, player2, companion_cards, next_turn, False)
+
+    best_score = float("-inf") if maximizing_player else float("inf")
+    best_move = None
+
+    start, size = 0, FRONTIER_BATCH
+    while start < len(possible_moves):
+        batch = possible_moves[start:start + size]
+
+        rows = []
+        for move in batch:
+            next_choose_companion = make_search_move(
+                cards, companion_cards, move, choose_companion, current_player, undo_stack, opponent=opponent
+            )
+            rows.append(child_features(features, undo_stack[-1], player1, companion_cards,
+                                       next_turn, next_choose_companion))
+            undo_move(cards, companion_cards, undo_stack)
+            if stats is not None:
+                stats.count_node(next_choose_companion)
+
+        scores = leaf_model.evaluate(np.array(rows, dtype=np.float64))
+
+        if maximizing_player:
+            best = int(scores.argmax())
+            if scores[best] > best_score:
+                best_score, best_move = float(scores[best]), batch[best]
+            if best_score >= beta:
+                break
+        else:
+            best = int(scores.argmin())
+            if scores[best] < best_score:
+                best_score, best_move = float(scores[best]), batch[best]
+            if best_score <= alpha:
+                break
+
+        start += size
+        size *= 2
+
+    return best_score, best_move
+
 # -------------------------------
 #       MINIMAX SEARCH
 # -------------------------------
 
+def make_search_move(cards, companion_cards, move, choose_companion, current_player, undo_stack, hasher=None,
+                     opponent=None):
+    """
+    Makes a move of the search on the shared state (recording how to undo it on the
+    undo stack), sets the banners of the captured houses (if the `opponent` is given)
+    and updates the hasher.
+    Returns True if the next player must choose a companion card.
+    """
+    next_choose_companion = False
+
+    if choose_companion:
+        # Minimal usage: the companion's effect, then the turn passes.
+        # (Melisandre's extra turn is ignored to keep the search simple.)
+        make_companion_move_reversible(cards, companion_cards, move, current_player, undo_stack)
+        if opponent is not None:
+            set_banners_reversible(undo_stack[-1], opponent)
+        if hasher is not None:
+            hasher.update(undo_stack[-1], companion_cards)
+    else:
+        house_chosen = make_normal_move_reversible(cards, move, current_player, undo_stack)
+        if opponent is not None:
+            set_banners_reversible(undo_stack[-1], opponent)
+        if hasher is not None:
+            hasher.update(undo_stack[-1], companion_cards)
+        # If house_chosen is exhausted => next_choose_companion = True
+        if house_chosen is not None:
+            count_in_board = sum(1 for c in cards if c.get_house() == house_chosen)
+            if count_in_board == 0 and len(companion_cards) > 0:
+                next_choose_companion = True
+
+    return next_choose_companion
+
+
+class SearchTimeout(Exception):
+    """
+    Raised by minimax when the deadline of the search has passed.
+    """
+
+
 def minimax(cards, player1, player2, companion_cards, choose_companion,
-            depth, alpha, beta, maximizing_player):
+            depth, alpha, beta, maximizing_player, undo_stack=None,
+            hasher=None, table=None, deadline=None, orderer=None, ply=0, stats=None):
     """
     Returns (best_score, best_move).
 
@@ -352,157 +678,531 @@ def minimax(cards, player1, player2, companion_cards, choose_companion,
     - `depth`: current search depth
     - `alpha, beta`: alpha–beta bounds
     - `maximizing_player`: True if the 'current' mover is player1, False if player2
+    - `undo_stack`: stack of undo records; the search makes and unmakes moves on
+      the given (mutable) state, which is restored when the call returns
+    - `hasher`, `table`: optional ZobristHasher of the state and TranspositionTable;
+      positions reached again (e.g. by another move order) reuse stored results
+    - `deadline`: optional time.perf_counter() value; SearchTimeout is raised when it
+      passes, leaving the moves on the undo stack for the caller to undo
+    - `orderer`: optional MoveOrderer; moves are tried in its order (table move,
+      good captures, killers, history) and beta cutoffs are reported to it
+    - `ply`: distance from the root (for the killer moves)
+    - `stats`: optional SearchStats; counts the nodes, moves, table hits and cutoffs
 
     We'll treat 'player1' as the maximizing player, and 'player2' as the minimizing.
     """
 
+    if undo_stack is None:
+        undo_stack = []
+
+    # Stop the search when the time is up
+    if deadline is not None and time.perf_counter() > deadline:
+        raise SearchTimeout
+
+    if stats is not None:
+        stats.count_node(choose_companion)
+
     # Base case: or if no moves
     if depth == 0:
-        return evaluate_state(player1, player2), None
+        return evaluate_leaf(cards, player1, player2, companion_cards, choose_companion, maximizing_player), None
 
     # get moves
     if choose_companion:
         possible_moves = get_companion_moves(cards, companion_cards)
         # If no companion moves are possible, effectively pass
         if not possible_moves:
-            return evaluate_state(player1, player2), None
+            return evaluate_leaf(cards, player1, player2, companion_cards, choose_companion, maximizing_player), None
     else:
         possible_moves = get_valid_moves(cards)
 
     if not possible_moves:
         # no moves => evaluate
-        return evaluate_state(player1, player2), None
+        return evaluate_leaf(cards, player1, player2, companion_cards, choose_companion, maximizing_player), None
+
+    if stats is not None:
+        stats.count_moves(ply, len(possible_moves))
+
+    # Look the position up in the transposition table
+    alpha_original, beta_original = alpha, beta
+    table_move = None
+    if table is not None:
+        key = hasher.position_key(maximizing_player, choose_companion)
+        entry = table.probe(key)
+        if stats is not None:
+            stats.table_probes += 1
+            stats.table_hits += entry is not None
+        if entry is not None:
+            _, entry_depth, entry_score, entry_bound, entry_move, _ = entry
+            if entry_depth >= depth and entry_move is not None:
+                if entry_bound == EXACT:
+                    return entry_score, entry_move
+                elif entry_bound == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if beta <= alpha:
+                    return entry_score, entry_move
+            table_move = entry_move
+
+    # Try the stored best move first (the orderer also sorts the other moves)
+    if orderer is not None:
+        possible_moves = orderer.order_moves(cards, possible_moves, table_move, ply)
+    elif table_move in possible_moves:
+        possible_moves.remove(table_move)
+        possible_moves.insert(0, table_move)
+
+    if depth == 1 and leaf_model is not None and FRONTIER_BATCH > 0:
+        # Score the leaves of all the moves with one call of the model
+        best_score, best_move = evaluate_frontier(
+            cards, player1, player2, companion_cards, choose_companion,
+            possible_moves, alpha, beta, maximizing_player, undo_stack, stats
+        )
+        if best_score >= beta if maximizing_player else best_score <= alpha:
+            if orderer is not None:
+                orderer.record_cutoff(best_move, ply, depth)
+            if stats is not None:
+                stats.cutoffs += 1
+    else:
+        # The player making the moves at this node (and the other player)
+        current_player, opponent = (player1, player2) if maximizing_player else (player2, player1)
 
-    if maximizing_player:
-        best_score = float("-inf")
+        best_score = float("-inf") if maximizing_player else float("inf")
         best_move = None
 
         for move in possible_moves:
-            # Clone
-            new_cards, new_p1, new_p2 = clone_game_state(cards, player1, player2)
-            new_companions = copy.deepcopy(companion_cards)
-
-            # Apply
-            house_chosen = None
-            next_choose_companion = False
-
-            if choose_companion:
-                # Minimal usage: just pick the companion, no board changes
-                house_chosen = make_companion_move(new_cards, new_companions, move, new_p1)
-                # There's a special case if the companion is Melisandre, that yields an extra turn
-                # We ignore that to keep code simpler. 
-                # Next turn would belong to the other player unless it's Melisandre, etc.
-                # Also, there's the real logic with Jaqen, etc. For demonstration, we skip.
-                # We'll assume we pass the turn to player2.
-                next_player_is_max = False
+            # Apply (on the shared state, recording how to undo it)
+            next_choose_companion = make_search_move(
+                cards, companion_cards, move, choose_companion, current_player, undo_stack, hasher, opponent
+            )
 
-            else:
-                # Normal move for player1
-                house_chosen = make_normal_move(new_cards, move, new_p1)
-                # If house_chosen is exhausted => next_choose_companion = True
-                if house_chosen is not None:
-                    count_in_board = sum(1 for c in new_cards if c.get_house() == house_chosen)
-                    if count_in_board == 0 and len(new_companions) > 0:
-                        next_choose_companion = True
-
-                # Next turn is player2
-                next_player_is_max = False
-
-            # Recurse
+            # Recurse (the next turn belongs to the other player)
             score, _ = minimax(
-                new_cards, new_p1, new_p2, new_companions,
-                next_choose_companion, depth - 1, alpha, beta, next_player_is_max
+                cards, player1, player2, companion_cards,
+                next_choose_companion, depth - 1, alpha, beta, not maximizing_player, undo_stack,
+                hasher, table, deadline, orderer, ply + 1, stats
             )
 
-            if score > best_score:
-                best_score = score
-                best_move = move
-            alpha = max(alpha, best_score)
+            # Restore the state
+            record = undo_move(cards, companion_cards, undo_stack)
+            if hasher is not None:
+                hasher.restore(record)
+
+            if maximizing_player:
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+                alpha = max(alpha, best_score)
+            else:
+                if score < best_score:
+                    best_score = score
+                    best_move = move
+                beta = min(beta, best_score)
             if beta <= alpha:
+                if orderer is not None:
+                    orderer.record_cutoff(move, ply, depth)
+                if stats is not None:
+                    stats.cutoffs += 1
                 break
-        return best_score, best_move
 
+    # Store the result with its bound type
+    if table is not None:
+        if best_score <= alpha_original:
+            bound = UPPER_BOUND
+        elif best_score >= beta_original:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        table.store(key, depth, best_score, bound, best_move)
+
+    return best_score, best_move
+
+
+# -------------------------------
+#        PUBLIC API
+# -------------------------------
+
+# Transposition table kept between moves (its size is fixed, old entries get replaced)
+transposition_table = TranspositionTable()
+
+# Killer moves and history table of the move ordering
+move_orderer = MoveOrderer()
+
+# Exact endgame solver (its solved positions are kept in memory and on disk between moves)
+endgame_solver = EndgameSolver()
+
+# Opening book of the seeded boards (see build_book.py), loaded on the first move
+opening_book = OpeningBook()
+
+# Model of the batched leaf evaluation (see utils/leaf_evaluation.py), None for evaluate_state
+leaf_model = None
+
+# Statistics of the last move (None if STATS is off)
+last_stats = None
+
+# Player of the next move as given by the engine (None to guess it from the agent names)
+engine_turn = None
+
+def enable_stats(enabled):
+    """
+    Called by the main engine to switch the search statistics on or off.
+    """
+    global STATS
+    STATS = enabled
+
+def set_turn(turn):
+    """
+    Called by the main engine before get_move with the player (1 or 2) of the agent.
+    """
+    global engine_turn
+    engine_turn = turn
+
+def is_own_agent(agent):
+    """
+    Returns True if `agent` (the agent name of a Player, e.g. a path of an AI file)
+    is this file.
+    """
+    return agent.replace('\\', '/').split('/')[-1].split('.')[-1] == __name__.split('.')[-1]
+
+def get_turn(player1, player2):
+    """
+    Returns the player (1 or 2) of the agent: the one given by the engine (set_turn),
+    else the player whose agent name is this file (player 2 against a human).
+    An engine without set_turn and the same agent in both seats gives player 1.
+    """
+    global engine_turn
+    if engine_turn is not None:
+        turn, engine_turn = engine_turn, None
+        return turn
+    if player1.get_agent() == "human" and player2.get_agent() != "human":
+        return 2
+    if is_own_agent(player2.get_agent()) and not is_own_agent(player1.get_agent()):
+        return 2
+    return 1
+
+def get_move_stats():
+    """
+    Called by the main engine after get_move.  Returns the statistics of the
+    last move as a dictionary (see SearchStats.to_dict), or None if STATS is off.
+    """
+    return last_stats
+
+def get_table_stats():
+    """
+    Returns the transposition table statistics (probes, hits, hit_rate, stores, rejected).
+    """
+    return transposition_table.get_stats()
+
+def get_search_depth_limit(cards, companion_cards):
+    """
+    Returns the most plies the rest of the game can take: every normal move
+    captures at least one card and every companion move uses up a companion card.
+    Searching deeper than this gives the same result.
+    """
+    return len(cards) - 1 + len(companion_cards)
+
+def search(cards, player1, player2, companion_cards, choose_companion, maximizing_player,
+           deadline=None, max_depth=None, stats=None):
+    """
+    Iterative deepening minimax search (depth 1, 2, 3, ...) until the deadline
+    passes or max_depth is searched.  With WORKERS > 1 the root moves of every
+    depth are split between the processes of the search pool.
+    The nodes of all the depths are counted in `stats` (optional SearchStats).
+    Returns (best_move, depth) of the deepest search that finished.
+    """
+
+    # Until a search finishes, fall back to the first legal move
+    if choose_companion:
+        root_moves = get_companion_moves(cards, companion_cards)
     else:
-        # Minimizing player's turn => player2
-        best_score = float("inf")
-        best_move = None
+        root_moves = get_valid_moves(cards)
 
-        for move in possible_moves:
-            new_cards, new_p1, new_p2 = clone_game_state(cards, player1, player2)
-            new_companions = copy.deepcopy(companion_cards)
+    chosen_move = root_moves[0] if root_moves else None
+    finished_depth = 0
 
-            house_chosen = None
-            next_choose_companion = False
+    depth_limit = get_search_depth_limit(cards, companion_cards)
+    if max_depth is not None:
+        depth_limit = min(depth_limit, max_depth)
 
-            if choose_companion:
-                house_chosen = make_companion_move(new_cards, new_companions, move, new_p2)
-                # Minimal approach
-                next_player_is_max = True
-            else:
-                house_chosen = make_normal_move(new_cards, move, new_p2)
-                if house_chosen is not None:
-                    count_in_board = sum(1 for c in new_cards if c.get_house() == house_chosen)
-                    if count_in_board == 0 and len(new_companions) > 0:
-                        next_choose_companion = True
-                next_player_is_max = True
+    # Start a new search generation of the transposition table and the move ordering
+    transposition_table.new_search()
+    move_orderer.new_search()
 
-            score, _ = minimax(
-                new_cards, new_p1, new_p2, new_companions,
-                next_choose_companion, depth - 1, alpha, beta, next_player_is_max
-            )
+    undo_stack = []
+    hasher = ZobristHasher(cards, player1, player2, companion_cards)
+    iteration_times = []
 
-            if score < best_score:
-                best_score = score
-                best_move = move
-            beta = min(beta, best_score)
-            if beta <= alpha:
+    for depth in range(1, depth_limit + 1):
+        iteration_start = time.perf_counter()
+
+        try:
+            if WORKERS > 1 and len(root_moves) > 1:
+                # Search the root moves in the worker processes
+                _, move, scores = parallel_minimax(
+                    cards, player1, player2, companion_cards, choose_companion,
+                    depth, maximizing_player, root_moves, deadline, stats
+                )
+
+                # The best moves of this depth are searched first at the next one
+                order = sorted(range(len(root_moves)), key=lambda index: scores[index], reverse=maximizing_player)
+                root_moves = [root_moves[index] for index in order]
+
+            else:
+                # Run minimax (the moves of the shallower searches are tried first through the table)
+                _, move = minimax(
+                    cards=cards,
+                    player1=player1,
+                    player2=player2,
+                    companion_cards=companion_cards,
+                    choose_companion=choose_companion,
+                    depth=depth,
+                    alpha=float("-inf"),
+                    beta=float("inf"),
+                    maximizing_player=maximizing_player,
+                    undo_stack=undo_stack,
+                    hasher=hasher,
+                    table=transposition_table,
+                    deadline=deadline,
+                    orderer=move_orderer,
+                    stats=stats
+                )
+
+        except SearchTimeout:
+            # Undo the moves of the unfinished search and keep the last finished one
+            while undo_stack:
+                hasher.restore(undo_move(cards, companion_cards, undo_stack))
+            break
+
+        if move is not None:
+            chosen_move = move
+        finished_depth = depth
+
+        iteration_times.append(time.perf_counter() - iteration_start)
+
+        # Don't start a depth that cannot finish in the remaining time
+        # (its time is estimated from the growth of the last two depths)
+        if deadline is not None and len(iteration_times) >= 2 and iteration_times[-2] > 0:
+            growth = max(1.0, iteration_times[-1] / iteration_times[-2])
+            if time.perf_counter() + iteration_times[-1] * growth > deadline:
                 break
-        return best_score, best_move
 
+    return chosen_move, finished_depth
 
-# -------------------------------
-#        PUBLIC API
-# -------------------------------
 def get_move(cards, player1, player2, companion_cards, choose_companion):
     """
-    Called by the main engine.  We do a shallow depth minimax search (depth=2 or 3).
+    Called by the main engine.  We run an iterative deepening minimax search
+    (depth 1, 2, 3, ...) until TIME_BUDGET runs out, and play the best move of
+    the deepest search that finished.
     Returns a single move:
        - If choose_companion == False, return a board location (int) for the normal move.
        - If choose_companion == True, return a list like [companionName, ...any-other-data...].
     """
 
-    # We'll do a short search (e.g. depth=2).  You can raise this but keep an eye on performance.
-    SEARCH_DEPTH = 3
+    global last_stats
+
+    start_time = time.perf_counter()
+    deadline = start_time + TIME_BUDGET
+    stats = SearchStats() if STATS else None
+
+    # Treat player1 as the maximizing player if player1 is about to move. The engine
+    # gives the player of the agent with set_turn; without it, it is guessed from the
+    # agent names (see get_turn). The endgame solver and the opening book play for the
+    # player to move of the state, so the guess must be right.
+    p1_is_max = get_turn(player1, player2) == 1
+
+    state = GameState.from_cards(cards, companion_cards, player1, player2, 1 if p1_is_max else 2, choose_companion)
+
+    # A position of the opening book: play its deep-searched move
+    chosen_move = opening_book.get_move(state)
+    if chosen_move is not None:
+        if stats is not None:
+            stats.solver = 'book'
+        last_stats = finish_stats(stats, start_time)
+        return chosen_move
+
+    # Few cards left: solve the game exactly (with the tie-breaks of the banners and the winner)
+    if len(cards) - 1 <= ENDGAME_CARDS:
+        solver_nodes = endgame_solver.nodes
+        try:
+            chosen_move, _ = endgame_solver.get_best_move(state, time.perf_counter() + TIME_BUDGET * ENDGAME_SHARE)
+        except SolverTimeout:
+            chosen_move = None
+        if stats is not None:
+            stats.nodes += endgame_solver.nodes - solver_nodes
+            stats.solver = 'endgame'
+        if chosen_move is not None:
+            last_stats = finish_stats(stats, start_time)
+            return chosen_move
+
+    chosen_move, depth = search(cards, player1, player2, companion_cards, choose_companion, p1_is_max, deadline,
+                                stats=stats)
+
+    if stats is not None:
+        stats.solver = 'search'
+        stats.depth = depth
+    last_stats = finish_stats(stats, start_time)
 
-    # For convenience in this script, treat player1 as the maximizing player if
-    # the main is currently on "turn=1", i.e. if player1 is about to move. 
-    # There's no direct "turn" argument, but we can guess based on the name field:
-    #   If player1's agent name is the same as "minimax_agent", we assume it's our turn as maximizing.
-    # This is a hack — you can track actual turn from your main if you pass it in.
+    return chosen_move
 
-    # We'll compare the agent's name to guess if it's the maximizing or not.
-    # If both are "minimax_agent," then let's assume 'player1' is maximizing and 'player2' is minimizing.
-    # (Your environment might do something else. Adjust as needed.)
-    p1_is_max = True  # default assumption
+def finish_stats(stats, start_time):
+    """
+    Sets the time of the move in `stats` and returns them as a dictionary (None without stats).
+    """
+    if stats is None:
+        return None
+    stats.elapsed = time.perf_counter() - start_time
+    return stats.to_dict()
 
-    # If needed, you could store who is currently to move in a global, or pass from main. 
-    # For now, let's do a trick: if it's "human" vs "minimax_agent", we guess "minimax_agent" is player2 => p1_is_max=False
-    if player1.get_agent() == "human" and player2.get_agent() != "human":
-        # Then the "minimax_agent" is second => p1_is_max=False
-        p1_is_max = False
-    # If both are minimax, let's keep the default p1_is_max = True.
-
-    # Run minimax
-    _, chosen_move = minimax(
-        cards=cards,
-        player1=player1,
-        player2=player2,
-        companion_cards=companion_cards,
-        choose_companion=choose_companion,
-        depth=SEARCH_DEPTH,
-        alpha=float("-inf"),
-        beta=float("inf"),
-        maximizing_player=p1_is_max
+
+# -------------------------------
+#        PARALLEL SEARCH
+# -------------------------------
+
+# Process pool of the parallel search, and the best root score found so far
+# (shared by the workers, so every root move is searched with the best bound)
+search_pool = None
+search_pool_workers = 0
+shared_best = None
+
+# Root position the worker process is searching (its tables start a new search for a new one)
+worker_search_id = None
+
+def init_search_worker(best):
+    """
+    Runs in every process of the search pool: keeps the shared best score.
+    """
+    global shared_best
+    shared_best = best
+
+def get_search_pool():
+    """
+    Returns the process pool of the parallel search (with WORKERS processes).
+    """
+    global search_pool, search_pool_workers, shared_best
+
+    if search_pool is None or search_pool_workers != WORKERS:
+        if search_pool is not None:
+            search_pool.shutdown()
+
+        shared_best = multiprocessing.Value('d', 0.0)
+        search_pool = create_pool(WORKERS, init_search_worker, (shared_best,))
+        search_pool_workers = WORKERS
+
+    return search_pool
+
+def close_search_pool():
+    """
+    Stops the processes of the search pool (when the program exits).
+    """
+    global search_pool
+
+    if search_pool is not None:
+        search_pool.shutdown()
+        search_pool = None
+
+atexit.register(close_search_pool)
+
+def search_root_move(position, move, depth, maximizing_player, deadline, search_id, collect_stats=False):
+    """
+    Runs in a process of the search pool: makes one root move and searches the
+    rest of the depth, with the best score of the other root moves as the bound.
+    Returns (score, bound, stats): the score (only a bound if it is not better than
+    the bound), or None if the deadline passed, the bound the search started from,
+    and the SearchStats of the search (None without collect_stats).
+    """
+    global worker_search_id
+
+    # A new root position: start a new search of the tables of this process
+    if worker_search_id != search_id:
+        transposition_table.new_search()
+        move_orderer.new_search()
+        worker_search_id = search_id
+
+    cards, player1, player2, companion_cards, choose_companion = position
+
+    undo_stack = []
+    hasher = ZobristHasher(cards, player1, player2, companion_cards)
+    current_player, opponent = (player1, player2) if maximizing_player else (player2, player1)
+
+    next_choose_companion = make_search_move(
+        cards, companion_cards, move, choose_companion, current_player, undo_stack, hasher, opponent
     )
 
-    return chosen_move
+    # Only a score better than the best one so far matters
+    best = shared_best.value
+    if maximizing_player:
+        alpha, beta = best, float("inf")
+    else:
+        alpha, beta = float("-inf"), best
+
+    stats = SearchStats() if collect_stats else None
+
+    try:
+        score, _ = minimax(
+            cards, player1, player2, companion_cards,
+            next_choose_companion, depth - 1, alpha, beta, not maximizing_player, undo_stack,
+            hasher, transposition_table, deadline, move_orderer, 1, stats
+        )
+    except SearchTimeout:
+        return None, best, stats
+
+    with shared_best.get_lock():
+        if (score > shared_best.value) if maximizing_player else (score < shared_best.value):
+            shared_best.value = score
+
+    return score, best, stats
+
+def parallel_minimax(cards, player1, player2, companion_cards, choose_companion,
+                     depth, maximizing_player, root_moves, deadline, stats=None):
+    """
+    Searches the root moves in the processes of the search pool.  The first (most
+    promising) move is searched alone, so the other moves start with its score as
+    the bound, and then the other moves are searched at the same time.
+    (The deadline is a time.perf_counter() value, which is the same clock in every process.)
+    Returns (best_score, best_move, scores) with the score of every root move (the
+    worst score for a move that only found a bound); raises SearchTimeout if the
+    deadline passed.  The counters of the processes
+    are added to `stats` (optional SearchStats).
+    """
+
+    pool = get_search_pool()
+    position = (cards, player1, player2, companion_cards, choose_companion)
+    search_id = transposition_table.generation
+
+    shared_best.value = float("-inf") if maximizing_player else float("inf")
+
+    collect_stats = stats is not None
+
+    results = [pool.submit(search_root_move, position, root_moves[0], depth, maximizing_player, deadline, search_id,
+                           collect_stats).result()]
+
+    if results[0][0] is not None:
+        futures = [
+            pool.submit(search_root_move, position, move, depth, maximizing_player, deadline, search_id, collect_stats)
+            for move in root_moves[1:]
+        ]
+        results += [future.result() for future in futures]
+
+    # The root node and its moves are counted here, the rest of the tree in the processes
+    if collect_stats:
+        stats.count_node(choose_companion)
+        stats.count_moves(0, len(root_moves))
+        for _, _, move_stats in results:
+            stats.merge(move_stats)
+
+    if any(score is None for score, _, _ in results):
+        raise SearchTimeout
+
+    # The search is fail-soft, so a score that is not better than the bound it started
+    # from is only a bound (it can equal the real score of a better move): those moves
+    # get the worst score (the first move starts from no bound, so its score is real)
+    worst = float("-inf") if maximizing_player else float("inf")
+    scores = [
+        score if (score > bound if maximizing_player else score < bound) else worst
+        for score, bound, _ in results
+    ]
+
+    # The first move with the best score
+    best_score = max(scores) if maximizing_player else min(scores)
+    best_move = root_moves[scores.index(best_score)]
+
+    return best_score, best_move, scores
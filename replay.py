@@ -0,0 +1,177 @@
+import argparse
+import json
+import sys
+import time
+from os import environ
+from os.path import abspath, join, dirname
+
+# Set the path of the file
+path = dirname(abspath(__file__))
+
+sys.path.append(join(path, "utils"))
+
+from bitboard import HOUSES, COMPANIONS
+from game_record import load_records
+
+parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King - replay of recorded games")
+parser.add_argument('file', type=str, help="file of game records (see main.py --record and tournament.py --records)")
+parser.add_argument('-g', '--game', type=int, help="game to show a position of (index in the file)", default=None)
+parser.add_argument('-m', '--move', type=int, help="number of moves played before the shown position (default: the end of the game)", default=None)
+parser.add_argument('--video', type=int, nargs='+', help="games to render videos of (indexes in the file)", default=None)
+
+def list_games(records):
+    '''
+    This function prints one line for every game of a file.
+
+    Parameters:
+        records (list): the records of the games
+    '''
+
+    print(f"{'Game':>5} {'Player 1':<20} {'Player 2':<20} {'Seed':>10} {'Moves':>6} {'Winner':>7}")
+
+    for index, record in enumerate(records):
+        seed = record.seed if record.seed is not None else '-'
+        winner = record.winner if record.winner is not None else '-'
+
+        print(f"{index:>5} {record.agents[0]:<20} {record.agents[1]:<20} {seed:>10} {len(record.moves):>6} {winner:>7}")
+
+def time_state(record, move_number, repeats=1000):
+    '''
+    This function measures how long it takes to rebuild a position of a game.
+
+    Parameters:
+        record (GameRecord): record of the game
+        move_number (int/None): number of moves played (None for the end of the game)
+        repeats (int): number of rebuilds
+
+    Returns:
+        seconds (float): average time of a rebuild
+    '''
+
+    start_time = time.perf_counter()
+
+    for _ in range(repeats):
+        record.get_state(move_number)
+
+    return (time.perf_counter() - start_time) / repeats
+
+def print_position(record, move_number=None):
+    '''
+    This function prints a position of a game: the board, the captured cards and banners
+    of both players, the remaining companion cards and the player to move.
+
+    Parameters:
+        record (GameRecord): record of the game
+        move_number (int/None): number of moves played (None for the end of the game)
+    '''
+
+    state = record.get_state(move_number)
+    played = len(record.moves[:move_number])
+
+    print(f"{record.agents[0]} vs {record.agents[1]} (seed {record.seed}), after {played} of {len(record.moves)} moves")
+
+    if played:
+        print(f"Last move: {json.dumps(record.moves[played - 1])}")
+
+    print()
+
+    # The board, one row of squares per line
+    for row in range(6):
+        names = [(state.names[row * 6 + col] or '.')[:11] for col in range(6)]
+        print(' '.join(f"{name:<11}" for name in names))
+
+    print()
+
+    for player in range(2):
+        cards = ' '.join(f"{house}: {state.captured[player][index]}{'*' if state.banners[player][index] else ''}" for index, house in enumerate(HOUSES))
+        print(f"Player {player + 1} cards (* banner): {cards}")
+
+    companions = [companion for index, companion in enumerate(COMPANIONS) if state.companions >> index & 1]
+
+    print(f"Companion cards: {', '.join(companions) or '-'}")
+
+    if state.is_game_over():
+        print(f"Game over, winner: player {state.calculate_winner()}")
+
+    else:
+        print(f"Player {state.turn} to move{' (companion card)' if state.choose_companion else ''}")
+
+    print(f"\nPosition rebuilt in {time_state(record, move_number) * 1e6:.1f} µs")
+
+def render_video(record, file_name):
+    '''
+    This function renders the video of a recorded game, with the same frames as
+    the video recorded by main during the game.
+
+    Parameters:
+        record (GameRecord): record of the game
+        file_name (str): name of the video file (in the videos folder)
+    '''
+
+    # Draw to a hidden window (the frames only go to the video)
+    environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+    import pygraphics
+
+    with open(join(path, "assets", "characters.json"), 'r') as file:
+        companion_cards = json.load(file)['Companion']
+
+    board = pygraphics.init_board()
+    pygraphics.start_video(file_name)
+
+    # The initial board, then the board of player 1's turn
+    state = record.get_state(0)
+    pygraphics.draw_board(board, state.to_cards(), companion_cards, '0', None)
+    pygraphics.draw_board(board, state.to_cards(), companion_cards, '1')
+
+    for move, state in record.get_states():
+        # A pass does not change the board
+        if move is None:
+            continue
+
+        footer = 'CC' if state.choose_companion else str(state.turn)
+        pygraphics.draw_board(board, state.to_cards(), state.get_companion_cards(companion_cards), footer, state.choose_companion)
+
+    winner = state.calculate_winner()
+    pygraphics.display_winner(board, winner, record.agents[0] if winner == 1 else record.agents[1])
+
+    pygraphics.save_video()
+
+def render_videos(records, games):
+    '''
+    This function renders the videos of the selected games of a file.
+
+    Parameters:
+        records (list): the records of the games
+        games (list): indexes of the games
+    '''
+
+    for game in games:
+        record = records[game]
+
+        # Agent names without their folders, as in main
+        agents = [agent[max(0, agent.find('/'), agent.find('\\')):] for agent in record.agents]
+        file_name = f"{agents[0]}_vs_{agents[1]}_game_{game}"
+
+        start_time = time.perf_counter()
+        render_video(record, file_name)
+
+        print(f"Game {game}: videos/{file_name}.mp4 ({time.perf_counter() - start_time:.1f} s)")
+
+    if games:
+        import pygraphics
+        pygraphics.close_board()
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    records = load_records(args.file)
+
+    if args.video is not None:
+        render_videos(records, args.video)
+
+    elif args.game is not None:
+        print_position(records[args.game], args.move)
+
+    else:
+        list_games(records)
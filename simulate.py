@@ -0,0 +1,61 @@
+import argparse
+import sys
+import time
+from os.path import abspath, join, dirname
+
+import numpy as np
+
+# Set the path of the file
+path = dirname(abspath(__file__))
+
+sys.path.append(join(path, "utils"))
+
+from batch_simulator import BatchSimulator, random_policy, greedy_policy
+from tournament import wilson_interval
+
+POLICIES = {'random': random_policy, 'greedy': greedy_policy}
+
+parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King - batch simulation of playouts")
+parser.add_argument('-n', '--games', type=int, help="number of games", default=100000)
+parser.add_argument('-b', '--batch', type=int, help="number of games simulated at the same time", default=50000)
+parser.add_argument('--policy', type=str, choices=POLICIES.keys(), help="policy of the normal moves (for both players)", default='random')
+parser.add_argument('--seed', type=int, help="seed of the random generator", default=None)
+
+def simulate(games, batch=50000, policy=random_policy, seed=None):
+    '''
+    This function plays random boards in batches and counts the winners.
+
+    Parameters:
+        games (int): number of games
+        batch (int): number of games simulated at the same time
+        policy (function): policy of the normal moves (see batch_simulator)
+        seed (int/None): seed of the random generator
+
+    Returns:
+        wins (ndarray): number of games with no winner, won by player 1 and won by player 2
+    '''
+
+    wins = np.zeros(3, dtype=np.int64)
+    seeds = np.random.SeedSequence(seed).spawn((games + batch - 1) // batch)
+
+    for index, batch_seed in enumerate(seeds):
+        simulator = BatchSimulator(min(batch, games - index * batch), seed=batch_seed)
+        wins += np.bincount(simulator.run(policy), minlength=3)
+
+    return wins
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    wins = simulate(args.games, args.batch, POLICIES[args.policy], args.seed)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{args.games} games in {elapsed:.1f} s ({args.games / elapsed:.0f} games/s)")
+
+    for player in (1, 2):
+        low, high = wilson_interval(wins[player], args.games)
+        print(f"Player {player} wins {wins[player]} ({wins[player] / args.games:.4f}, 95% CI [{low:.4f}, {high:.4f}])")
+
+    if wins[0]:
+        print(f"No winner in {wins[0]} games")
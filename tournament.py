@@ -0,0 +1,215 @@
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import time
+from itertools import combinations
+from os.path import abspath, join, dirname
+
+import main
+from game_record import save_record
+
+# Set the path of the file
+path = dirname(abspath(__file__))
+
+parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King - AI tournament")
+parser.add_argument('agents', metavar='agent', type=str, nargs='+', help="AI files that play against each other (every pair)")
+parser.add_argument('-n', '--boards', type=int, help="number of boards for every pair of agents", default=100)
+parser.add_argument('--seed', type=int, help="seed of the first board (board i uses seed + i)", default=0)
+parser.add_argument('-w', '--workers', type=int, help="number of worker processes", default=os.cpu_count())
+parser.add_argument('-o', '--output', type=str, help="file to stream the results to (one JSON line per game)", default=None)
+parser.add_argument('--stats', type=str, help="folder to save the search statistics of every game to (one JSON file per game)", default=None)
+parser.add_argument('-r', '--records', type=str, help="file to append the records of the games to (see replay.py)", default=None)
+
+def run_game(game):
+    '''
+    This function plays one game of the tournament (in a worker process).
+
+    Parameters:
+        game (tuple): agent of player 1, agent of player 2, board seed, board index and
+            statistics file (None for no statistics)
+
+    Returns:
+        result (dict): result of the game (see main.play_game) with the board index
+    '''
+
+    agent1, agent2, seed, board, stats_file = game
+
+    result = main.play_game(agent1, agent2, seed=seed, stats_file=stats_file)
+    result['board'] = board
+
+    return result
+
+def make_games(agents, boards, seed, stats=None):
+    '''
+    This function makes the games of the tournament. Every pair of agents plays
+    every board twice, once with each agent as player 1.
+
+    Parameters:
+        agents (list): names of the AI files
+        boards (int): number of boards for every pair
+        seed (int): seed of the first board
+        stats (str/None): folder of the statistics files (None for no statistics)
+
+    Returns:
+        games (list): list of (agent1, agent2, seed, board, stats_file) tuples
+    '''
+
+    games = []
+
+    for first, second in combinations(agents, 2):
+        for board in range(boards):
+            for agent1, agent2 in ((first, second), (second, first)): # Seat swap
+                # One statistics file per game (numbered, so agents playing themselves do not share files)
+                stats_file = join(stats, f"game_{len(games)}_{agent1}_{agent2}_{board}.json") if stats is not None else None
+
+                games.append((agent1, agent2, seed + board, board, stats_file))
+
+    return games
+
+def wilson_interval(wins, games, z=1.96):
+    '''
+    This function calculates the Wilson score interval of a win rate.
+
+    Parameters:
+        wins (float): number of wins
+        games (int): number of games
+        z (float): z-score of the confidence level (1.96 for 95%)
+
+    Returns:
+        low (float): lower bound of the win rate
+        high (float): upper bound of the win rate
+    '''
+
+    if games == 0:
+        return 0.0, 1.0
+
+    rate = wins / games
+    denominator = 1 + z * z / games
+    center = (rate + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / denominator
+
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+class Scoreboard:
+    '''
+    This class keeps the aggregate results of the tournament.
+    '''
+
+    def __init__(self):
+        '''
+        This function initializes the scoreboard.
+        '''
+
+        self.pairs = {} # (agent, opponent) -> [wins, games]
+        self.seats = {1: 0, 2: 0, None: 0} # Wins by seat (None for no winner)
+        self.games = 0
+
+    def add(self, result):
+        '''
+        This function adds the result of a game.
+
+        Parameters:
+            result (dict): result of the game (see main.play_game)
+        '''
+
+        agent1, agent2 = result['agents']
+        winner = result['winner']
+
+        for agent, opponent, seat in ((agent1, agent2, 1), (agent2, agent1, 2)):
+            record = self.pairs.setdefault((agent, opponent), [0, 0])
+            record[0] += 1 if winner == seat else 0.5 if winner is None else 0
+            record[1] += 1
+
+        self.seats[winner] += 1
+        self.games += 1
+
+    def report(self):
+        '''
+        This function prints the win rates with 95% confidence intervals.
+        '''
+
+        print(f"{'Agent':<20} {'Opponent':<20} {'Games':>6} {'Win rate':>9}  95% CI")
+
+        totals = {}
+
+        for (agent, opponent), (wins, games) in sorted(self.pairs.items()):
+            low, high = wilson_interval(wins, games)
+            print(f"{agent:<20} {opponent:<20} {games:>6} {wins / games:>9.3f}  [{low:.3f}, {high:.3f}]")
+
+            total = totals.setdefault(agent, [0, 0])
+            total[0] += wins
+            total[1] += games
+
+        print()
+
+        for agent, (wins, games) in sorted(totals.items()):
+            low, high = wilson_interval(wins, games)
+            print(f"{agent:<20} {'(all)':<20} {games:>6} {wins / games:>9.3f}  [{low:.3f}, {high:.3f}]")
+
+        # First player advantage
+        decided = self.seats[1] + self.seats[2]
+        if decided:
+            low, high = wilson_interval(self.seats[1], decided)
+            print(f"\nPlayer 1 wins {self.seats[1]} of {decided} decided games ({self.seats[1] / decided:.3f}, 95% CI [{low:.3f}, {high:.3f}])")
+
+def run_tournament(agents, boards=100, seed=0, workers=None, output=None, stats=None, records=None):
+    '''
+    This function plays the tournament on a process pool and streams the results to a file.
+
+    Parameters:
+        agents (list): names of the AI files
+        boards (int): number of boards for every pair
+        seed (int): seed of the first board
+        workers (int): number of worker processes (None for the number of CPUs)
+        output (str): file to write the results to (one JSON line per game)
+        stats (str/None): folder to save the search statistics of every game to (None for no statistics)
+        records (str/None): file to append the records of the games to (None for no records)
+
+    Returns:
+        scoreboard (Scoreboard): the aggregate results
+    '''
+
+    games = make_games(agents, boards, seed, stats)
+
+    if output is None:
+        output = join(path, "results", "tournament_" + "_".join(agents) + ".jsonl")
+
+    os.makedirs(dirname(abspath(output)), exist_ok=True)
+
+    scoreboard = Scoreboard()
+    start_time = time.perf_counter()
+
+    with open(output, 'w') as file, concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_game, game) for game in games]
+
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+
+            # The records are saved by this process, so the workers do not write to the same file
+            record = result.pop('record')
+
+            if records is not None:
+                save_record(record, records)
+
+            # Write the result as soon as the game is finished
+            file.write(json.dumps(result) + '\n')
+            file.flush()
+
+            scoreboard.add(result)
+
+            # Print the progress
+            print(f"\r{scoreboard.games}/{len(games)} games", end='', flush=True)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\n{len(games)} games in {elapsed:.1f} s ({len(games) / elapsed:.2f} games/s), results in {output}\n")
+
+    return scoreboard
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    scoreboard = run_tournament(args.agents, args.boards, args.seed, args.workers, args.output, args.stats, args.records)
+
+    scoreboard.report()
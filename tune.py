@@ -0,0 +1,354 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import time
+from os.path import abspath, join, dirname, exists
+
+import main
+import gen_mini_max
+from endgame import EndgameSolver
+from opening_book import OpeningBook
+from transposition import TranspositionTable
+from move_ordering import MoveOrderer
+
+# Set the path of the file
+path = dirname(abspath(__file__))
+
+parser = argparse.ArgumentParser(description="A Game of Thrones: Hand of the King - genetic tuning of the gen_mini_max weights")
+parser.add_argument('-g', '--generations', type=int, help="number of generations (a resumed run continues up to it)", default=20)
+parser.add_argument('-p', '--population', type=int, help="number of weight vectors of every generation", default=12)
+parser.add_argument('-e', '--elite', type=int, help="number of best weight vectors kept for the next generation", default=3)
+parser.add_argument('-n', '--boards', type=int, help="number of seeded boards every weight vector plays (from both seats) in a generation", default=10)
+parser.add_argument('--seed', type=int, help="seed of the tuning (the boards and the mutations)", default=0)
+parser.add_argument('--sigma', type=float, help="standard deviation of the mutations (relative to the mean weight)", default=0.3)
+parser.add_argument('-t', '--time', type=float, help="time budget of a move of the agents in seconds", default=0.1)
+parser.add_argument('-w', '--workers', type=int, help="number of worker processes", default=os.cpu_count())
+parser.add_argument('-c', '--checkpoint', type=str, help="checkpoint file (an existing checkpoint is resumed)", default=join(path, "results", "tune_checkpoint.json"))
+parser.add_argument('-o', '--output', type=str, help="file to export the best weights to (loaded by gen_mini_max)", default=gen_mini_max.WEIGHTS_PATH)
+
+class TunedAgent:
+    '''
+    This class is the gen_mini_max agent with its own weights. Both agents of a game run
+    in the same process, so every agent also has its own transposition table and move
+    ordering (the scores of other weights must not be reused). Both players have the
+    same agent name, so the engine gives the agent its player (see set_turn).
+    '''
+
+    def __init__(self, weights):
+        '''
+        This function initializes the agent.
+
+        Parameters:
+            weights (dict): weights of the evaluation
+        '''
+
+        self.weights = weights
+        self.table = TranspositionTable()
+        self.orderer = MoveOrderer()
+
+    def set_turn(self, turn):
+        '''
+        This function sets the player of the next move (called by the game engine before get_move).
+
+        Parameters:
+            turn (int): player of the agent (1 or 2)
+        '''
+
+        gen_mini_max.set_turn(turn)
+
+    def get_move(self, cards, player1, player2, companion_cards, choose_companion):
+        '''
+        This function gets the move of gen_mini_max with the weights of the agent.
+
+        Parameters:
+            cards (list): list of Card objects
+            player1 (Player): player 1
+            player2 (Player): player 2
+            companion_cards (dict): dictionary of companion cards
+            choose_companion (bool): flag to choose a companion card
+
+        Returns:
+            move (int/list): the move of the agent
+        '''
+
+        gen_mini_max.WEIGHTS = self.weights
+        gen_mini_max.transposition_table = self.table
+        gen_mini_max.move_orderer = self.orderer
+
+        return gen_mini_max.get_move(cards, player1, player2, companion_cards, choose_companion)
+
+def init_worker(move_time):
+    '''
+    This function sets up gen_mini_max in a worker process: the time budget of the
+    tuning, no opening book (its moves do not depend on the weights), an endgame
+    solver without the table on disk (the workers would write to it at the same time)
+    and no leaf model (it would be used instead of the weights).
+
+    Parameters:
+        move_time (float): time budget of a move in seconds
+    '''
+
+    gen_mini_max.TIME_BUDGET = move_time
+    gen_mini_max.WORKERS = 1
+    gen_mini_max.opening_book = OpeningBook(None)
+    gen_mini_max.endgame_solver = EndgameSolver(None)
+    gen_mini_max.leaf_model = None
+
+def play_match(weights, opponent, seed, seat):
+    '''
+    This function plays a game between two weight vectors (in a worker process).
+
+    Parameters:
+        weights (dict): weights of the evaluated agent
+        opponent (dict): weights of its opponent
+        seed (int): seed of the board
+        seat (int): player of the evaluated agent (1 or 2)
+
+    Returns:
+        score (float): 1 for a win, 0.5 for no winner, 0 for a loss
+    '''
+
+    agents = (TunedAgent(weights), TunedAgent(opponent))
+
+    if seat == 2:
+        agents = agents[::-1]
+
+    winner = main.play_game(agents[0], agents[1], seed=seed)['winner']
+
+    return 1.0 if winner == seat else 0.5 if winner is None else 0.0
+
+def normalize(weights, norm):
+    '''
+    This function scales the weights to a sum of absolute values. Scaling every weight
+    does not change the moves of the search, so only the ratios are tuned.
+
+    Parameters:
+        weights (dict): weights of the evaluation
+        norm (float): sum of the absolute values of the scaled weights
+
+    Returns:
+        weights (dict): the scaled weights (rounded to 4 digits)
+    '''
+
+    total = sum(abs(weight) for weight in weights.values()) or 1.0
+
+    return {name: round(weight * norm / total, 4) for name, weight in weights.items()}
+
+def mutate(weights, sigma, generator):
+    '''
+    This function adds Gaussian noise to the weights.
+
+    Parameters:
+        weights (dict): weights of the evaluation
+        sigma (float): standard deviation of the noise (relative to the mean weight)
+        generator (random.Random): random generator
+
+    Returns:
+        weights (dict): the mutated weights (not negative)
+    '''
+
+    scale = sum(abs(weight) for weight in weights.values()) / len(weights)
+
+    return {name: max(0.0, weight + generator.gauss(0, sigma * scale)) for name, weight in weights.items()}
+
+def crossover(first, second, generator):
+    '''
+    This function blends two weight vectors (a random mix of every weight).
+
+    Parameters:
+        first (dict): weights of the first parent
+        second (dict): weights of the second parent
+        generator (random.Random): random generator
+
+    Returns:
+        weights (dict): the weights of the child
+    '''
+
+    mixes = {name: generator.random() for name in first}
+
+    return {name: mixes[name] * first[name] + (1 - mixes[name]) * second[name] for name in first}
+
+def first_population(baseline, size, sigma, norm, generator):
+    '''
+    This function makes the first generation: the baseline and mutations of it.
+
+    Parameters:
+        baseline (dict): weights to start from
+        size (int): number of weight vectors
+        sigma (float): standard deviation of the mutations
+        norm (float): sum of the absolute values of the weights
+        generator (random.Random): random generator
+
+    Returns:
+        population (list): the weight vectors
+    '''
+
+    return [normalize(baseline, norm)] + [normalize(mutate(baseline, sigma, generator), norm) for _ in range(size - 1)]
+
+def next_population(population, fitness, elite, sigma, norm, generator):
+    '''
+    This function makes the next generation: the elite weight vectors are kept and the
+    others are children of two parents of the better half (tournament selection),
+    with crossover and mutation.
+
+    Parameters:
+        population (list): the weight vectors
+        fitness (list): the fitness of every weight vector
+        elite (int): number of best weight vectors kept
+        sigma (float): standard deviation of the mutations
+        norm (float): sum of the absolute values of the weights
+        generator (random.Random): random generator
+
+    Returns:
+        population (list): the weight vectors of the next generation
+    '''
+
+    ranked = [population[index] for index in sorted(range(len(population)), key=lambda index: fitness[index], reverse=True)]
+    parents = ranked[:max(2, len(ranked) // 2)]
+
+    children = ranked[:elite]
+
+    while len(children) < len(population):
+        # The better of two random parents (twice)
+        first = min(generator.sample(range(len(parents)), 2))
+        second = min(generator.sample(range(len(parents)), 2))
+
+        children.append(normalize(mutate(crossover(parents[first], parents[second], generator), sigma, generator), norm))
+
+    return children
+
+def evaluate_population(executor, population, opponent, seeds):
+    '''
+    This function plays every weight vector against the opponent on the boards,
+    once from each seat.
+
+    Parameters:
+        executor (ProcessPoolExecutor): the process pool
+        population (list): the weight vectors
+        opponent (dict): weights of the opponent
+        seeds (list): seeds of the boards
+
+    Returns:
+        fitness (list): the score rate of every weight vector
+    '''
+
+    futures = {executor.submit(play_match, weights, opponent, seed, seat): index
+               for index, weights in enumerate(population) for seed in seeds for seat in (1, 2)}
+
+    scores = [0.0] * len(population)
+
+    for future in concurrent.futures.as_completed(futures):
+        scores[futures[future]] += future.result()
+
+    return [score / (2 * len(seeds)) for score in scores]
+
+def save_checkpoint(checkpoint, filename):
+    '''
+    This function saves the checkpoint of the tuning (to a temporary file first,
+    so an interrupted save keeps the previous checkpoint).
+
+    Parameters:
+        checkpoint (dict): the state of the tuning
+        filename (str): path of the file
+    '''
+
+    os.makedirs(dirname(abspath(filename)), exist_ok=True)
+
+    with open(filename + '.tmp', 'w') as file:
+        json.dump(checkpoint, file, indent=4)
+
+    os.replace(filename + '.tmp', filename)
+
+def tune(generations=20, population_size=12, elite=3, boards=10, seed=0, sigma=0.3, move_time=0.1, workers=None,
+         checkpoint_file=None, output=gen_mini_max.WEIGHTS_PATH):
+    '''
+    This function tunes the weights of gen_mini_max with a genetic algorithm. Every
+    generation plays all weight vectors against the weights gen_mini_max loaded
+    (on new seeded boards, from both seats) on a process pool, saves a checkpoint
+    and exports the best weights found so far.
+
+    Parameters:
+        generations (int): number of generations
+        population_size (int): number of weight vectors of every generation
+        elite (int): number of best weight vectors kept for the next generation
+        boards (int): number of boards of every generation
+        seed (int): seed of the tuning
+        sigma (float): standard deviation of the mutations
+        move_time (float): time budget of a move in seconds
+        workers (int/None): number of worker processes (None for the number of CPUs)
+        checkpoint_file (str/None): checkpoint file (resumed if it exists)
+        output (str): file to export the best weights to
+
+    Returns:
+        best (dict): the best weights
+    '''
+
+    baseline = gen_mini_max.load_weights()
+    norm = sum(abs(weight) for weight in baseline.values())
+
+    if checkpoint_file is not None and exists(checkpoint_file):
+        # Resume the tuning
+        with open(checkpoint_file, 'r') as file:
+            checkpoint = json.load(file)
+
+        print(f"Resuming {checkpoint_file} at generation {checkpoint['generation']}")
+
+    else:
+        checkpoint = {'generation': 0,
+                      'baseline': baseline,
+                      'population': first_population(baseline, population_size, sigma, norm, random.Random(seed)),
+                      'best': baseline,
+                      'best_fitness': None,
+                      'history': []}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(move_time,)) as executor:
+        for generation in range(checkpoint['generation'], generations):
+            # New boards every generation (the same for all weight vectors)
+            seeds = [seed + generation * boards + board for board in range(boards)]
+
+            start_time = time.perf_counter()
+            fitness = evaluate_population(executor, checkpoint['population'], checkpoint['baseline'], seeds)
+            elapsed = time.perf_counter() - start_time
+
+            games = 2 * boards * len(checkpoint['population'])
+            best_index = max(range(len(fitness)), key=lambda index: fitness[index])
+            best = checkpoint['population'][best_index]
+
+            if checkpoint['best_fitness'] is None or fitness[best_index] >= checkpoint['best_fitness']:
+                checkpoint['best'] = best
+                checkpoint['best_fitness'] = fitness[best_index]
+
+            checkpoint['history'].append({'generation': generation,
+                                          'fitness': fitness,
+                                          'best': best,
+                                          'games': games,
+                                          'seconds': round(elapsed, 2),
+                                          'games_per_second': round(games / elapsed, 3)})
+
+            # The mutations get smaller as the tuning goes on
+            generator = random.Random(seed * 1000003 + generation + 1)
+            checkpoint['population'] = next_population(checkpoint['population'], fitness, elite,
+                                                       sigma * 0.9 ** (generation + 1), norm, generator)
+            checkpoint['generation'] = generation + 1
+
+            if checkpoint_file is not None:
+                save_checkpoint(checkpoint, checkpoint_file)
+
+            # Export the best weights so far (gen_mini_max loads them at import time)
+            with open(output, 'w') as file:
+                json.dump(checkpoint['best'], file, indent=4)
+
+            print(f"Generation {generation}: best {fitness[best_index]:.3f} {best}, "
+                  f"mean {sum(fitness) / len(fitness):.3f}, {games} games in {elapsed:.1f} s ({games / elapsed:.2f} games/s)")
+
+    print(f"Best weights {checkpoint['best']} (score rate {checkpoint['best_fitness']}) exported to {output}")
+
+    return checkpoint['best']
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    tune(args.generations, args.population, args.elite, args.boards, args.seed, args.sigma, args.time, args.workers,
+         args.checkpoint, args.output)
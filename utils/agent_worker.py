@@ -0,0 +1,375 @@
+import importlib
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import random
+import traceback
+from os import pardir
+from os.path import abspath, join, dirname
+
+from classes import Card, Player
+
+# Get the path of the assets folder
+assets_path = join((abspath(join(dirname(abspath(__file__)), pardir))), "assets")
+
+workers = [] # Running workers (closed when the program exits)
+workers_pid = None # Process that owns the running workers
+
+def encode_cards(cards):
+    '''
+    This function encodes a list of cards as tuples.
+
+    Parameters:
+        cards (list): list of Card objects
+
+    Returns:
+        encoded (tuple): tuple of (house, name, location) tuples
+    '''
+
+    return tuple((card.get_house(), card.get_name(), card.get_location()) for card in cards)
+
+def encode_player(player):
+    '''
+    This function encodes a player as tuples.
+
+    Parameters:
+        player (Player): the player
+
+    Returns:
+        encoded (tuple): agent, encoded cards of every house and banners of every house
+    '''
+
+    cards = player.get_cards()
+    banners = player.get_banners()
+
+    return (player.get_agent(),
+            tuple((house, encode_cards(cards[house])) for house in cards),
+            tuple(banners.items()))
+
+def encode_state(cards, player1, player2, companion_cards, choose_companion):
+    '''
+    This function encodes the arguments of get_move for the IPC channel.
+    Only the names of the companion cards are sent (their data comes from characters.json).
+
+    Parameters:
+        cards (list): list of Card objects
+        player1 (Player): player 1
+        player2 (Player): player 2
+        companion_cards (dict): dictionary of companion cards
+        choose_companion (bool): flag to choose a companion card
+
+    Returns:
+        state (tuple): the encoded arguments
+    '''
+
+    return (encode_cards(cards), encode_player(player1), encode_player(player2),
+            tuple(companion_cards.keys()), choose_companion)
+
+def decode_state(state, companion_data):
+    '''
+    This function decodes the arguments of get_move.
+
+    Parameters:
+        state (tuple): the encoded arguments
+        companion_data (dict): data of all companion cards (as in characters.json)
+
+    Returns:
+        arguments (tuple): cards, player1, player2, companion_cards and choose_companion
+    '''
+
+    cards, player1, player2, companions, choose_companion = state
+
+    players = []
+
+    for agent, houses, banners in (player1, player2):
+        player = Player(agent)
+
+        for house, house_cards in houses:
+            for card in house_cards:
+                player.add_card(Card(*card))
+
+        for house, banner in banners:
+            player.get_banners()[house] = banner
+
+        players.append(player)
+
+    companion_cards = {companion: dict(companion_data[companion]) for companion in companions}
+
+    return [Card(*card) for card in cards], players[0], players[1], companion_cards, choose_companion
+
+def worker_loop(agent_name, connection):
+    '''
+    This function runs in the worker process. It loads the agent once and answers
+    move requests until the connection is closed.
+
+    Parameters:
+        agent_name (str): name of the AI file
+        connection (Connection): end of the pipe of the worker
+    '''
+
+    # Load the agent
+    try:
+        agent = importlib.import_module(agent_name)
+
+    except ImportError:
+        connection.send(('error', 'ImportError', "AI file not found."))
+        return
+
+    if not hasattr(agent, 'get_move'):
+        connection.send(('error', 'AttributeError', "AI file does not have the get_move function."))
+        return
+
+    with open(join(assets_path, "characters.json"), 'r') as file:
+        companion_data = json.load(file)['Companion']
+
+    connection.send(('ready', None, None))
+
+    while True:
+        try:
+            request = connection.recv()
+
+        except EOFError: # The game has closed the connection
+            break
+
+        if request is None: # Close request
+            break
+
+        # Switch the statistics of the agent on or off (agents without them ignore it)
+        if request[0] == 'stats':
+            if hasattr(agent, 'enable_stats'):
+                agent.enable_stats(request[1])
+
+            continue
+
+        # Seed the random generator of the agent for a new game
+        if request[0] == 'seed':
+            random.seed(request[1])
+
+            continue
+
+        _, turn, state = request
+
+        # Tell the agent its player (agents without set_turn find it from the player names)
+        if turn is not None and hasattr(agent, 'set_turn'):
+            agent.set_turn(turn)
+
+        try:
+            move = agent.get_move(*decode_state(state, companion_data))
+
+            # Statistics of the move (None if the agent has none)
+            stats = agent.get_move_stats() if hasattr(agent, 'get_move_stats') else None
+
+            connection.send(('move', move, stats))
+
+        except Exception:
+            connection.send(('error', 'RuntimeError', traceback.format_exc()))
+
+class AgentWorker:
+    '''
+    This class runs an AI agent in a long-lived worker process. The agent is loaded once,
+    every move request is sent over a pipe, and a worker that does not answer in time is
+    killed and started again, so a stuck agent cannot keep using the CPU.
+    '''
+
+    def __init__(self, agent_name):
+        '''
+        This function starts the worker and waits until the agent is loaded.
+
+        Parameters:
+            agent_name (str): name of the AI file
+
+        Raises:
+            ImportError: if the AI file is not found
+            AttributeError: if the AI file does not have the get_move function
+        '''
+
+        self.agent_name = agent_name
+        self.process = None
+        self.connection = None
+        self.ready = False
+        self.stats = False # Flag to collect the statistics of the agent
+        self.last_stats = None # Statistics of the last move
+
+        self.start()
+        self.wait_ready()
+
+        register_worker(self)
+
+    def start(self):
+        '''
+        This function starts the worker process.
+        '''
+
+        self.connection, child_connection = multiprocessing.Pipe()
+
+        # Not a daemon, so the agent can start processes of its own
+        self.process = multiprocessing.Process(target=worker_loop, args=(self.agent_name, child_connection),
+                                               name='agent-' + self.agent_name, daemon=False)
+        self.process.start()
+
+        child_connection.close() # Only the worker uses this end
+
+        self.ready = False
+
+        # A restarted worker keeps collecting statistics
+        if self.stats:
+            self.connection.send(('stats', True))
+
+    def wait_ready(self):
+        '''
+        This function waits until the worker has loaded the agent.
+
+        Raises:
+            ImportError: if the AI file is not found
+            AttributeError: if the AI file does not have the get_move function
+        '''
+
+        try:
+            status, error, message = self.connection.recv()
+
+        except EOFError:
+            status, error, message = 'error', 'RuntimeError', "Agent worker stopped while loading."
+
+        if status != 'ready':
+            self.close()
+            raise {'ImportError': ImportError, 'AttributeError': AttributeError}.get(error, RuntimeError)(message)
+
+        self.ready = True
+
+    def restart(self):
+        '''
+        This function kills the worker process and starts a new one.
+        '''
+
+        self.kill()
+        self.start()
+
+    def kill(self):
+        '''
+        This function kills the worker process immediately.
+        '''
+
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.process = None
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def enable_stats(self, enabled):
+        '''
+        This function switches the statistics of the agent on or off.
+
+        Parameters:
+            enabled (bool): True to collect the statistics of every move
+        '''
+
+        if enabled != self.stats:
+            self.stats = enabled
+            self.connection.send(('stats', enabled))
+
+    def seed(self, seed):
+        '''
+        This function seeds the random generator of the agent (before a game, so the
+        random choices of the agent are repeated with the same seed).
+
+        Parameters:
+            seed (int/str): seed of the random generator
+        '''
+
+        self.connection.send(('seed', seed))
+
+    def get_move(self, cards, player1, player2, companion_cards, choose_companion, timeout, turn=None):
+        '''
+        This function gets the move of the agent.
+
+        Parameters:
+            cards (list): list of Card objects
+            player1 (Player): player 1
+            player2 (Player): player 2
+            companion_cards (dict): dictionary of companion cards
+            choose_companion (bool): flag to choose a companion card
+            timeout (float): time limit in seconds
+            turn (int/None): player of the agent (1 or 2, None if not known)
+
+        Returns:
+            move (int/list/None): move from the AI agent (None if it did not answer in time)
+
+        Raises:
+            RuntimeError: if the agent raised an exception
+        '''
+
+        # A restarted worker must load the agent first (not counted in the time limit)
+        if not self.ready:
+            self.wait_ready()
+
+        self.last_stats = None
+
+        self.connection.send(('move', turn, encode_state(cards, player1, player2, companion_cards, choose_companion)))
+
+        # Wait for the answer
+        if not self.connection.poll(timeout):
+            # Kill the stuck agent and start a new worker
+            self.restart()
+            return None
+
+        status, move, message = self.connection.recv()
+
+        if status == 'error':
+            raise RuntimeError(f"Agent {self.agent_name} failed:\n{message}")
+
+        self.last_stats = message # Statistics of the move
+
+        return move
+
+    def close(self):
+        '''
+        This function stops the worker process.
+        '''
+
+        if self.connection is not None:
+            try:
+                self.connection.send(None) # Ask the worker to stop
+
+            except (OSError, ValueError):
+                pass
+
+        if self.process is not None:
+            self.process.join(1)
+
+        self.kill()
+
+        if self in workers:
+            workers.remove(self)
+
+def register_worker(worker):
+    '''
+    This function adds a worker to the running workers of this process.
+
+    Parameters:
+        worker (AgentWorker): the worker
+    '''
+
+    global workers_pid
+
+    # The first worker of this process (a forked process does not own the workers of its parent,
+    # and its copy of the exit handler is dropped by multiprocessing)
+    if workers_pid != os.getpid():
+        workers.clear()
+        workers_pid = os.getpid()
+
+        # Stop the workers at exit, before multiprocessing waits for its child processes
+        multiprocessing.util.Finalize(None, close_workers, exitpriority=10)
+
+    workers.append(worker)
+
+def close_workers():
+    '''
+    This function stops every running worker when the program exits.
+    '''
+
+    for worker in list(workers):
+        worker.close()
@@ -0,0 +1,477 @@
+import numpy as np
+
+from bitboard import HOUSES, HOUSE_INDEX, COMPANIONS, COMPANION_CHOICES, EMPTY
+from rules import SQUARES, SAME_LINE, BETWEEN_SQUARES
+
+# Lookup tables as arrays
+LINE_TABLE = np.array(SAME_LINE, dtype=bool) # LINE_TABLE[a, b]: a and b are on the same row or column
+BETWEEN_TABLE = np.zeros((SQUARES, SQUARES, SQUARES), dtype=bool) # BETWEEN_TABLE[a, b, c]: c is between a and b
+
+for first in range(SQUARES):
+    for second in range(SQUARES):
+        BETWEEN_TABLE[first, second, list(BETWEEN_SQUARES[first][second])] = True
+
+# House counts of a full board (Varys is the last house, like 'No House' in characters.json)
+HOUSE_SIZES = np.array([8, 7, 6, 5, 4, 3, 2, 1], dtype=np.int8)
+VARYS = len(HOUSES)
+
+# Companion indices and choices
+JON, GENDRY, RAMSAY, SANDOR, JAQEN, MELISANDRE = range(len(COMPANIONS))
+CHOICES = np.array([COMPANION_CHOICES[companion] for companion in COMPANIONS])
+BARATHEON = HOUSE_INDEX['Baratheon']
+
+NO_MOVE = -1 # Value of the unused fields of an encoded move
+
+def random_policy(simulator, games, legal):
+    '''
+    This function chooses a random legal move for every game (like random_agent).
+
+    Parameters:
+        simulator (BatchSimulator): the simulator
+        games (ndarray): indices of the games to move
+        legal (ndarray): legal moves of the games (boolean array of shape (len(games), 36))
+
+    Returns:
+        moves (ndarray): selected square of every game
+    '''
+
+    return choose_squares(simulator.rng, legal, 1)[:, 0]
+
+def greedy_policy(simulator, games, legal):
+    '''
+    This function chooses the move that captures the most cards for every game
+    (ties are broken randomly).
+
+    Parameters:
+        simulator (BatchSimulator): the simulator
+        games (ndarray): indices of the games to move
+        legal (ndarray): legal moves of the games (boolean array of shape (len(games), 36))
+
+    Returns:
+        moves (ndarray): selected square of every game
+    '''
+
+    board = simulator.board[games]
+
+    # Cards of the same house between Varys and every square
+    same_house = board[:, :, None] == board[:, None, :]
+    captures = (BETWEEN_TABLE[simulator.varys[games]] & same_house).sum(axis=2) + 1
+
+    # Random values below 1 only break the ties
+    scores = np.where(legal, captures + simulator.rng.random(legal.shape), -1)
+
+    return scores.argmax(axis=1)
+
+def choose_squares(rng, mask, count):
+    '''
+    This function chooses distinct random squares of a mask for every row.
+
+    Parameters:
+        rng (Generator): random generator
+        mask (ndarray): boolean array of the squares that can be chosen (every row needs at least count of them)
+        count (int): number of squares to choose
+
+    Returns:
+        squares (ndarray): chosen squares of every row (shape (rows, count))
+    '''
+
+    keys = np.where(mask, rng.random(mask.shape), -1)
+
+    return np.argsort(keys, axis=1)[:, :-count - 1:-1]
+
+class BatchSimulator:
+    '''
+    This class plays many games at the same time with NumPy arrays.
+
+    Every game is a row of the arrays: the house index of every square, the square
+    of Varys, the captured cards and banners of every house for both players, the
+    remaining companion cards and the turn flags. A step makes one move in every
+    running game, following the rules of main.make_move, make_companion_move,
+    remove_unusable_companion_cards and set_banners.
+    '''
+
+    def __init__(self, games, seed=None, board=None):
+        '''
+        This function sets up the games.
+
+        Parameters:
+            games (int): number of games
+            seed (int/None): seed of the random generator
+            board (list/None): list of Card objects to start every game from (None for random boards like main.make_board)
+        '''
+
+        self.rng = np.random.default_rng(seed)
+        self.games = games
+
+        if board is None:
+            self.board, self.varys = self.make_boards(games)
+
+        else:
+            self.board, self.varys = self.load_board(board, games)
+
+        self.captured = np.zeros((games, 2, len(HOUSES)), dtype=np.int16) # Captured cards of every house
+        self.banners = np.zeros((games, 2, len(HOUSES)), dtype=np.int8) # Banners of every house
+        self.companions = np.ones((games, len(COMPANIONS)), dtype=bool) # Remaining companion cards
+        self.turn = np.ones(games, dtype=np.int8) # 1: player 1's turn, 2: player 2's turn
+        self.choose_companion = np.zeros(games, dtype=bool) # Flag to choose a companion card
+        self.last_house = np.full(games, EMPTY, dtype=np.int8) # House of the last normal move
+        self.done = np.zeros(games, dtype=bool) # Finished games
+        self.steps = 0 # Number of steps made
+
+    def make_boards(self, games):
+        '''
+        This function creates random boards like main.make_board: every square gets a card
+        of a random house that still has cards left.
+
+        Parameters:
+            games (int): number of boards
+
+        Returns:
+            board (ndarray): house of every square (shape (games, 36), EMPTY for Varys)
+            varys (ndarray): square of Varys on every board
+        '''
+
+        remaining = np.tile(HOUSE_SIZES, (games, 1))
+        board = np.empty((games, SQUARES), dtype=np.int8)
+        rows = np.arange(games)
+
+        for square in range(SQUARES):
+            # Pick one of the houses with cards left
+            house = choose_squares(self.rng, remaining > 0, 1)[:, 0]
+
+            board[:, square] = house
+            remaining[rows, house] -= 1
+
+        varys = (board == VARYS).argmax(axis=1)
+        board[rows, varys] = EMPTY
+
+        return board, varys
+
+    def load_board(self, cards, games):
+        '''
+        This function copies a board of Card objects to every game.
+
+        Parameters:
+            cards (list): list of Card objects
+            games (int): number of games
+
+        Returns:
+            board (ndarray): house of every square (shape (games, 36), EMPTY for Varys and empty squares)
+            varys (ndarray): square of Varys on every board
+        '''
+
+        board = np.full(SQUARES, EMPTY, dtype=np.int8)
+        varys = EMPTY
+
+        for card in cards:
+            if card.get_name() == 'Varys':
+                varys = card.get_location()
+
+            else:
+                board[card.get_location()] = HOUSE_INDEX[card.get_house()]
+
+        return np.tile(board, (games, 1)), np.full(games, varys)
+
+    def legal_moves(self, games):
+        '''
+        This function gets the normal moves of the games.
+
+        Parameters:
+            games (ndarray): indices of the games
+
+        Returns:
+            legal (ndarray): boolean array of the cards in the same row or column as Varys
+        '''
+
+        return LINE_TABLE[self.varys[games]] & (self.board[games] != EMPTY)
+
+    def step(self, policy=random_policy):
+        '''
+        This function makes one move in every running game. Normal moves are chosen by
+        the policy, companion moves are chosen randomly (like random_agent).
+
+        Parameters:
+            policy (function): function (simulator, games, legal) -> selected squares
+
+        Returns:
+            games (ndarray): indices of the games that moved
+            moves (ndarray): moves of the games (see decode_move)
+        '''
+
+        running = np.flatnonzero(~self.done)
+
+        legal = self.legal_moves(running)
+
+        # A game ends when there are no moves left and no companion card to choose
+        over = ~legal.any(axis=1) & ~(self.choose_companion[running] & self.companions[running].any(axis=1))
+        self.done[running[over]] = True
+
+        running, legal = running[~over], legal[~over]
+
+        moves = np.full((len(running), 4), NO_MOVE, dtype=np.int64)
+
+        companion = self.choose_companion[running]
+
+        if companion.any():
+            moves[companion] = self.make_companion_moves(running[companion])
+
+        if (~companion).any():
+            games = running[~companion]
+            moves[~companion, 1] = self.make_moves(games, policy(self, games, legal[~companion]))
+
+        self.steps += 1
+
+        return running, moves
+
+    def make_moves(self, games, squares):
+        '''
+        This function makes normal moves (main.make_move) and updates the banners and turns.
+
+        Parameters:
+            games (ndarray): indices of the games
+            squares (ndarray): selected square of every game
+
+        Returns:
+            squares (ndarray): the selected squares
+        '''
+
+        rows = np.arange(len(games))
+        board = self.board[games]
+        house = board[rows, squares]
+        player = self.turn[games] - 1
+
+        # The selected card and the cards of its house between Varys and the selected card
+        captured = BETWEEN_TABLE[self.varys[games], squares] & (board == house[:, None])
+        captured[rows, squares] = True
+
+        self.board[games] = np.where(captured, EMPTY, board)
+        self.captured[games, player, house] += captured.sum(axis=1, dtype=np.int16)
+        self.varys[games] = squares
+        self.last_house[games] = house
+
+        # Remove the companion cards that cannot be used
+        self.remove_unusable_companion_cards(games)
+
+        # Set the banners for the players
+        self.set_banners(games, house, player)
+
+        # If there are no cards of the house and there are companion cards left, the player chooses a companion
+        exhausted = ~(self.board[games] == house[:, None]).any(axis=1) & self.companions[games].any(axis=1)
+
+        self.choose_companion[games] = exhausted
+        self.turn[games[~exhausted]] = 3 - self.turn[games[~exhausted]]
+
+        return squares
+
+    def make_companion_moves(self, games):
+        '''
+        This function makes random companion moves (main.make_companion_move) and updates the banners and turns.
+
+        Parameters:
+            games (ndarray): indices of the games
+
+        Returns:
+            moves (ndarray): encoded companion moves (see decode_move)
+        '''
+
+        rows = np.arange(len(games))
+        player = self.turn[games] - 1
+        moves = np.full((len(games), 4), NO_MOVE, dtype=np.int64)
+
+        # Choose a companion card and remove it
+        companion = choose_squares(self.rng, self.companions[games], 1)[:, 0]
+        self.companions[games, companion] = False
+        moves[:, 0] = companion
+
+        # Cards that can be selected (Ramsay can also select Varys)
+        cards = self.board[games] != EMPTY
+        cards_with_varys = cards.copy()
+        cards_with_varys[rows, self.varys[games]] = True
+
+        # House for the banners (the last normal move's house if the companion does not give cards)
+        house = self.last_house[games].copy()
+
+        # Jon: two cards of the selected card's house
+        selected = companion == JON
+        if selected.any():
+            square = choose_squares(self.rng, cards[selected], 1)[:, 0]
+            house[selected] = self.board[games[selected], square]
+            self.captured[games[selected], player[selected], house[selected]] += 2
+            moves[selected, 1] = square
+
+        # Gendry: a card of the house Baratheon
+        selected = companion == GENDRY
+        if selected.any():
+            house[selected] = BARATHEON
+            self.captured[games[selected], player[selected], BARATHEON] += 1
+
+        # Ramsay: swap the locations of two cards
+        selected = companion == RAMSAY
+        if selected.any():
+            squares = np.sort(choose_squares(self.rng, cards_with_varys[selected], 2), axis=1)
+            self.swap(games[selected], squares[:, 0], squares[:, 1])
+            moves[selected, 1:3] = squares
+
+        # Sandor: remove a card
+        selected = companion == SANDOR
+        if selected.any():
+            square = choose_squares(self.rng, cards[selected], 1)[:, 0]
+            self.board[games[selected], square] = EMPTY
+            moves[selected, 1] = square
+
+        # Jaqen: remove two cards and another companion card
+        selected = companion == JAQEN
+        if selected.any():
+            squares = np.sort(choose_squares(self.rng, cards[selected], 2), axis=1)
+            other = choose_squares(self.rng, self.companions[games[selected]], 1)[:, 0]
+
+            self.board[games[selected][:, None], squares] = EMPTY
+            self.companions[games[selected], other] = False
+            moves[selected, 1:3] = squares
+            moves[selected, 3] = other
+
+        # Remove the companion cards that cannot be used
+        self.remove_unusable_companion_cards(games)
+
+        # Set the banners for the players
+        self.set_banners(games, house, player)
+
+        # Melisandre gives the player another turn
+        other_turn = games[companion != MELISANDRE]
+        self.turn[other_turn] = 3 - self.turn[other_turn]
+
+        self.choose_companion[games] = False
+
+        return moves
+
+    def swap(self, games, first, second):
+        '''
+        This function swaps the locations of two cards (which can include Varys).
+
+        Parameters:
+            games (ndarray): indices of the games
+            first (ndarray): location of the first card of every game
+            second (ndarray): location of the second card of every game
+        '''
+
+        first_house = self.board[games, first]
+        self.board[games, first] = self.board[games, second]
+        self.board[games, second] = first_house
+
+        varys = self.varys[games]
+        self.varys[games] = np.where(varys == first, second, np.where(varys == second, first, varys))
+
+    def remove_unusable_companion_cards(self, games):
+        '''
+        This function removes the companion cards that cannot be used (main.remove_unusable_companion_cards).
+
+        Parameters:
+            games (ndarray): indices of the games
+        '''
+
+        companions = self.companions[games]
+
+        # Number of cards on the board (including Varys, like len(cards) in main.py)
+        card_count = (self.board[games] != EMPTY).sum(axis=1) + 1
+
+        # Ramsay needs at least two cards to swap
+        companions[card_count < 2, RAMSAY] = False
+
+        # If there are no moves left, there is no point in using Melisandre
+        companions[~self.legal_moves(games).any(axis=1), MELISANDRE] = False
+
+        # If the number of choices is more than the number of cards
+        companions &= CHOICES[None, :] <= card_count[:, None] - 1
+
+        # If Jaqen is the only companion card left
+        companions[companions[:, JAQEN] & (companions.sum(axis=1) == 1), JAQEN] = False
+
+        self.companions[games] = companions
+
+    def set_banners(self, games, last_house, player):
+        '''
+        This function sets the banners for the players (main.set_banners).
+
+        Parameters:
+            games (ndarray): indices of the games
+            last_house (ndarray): house of the last chosen card of every game (EMPTY for none)
+            player (ndarray): player who made the move (0 for player 1, 1 for player 2)
+        '''
+
+        captured = self.captured[games]
+        banners = self.banners[games]
+
+        player1_cards, player2_cards = captured[:, 0], captured[:, 1]
+
+        # If the number of cards is the same, the player who chose the last card of that house gets the banner
+        tie = (player1_cards == player2_cards) & (np.arange(len(HOUSES))[None, :] == last_house[:, None])
+
+        # The player with the more cards of a house gets the banner, otherwise the banner stays with its owner
+        player1_banner = (player1_cards > player2_cards) | (tie & (player[:, None] == 0))
+        player2_banner = (player2_cards > player1_cards) | (tie & (player[:, None] == 1))
+
+        banners[:, 0] = np.where(player1_banner, 1, np.where(player2_banner, 0, banners[:, 0]))
+        banners[:, 1] = np.where(player2_banner, 1, np.where(player1_banner, 0, banners[:, 1]))
+
+        self.banners[games] = banners
+
+    def run(self, policy=random_policy, max_steps=1000):
+        '''
+        This function plays every game to the end.
+
+        Parameters:
+            policy (function): function (simulator, games, legal) -> selected squares
+            max_steps (int): maximum number of steps (every game ends long before)
+
+        Returns:
+            winners (ndarray): winner of every game (see get_winners)
+        '''
+
+        while not self.done.all() and self.steps < max_steps:
+            self.step(policy)
+
+        return self.get_winners()
+
+    def get_winners(self):
+        '''
+        This function determines the winners of the games (main.calculate_winner).
+
+        Returns:
+            winners (ndarray): 1 if player 1 wins, 2 if player 2 wins, 0 if nobody has a banner
+        '''
+
+        player1_banners = self.banners[:, 0].astype(np.int16)
+        player2_banners = self.banners[:, 1].astype(np.int16)
+
+        score = player1_banners.sum(axis=1) - player2_banners.sum(axis=1)
+
+        # If the scores are the same, whoever has the banner of the first house in the tie-break order wins
+        difference = player1_banners - player2_banners
+        first = np.abs(difference).argmax(axis=1)
+        tie_break = difference[np.arange(self.games), first]
+
+        decider = np.where(score != 0, score, tie_break)
+
+        return np.where(decider > 0, 1, np.where(decider < 0, 2, 0)).astype(np.int8)
+
+def decode_move(move):
+    '''
+    This function converts an encoded move of BatchSimulator.step to the format of the agents.
+
+    Parameters:
+        move (ndarray): companion index (NO_MOVE for a normal move) and up to three selected squares or companions
+
+    Returns:
+        move (int/list): location of the card or companion move (e.g. ['Jaqen', 3, 9, 'Gendry'])
+    '''
+
+    if move[0] == NO_MOVE:
+        return int(move[1])
+
+    companion = COMPANIONS[move[0]]
+    decoded = [companion] + [int(square) for square in move[1:1 + CHOICES[move[0]]]]
+
+    if companion == 'Jaqen':
+        decoded[-1] = COMPANIONS[move[3]]
+
+    return decoded
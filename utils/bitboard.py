@@ -0,0 +1,584 @@
+import json
+from itertools import combinations
+from os import pardir
+from os.path import abspath, join, dirname
+
+from classes import Card, Player
+from rules import SQUARES, SQUARE_BITS, LINE_MASKS, BETWEEN
+
+# Get the path of the assets folder
+assets_path = join((abspath(join(dirname(abspath(__file__)), pardir))), "assets")
+
+# Houses in the tie-break order used by calculate_winner (and the order of the Player dictionaries)
+HOUSES = ['Stark', 'Greyjoy', 'Lannister', 'Targaryen', 'Baratheon', 'Tyrell', 'Tully']
+HOUSE_INDEX = {house: index for index, house in enumerate(HOUSES)}
+
+# Companions in the order of characters.json
+COMPANIONS = ['Jon', 'Gendry', 'Ramsay', 'Sandor', 'Jaqen', 'Melisandre']
+COMPANION_BITS = {companion: 1 << index for index, companion in enumerate(COMPANIONS)}
+ALL_COMPANIONS = (1 << len(COMPANIONS)) - 1
+
+EMPTY = -1 # Value of an empty square in the cells list
+
+# Load the number of choices of every companion card
+with open(join(assets_path, "characters.json"), 'r') as file:
+    COMPANION_CHOICES = {companion: data['Choice'] for companion, data in json.load(file)['Companion'].items()}
+
+def iterate_squares(mask):
+    '''
+    This function yields the squares of the set bits of a mask.
+
+    Parameters:
+        mask (int): bits of the squares
+
+    Yields:
+        square (int): a square of the mask (lowest first)
+    '''
+
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+class GameState:
+    '''
+    This class represents the whole state of a game as bitboards.
+
+    Every house has a 36-bit mask of the squares its cards are on and Varys is stored
+    as the index of his square, so the rules become mask operations instead of scans
+    over a list of Card objects. The captured cards and the banners of the players
+    are stored as counts per house (index 0 is player 1, index 1 is player 2).
+    '''
+
+    __slots__ = ('houses', 'cells', 'names', 'varys', 'captured', 'banners',
+                 'companions', 'turn', 'choose_companion', 'last_house')
+
+    def __init__(self):
+        '''
+        This function initializes an empty state.
+        '''
+
+        self.houses = [0] * len(HOUSES) # Mask of the squares of every house
+        self.cells = [EMPTY] * SQUARES # House index of every square (EMPTY if there is no card)
+        self.names = [None] * SQUARES # Name of the card on every square
+        self.varys = -1 # Square of Varys
+        self.captured = [[0] * len(HOUSES), [0] * len(HOUSES)] # Captured cards of every house
+        self.banners = [[0] * len(HOUSES), [0] * len(HOUSES)] # Banners of every house
+        self.companions = 0 # Mask of the remaining companion cards
+        self.turn = 1 # 1: player 1's turn, 2: player 2's turn
+        self.choose_companion = False # Flag to choose a companion card
+        self.last_house = None # House index of the last normal move (for the banners)
+
+    @classmethod
+    def from_cards(cls, cards, companion_cards=None, player1=None, player2=None, turn=1, choose_companion=False):
+        '''
+        This function builds a state from the objects used by the game engine.
+
+        Parameters:
+            cards (list): list of Card objects
+            companion_cards (dict): dictionary of remaining companion cards (None for all of them)
+            player1 (Player): player 1 (None for no captured cards)
+            player2 (Player): player 2 (None for no captured cards)
+            turn (int): player to move
+            choose_companion (bool): flag to choose a companion card
+
+        Returns:
+            state (GameState): the state of the game
+        '''
+
+        state = cls()
+
+        for card in cards:
+            location = card.get_location()
+            state.names[location] = card.get_name()
+
+            if card.get_name() == 'Varys':
+                state.varys = location
+
+            else:
+                house = HOUSE_INDEX[card.get_house()]
+                state.houses[house] |= SQUARE_BITS[location]
+                state.cells[location] = house
+
+        if companion_cards is None:
+            state.companions = ALL_COMPANIONS
+
+        else:
+            for companion in companion_cards:
+                state.companions |= COMPANION_BITS[companion]
+
+        for index, player in enumerate((player1, player2)):
+            if player is None:
+                continue
+
+            player_cards = player.get_cards()
+            player_banners = player.get_banners()
+
+            for house, house_index in HOUSE_INDEX.items():
+                state.captured[index][house_index] = len(player_cards[house])
+                state.banners[index][house_index] = player_banners[house]
+
+        state.turn = turn
+        state.choose_companion = choose_companion
+
+        return state
+
+    def copy(self):
+        '''
+        This function makes a copy of the state.
+
+        Returns:
+            state (GameState): the copy of the state
+        '''
+
+        state = GameState.__new__(GameState)
+        state.houses = self.houses[:]
+        state.cells = self.cells[:]
+        state.names = self.names[:]
+        state.varys = self.varys
+        state.captured = [self.captured[0][:], self.captured[1][:]]
+        state.banners = [self.banners[0][:], self.banners[1][:]]
+        state.companions = self.companions
+        state.turn = self.turn
+        state.choose_companion = self.choose_companion
+        state.last_house = self.last_house
+
+        return state
+
+    def to_cards(self):
+        '''
+        This function converts the board to Card objects.
+
+        Returns:
+            cards (list): list of Card objects in the order of their locations
+        '''
+
+        cards = []
+
+        for square in range(SQUARES):
+            if square == self.varys:
+                cards.append(Card('No House', self.names[square] or 'Varys', square))
+
+            elif self.cells[square] != EMPTY:
+                cards.append(Card(HOUSES[self.cells[square]], self.names[square], square))
+
+        return cards
+
+    def to_players(self, agents=('player1', 'player2')):
+        '''
+        This function converts the captured cards and the banners to Player objects
+        (the captured cards are named after their house).
+
+        Parameters:
+            agents (tuple): agents of player 1 and player 2
+
+        Returns:
+            players (list): player 1 and player 2
+        '''
+
+        players = []
+
+        for index, agent in enumerate(agents):
+            player = Player(agent)
+
+            for house_index, house in enumerate(HOUSES):
+                for _ in range(self.captured[index][house_index]):
+                    player.add_card(Card(house, house, -1))
+
+                if self.banners[index][house_index]:
+                    player.get_house_banner(house)
+
+            players.append(player)
+
+        return players
+
+    def get_companion_cards(self, companion_cards):
+        '''
+        This function filters a dictionary of companion cards by the remaining companions.
+
+        Parameters:
+            companion_cards (dict): dictionary of all companion cards (as in characters.json)
+
+        Returns:
+            remaining (dict): dictionary of the remaining companion cards
+        '''
+
+        return {companion: data for companion, data in companion_cards.items() if self.companions & COMPANION_BITS[companion]}
+
+    def occupied(self):
+        '''
+        This function gets the squares of the house cards on the board (not Varys).
+
+        Returns:
+            mask (int): bits of the occupied squares
+        '''
+
+        houses = self.houses
+
+        return houses[0] | houses[1] | houses[2] | houses[3] | houses[4] | houses[5] | houses[6]
+
+    def card_count(self):
+        '''
+        This function counts the cards on the board (including Varys, like len(cards) in main.py).
+
+        Returns:
+            count (int): number of cards
+        '''
+
+        return self.occupied().bit_count() + (self.varys >= 0)
+
+    def moves_mask(self):
+        '''
+        This function gets the squares Varys can move to.
+
+        Returns:
+            mask (int): bits of the possible moves
+        '''
+
+        if self.varys < 0:
+            return 0
+
+        return LINE_MASKS[self.varys] & self.occupied()
+
+    def get_possible_moves(self):
+        '''
+        This function gets the possible normal moves for the player.
+
+        Returns:
+            moves (list): list of possible moves (in the order of the squares)
+        '''
+
+        return list(iterate_squares(self.moves_mask()))
+
+    def house_card_count(self, house):
+        '''
+        This function counts the number of cards of a house on the board.
+
+        Parameters:
+            house (int): index of the house
+
+        Returns:
+            count (int): number of cards of the house
+        '''
+
+        return self.houses[house].bit_count()
+
+    def capture_mask(self, move):
+        '''
+        This function finds the cards captured by moving Varys to a square.
+
+        Parameters:
+            move (int): location of the selected card
+
+        Returns:
+            mask (int): bits of the captured cards (including the selected card)
+        '''
+
+        house = self.cells[move]
+
+        return (BETWEEN[self.varys][move] & self.houses[house]) | SQUARE_BITS[move]
+
+    def make_move(self, move, player):
+        '''
+        This function makes a normal move for the player.
+
+        Parameters:
+            move (int): location of the selected card
+            player (int): 1 for player 1, 2 for player 2
+
+        Returns:
+            house (int): index of the house of the selected card
+        '''
+
+        house = self.cells[move]
+        captured = self.capture_mask(move)
+
+        # Remove the captured cards from the board
+        self.houses[house] &= ~captured
+
+        for square in iterate_squares(captured):
+            self.cells[square] = EMPTY
+            self.names[square] = None
+
+        # Give the captured cards to the player
+        self.captured[player - 1][house] += captured.bit_count()
+
+        # Move Varys to the selected card's location
+        self.names[move] = self.names[self.varys]
+        self.names[self.varys] = None
+        self.varys = move
+
+        return house
+
+    def make_companion_move(self, move, player):
+        '''
+        This function makes the move of a companion card. Like main.main, the used
+        companion card is removed from the remaining companions.
+
+        Parameters:
+            move (list): companion move, e.g. ['Jon', 15] or ['Jaqen', 3, 9, 'Gendry']
+            player (int): 1 for player 1, 2 for player 2
+
+        Returns:
+            house (int/None): index of the house of the selected card
+        '''
+
+        selected_companion = move[0] # Selected companion card
+        house = None # House of the selected card
+
+        # Remove the companion card
+        self.companions &= ~COMPANION_BITS[selected_companion]
+
+        if selected_companion == 'Jon':
+            # Add two cards of the selected card's house to the player's cards
+            house = self.cells[move[1]]
+            self.captured[player - 1][house] += 2
+
+        elif selected_companion == 'Gendry':
+            # Add a card of the house Baratheon to the player's cards
+            house = HOUSE_INDEX['Baratheon']
+            self.captured[player - 1][house] += 1
+
+        elif selected_companion == 'Ramsay':
+            # Swap the locations of the cards
+            self.swap(move[1], move[2])
+
+        elif selected_companion == 'Sandor':
+            # Remove the selected card from the board
+            self.remove(move[1])
+
+        elif selected_companion == 'Jaqen':
+            # Remove the selected cards from the board
+            self.remove(move[1])
+            self.remove(move[2])
+
+            # Remove the selected companion card
+            self.companions &= ~COMPANION_BITS[move[3]]
+
+        return house
+
+    def remove(self, square):
+        '''
+        This function removes a card (not Varys) from the board.
+
+        Parameters:
+            square (int): location of the card
+        '''
+
+        self.houses[self.cells[square]] &= ~SQUARE_BITS[square]
+        self.cells[square] = EMPTY
+        self.names[square] = None
+
+    def swap(self, first, second):
+        '''
+        This function swaps the locations of two cards (which can include Varys).
+
+        Parameters:
+            first (int): location of the first card
+            second (int): location of the second card
+        '''
+
+        first_house, second_house = self.cells[first], self.cells[second]
+        both = SQUARE_BITS[first] | SQUARE_BITS[second]
+
+        if first_house != EMPTY:
+            self.houses[first_house] ^= both
+
+        if second_house != EMPTY:
+            self.houses[second_house] ^= both
+
+        self.cells[first], self.cells[second] = second_house, first_house
+        self.names[first], self.names[second] = self.names[second], self.names[first]
+
+        if self.varys == first:
+            self.varys = second
+
+        elif self.varys == second:
+            self.varys = first
+
+    def remove_unusable_companion_cards(self):
+        '''
+        This function removes the companion cards that cannot be used.
+        '''
+
+        card_count = self.card_count()
+
+        if card_count < 2: # Ramsay needs at least two cards to swap
+            self.companions &= ~COMPANION_BITS['Ramsay']
+
+        if self.moves_mask() == 0: # If there are no moves left, there is no point in using Melisandre
+            self.companions &= ~COMPANION_BITS['Melisandre']
+
+        for companion, choices in COMPANION_CHOICES.items():
+            if choices > card_count - 1: # If the number of choices is more than the number of cards
+                self.companions &= ~COMPANION_BITS[companion]
+
+        if self.companions == COMPANION_BITS['Jaqen']: # If Jaqen is the only companion card left
+            self.companions = 0
+
+    def set_banners(self, last_house, last_turn):
+        '''
+        This function sets the banners for the players.
+
+        Parameters:
+            last_house (int/None): index of the house of the last chosen card
+            last_turn (int): last turn of the player
+        '''
+
+        player1_cards, player2_cards = self.captured
+        player1_banners, player2_banners = self.banners
+
+        for house in range(len(HOUSES)):
+            # The player with the more cards of a house gets the banner
+            if player1_cards[house] > player2_cards[house]:
+                player1_banners[house], player2_banners[house] = 1, 0
+
+            elif player2_cards[house] > player1_cards[house]:
+                player1_banners[house], player2_banners[house] = 0, 1
+
+            # If the number of cards is the same, the player who chose the last card of that house gets the banner
+            elif last_house == house:
+                if last_turn == 1:
+                    player1_banners[house], player2_banners[house] = 1, 0
+
+                else:
+                    player1_banners[house], player2_banners[house] = 0, 1
+
+            # Otherwise the banner stays with its owner (setting it again does nothing)
+
+    def calculate_winner(self):
+        '''
+        This function determines the winner of the game.
+
+        Returns:
+            winner (int/None): 1 if player 1 wins, 2 if player 2 wins (None if nobody has a banner)
+        '''
+
+        player1_banners, player2_banners = self.banners
+
+        # Calculate the scores of the players
+        player1_score = sum(player1_banners)
+        player2_score = sum(player2_banners)
+
+        if player1_score > player2_score:
+            return 1
+
+        elif player2_score > player1_score:
+            return 2
+
+        # If the scores are the same, whoever has the banner of the house with the most cards wins
+        for house in range(len(HOUSES)):
+            if player1_banners[house] > player2_banners[house]:
+                return 1
+
+            elif player2_banners[house] > player1_banners[house]:
+                return 2
+
+        return None
+
+    def get_companion_moves(self):
+        '''
+        This function generates every valid way to use the remaining companion cards,
+        in the format of the agents (e.g. ['Jon', 15], ['Ramsay', 3, 9], ['Jaqen', 3, 9, 'Gendry']).
+
+        Returns:
+            moves (list): list of companion moves
+        '''
+
+        moves = []
+
+        cards = list(iterate_squares(self.occupied())) # Locations of the cards (not Varys)
+        cards_with_varys = sorted(cards + [self.varys]) if self.varys >= 0 else cards # Ramsay can swap Varys
+
+        remaining = [companion for companion in COMPANIONS if self.companions & COMPANION_BITS[companion]]
+
+        for companion in remaining:
+            if companion in ('Jon', 'Sandor'):
+                moves.extend([companion, square] for square in cards)
+
+            elif companion in ('Gendry', 'Melisandre'):
+                moves.append([companion])
+
+            elif companion == 'Ramsay':
+                moves.extend([companion, first, second] for first, second in combinations(cards_with_varys, 2))
+
+            elif companion == 'Jaqen':
+                others = [other for other in remaining if other != 'Jaqen']
+
+                for first, second in combinations(cards, 2):
+                    moves.extend([companion, first, second, other] for other in others)
+
+        return moves
+
+    def get_legal_moves(self):
+        '''
+        This function gets the moves of the player to move.
+
+        Returns:
+            moves (list): companion moves if a companion must be chosen, otherwise normal moves
+        '''
+
+        if self.choose_companion:
+            return self.get_companion_moves()
+
+        return self.get_possible_moves()
+
+    def is_game_over(self):
+        '''
+        This function checks if the game has ended (the same condition as main.main).
+
+        Returns:
+            over (bool): True if no moves can be made
+        '''
+
+        return self.moves_mask() == 0 and (not self.choose_companion or self.companions == 0)
+
+    def play(self, move):
+        '''
+        This function plays a move of the player to move, following the turn logic of main.main
+        (banners, companion choices and Melisandre's extra turn).
+
+        Parameters:
+            move (int/list): normal move (location) or companion move (list)
+        '''
+
+        turn = self.turn
+
+        if self.choose_companion:
+            house = self.make_companion_move(move, turn)
+
+            # Remove the companion cards that cannot be used
+            self.remove_unusable_companion_cards()
+
+            # Set the banners for the players
+            self.set_banners(house if house is not None else self.last_house, turn)
+
+            # Melisandre gives the player another turn
+            if move[0] != 'Melisandre':
+                self.turn = 3 - turn
+
+            self.choose_companion = False
+
+        else:
+            house = self.make_move(move, turn)
+            self.last_house = house
+
+            # Remove the companion cards that cannot be used
+            self.remove_unusable_companion_cards()
+
+            # Set the banners for the players
+            self.set_banners(house, turn)
+
+            # If there are no cards of the house and there are companion cards left
+            if self.houses[house] == 0 and self.companions != 0:
+                self.choose_companion = True
+
+            else:
+                self.turn = 3 - turn
+
+    def pass_turn(self):
+        '''
+        This function gives the turn to the other player (an agent that did not answer in time).
+        '''
+
+        self.turn = 3 - self.turn
@@ -0,0 +1,230 @@
+import os
+import time
+from os import pardir
+from os.path import abspath, join, dirname, exists, getsize
+
+from bitboard import HOUSES
+
+# Path of the on-disk table of solved positions
+TABLE_PATH = join(abspath(join(dirname(abspath(__file__)), pardir)), "tables", "endgame.bin")
+
+TABLE_CARDS = 6 # Highest number of cards on the board of the positions saved to the table
+MAX_MEMORY = 2000000 # Highest number of positions kept in memory
+MAX_TABLE_SIZE = 1000000 # Highest number of positions saved to the table
+
+KEY_SIZE = 36 + 1 + 2 * len(HOUSES) + 4 # Size of a position key in bytes (see position_key)
+COUNT_OFFSET = 64 # Offset of the captured card differences in the key (they can be negative)
+
+# Winner of a position as stored in the table
+WINNER_CODES = {None: 0, 1: 1, 2: 2}
+CODE_WINNERS = {code: winner for winner, code in WINNER_CODES.items()}
+
+class SolverTimeout(Exception):
+    '''
+    This exception is raised when the deadline of the solver has passed.
+    '''
+
+def position_key(state):
+    '''
+    This function gets the key of a position. Only the difference of the captured cards
+    of every house matters for the banners (and the winner), so positions that differ
+    only in the number of cards both players have are the same position.
+
+    Parameters:
+        state (GameState): state of the game
+
+    Returns:
+        key (bytes): the key (KEY_SIZE bytes)
+    '''
+
+    board = [house + 1 for house in state.cells] # 0 for an empty square
+    board[state.varys] = len(HOUSES) + 1
+
+    player1_cards, player2_cards = state.captured
+    player1_banners, player2_banners = state.banners
+
+    differences = [COUNT_OFFSET + player1_cards[house] - player2_cards[house] for house in range(len(HOUSES))]
+    banners = [1 if player1_banners[house] else 2 if player2_banners[house] else 0 for house in range(len(HOUSES))]
+
+    last_house = state.last_house + 1 if state.last_house is not None else 0
+
+    return bytes(board + [state.varys] + differences + banners +
+                 [state.companions, state.turn, state.choose_companion, last_house])
+
+def card_count(key):
+    '''
+    This function counts the cards on the board (not Varys) of a position key.
+
+    Parameters:
+        key (bytes): key of the position
+
+    Returns:
+        count (int): number of cards
+    '''
+
+    return sum(1 for house in key[:36] if 0 < house <= len(HOUSES))
+
+class EndgameSolver:
+    '''
+    This class solves endgames exactly: every move of both players (including the
+    companion cards and Melisandre's extra turn) is searched to the end of the game,
+    and the winner of calculate_winner (with its tie-break order) is propagated back.
+    Solved positions are kept in memory and the small ones are saved to an
+    append-only table on disk, so later games (and other processes) reuse them.
+    '''
+
+    def __init__(self, path=TABLE_PATH):
+        '''
+        This function initializes the solver (the table is loaded on the first solve).
+
+        Parameters:
+            path (str/None): path of the table on disk (None for no table)
+        '''
+
+        self.path = path
+        self.solved = {} # Position key -> winner
+        self.unsaved = {} # Solved positions not saved to the table yet
+        self.loaded = False
+        self.nodes = 0
+
+    def load(self):
+        '''
+        This function loads the table from the disk.
+        '''
+
+        self.loaded = True
+
+        if self.path is None or not exists(self.path):
+            return
+
+        with open(self.path, 'rb') as file:
+            data = file.read()
+
+        record_size = KEY_SIZE + 1
+
+        # A record cut by a crash at the end of the file is skipped
+        for start in range(0, len(data) - record_size + 1, record_size):
+            self.solved[data[start:start + KEY_SIZE]] = CODE_WINNERS[data[start + KEY_SIZE]]
+
+    def save(self):
+        '''
+        This function appends the new solved positions to the table.
+        '''
+
+        if self.path is None or not self.unsaved:
+            self.unsaved = {}
+            return
+
+        os.makedirs(dirname(self.path), exist_ok=True)
+
+        # A full table keeps its positions (the new ones are only kept in memory)
+        if exists(self.path) and getsize(self.path) >= MAX_TABLE_SIZE * (KEY_SIZE + 1):
+            self.unsaved = {}
+            return
+
+        with open(self.path, 'ab') as file:
+            file.write(b''.join(key + bytes([WINNER_CODES[winner]]) for key, winner in self.unsaved.items()))
+
+        self.unsaved = {}
+
+    def solve(self, state, deadline=None):
+        '''
+        This function finds the winner of a position if both players play perfectly.
+
+        Parameters:
+            state (GameState): state of the game
+            deadline (float/None): time.perf_counter() value to stop at
+
+        Returns:
+            winner (int/None): 1 if player 1 wins, 2 if player 2 wins (None if nobody has a banner)
+
+        Raises:
+            SolverTimeout: if the deadline has passed
+        '''
+
+        key = position_key(state)
+
+        if key in self.solved:
+            return self.solved[key]
+
+        self.nodes += 1
+
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SolverTimeout
+
+        if state.is_game_over():
+            winner = state.calculate_winner()
+
+        else:
+            _, winner = self.search_moves(state, deadline)
+
+        self.solved[key] = winner
+
+        if card_count(key) <= TABLE_CARDS:
+            self.unsaved[key] = winner
+
+        return winner
+
+    def search_moves(self, state, deadline=None):
+        '''
+        This function solves every move of a position until one wins for the player to move.
+
+        Parameters:
+            state (GameState): state of the game (not over)
+            deadline (float/None): time.perf_counter() value to stop at
+
+        Returns:
+            move (int/list): best move (the first one that wins, else the first one with no winner)
+            winner (int/None): winner after the best move
+        '''
+
+        turn = state.turn
+        best_move, best_winner, best_rank = None, None, -1
+
+        for move in state.get_legal_moves():
+            child = state.copy()
+            child.play(move)
+
+            winner = self.solve(child, deadline)
+
+            # A win is better than no winner, which is better than a loss
+            rank = 2 if winner == turn else 1 if winner is None else 0
+
+            if rank > best_rank:
+                best_move, best_winner, best_rank = move, winner, rank
+
+                if rank == 2:
+                    break
+
+        return best_move, best_winner
+
+    def get_best_move(self, state, deadline=None):
+        '''
+        This function finds the best move of the player to move.
+
+        Parameters:
+            state (GameState): state of the game (not over)
+            deadline (float/None): time.perf_counter() value to stop at
+
+        Returns:
+            move (int/list): the best move
+            winner (int/None): winner of the game with the best move
+
+        Raises:
+            SolverTimeout: if the deadline has passed (the positions solved so far are kept)
+        '''
+
+        if not self.loaded:
+            self.load()
+
+        # Keep the memory bounded (the table on disk keeps the small positions)
+        if len(self.solved) > MAX_MEMORY:
+            self.save()
+            self.solved = {}
+            self.load()
+
+        try:
+            return self.search_moves(state, deadline)
+
+        finally:
+            self.save()
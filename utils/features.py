@@ -0,0 +1,136 @@
+import glob
+from os.path import join
+
+import numpy as np
+
+from bitboard import HOUSES, HOUSE_INDEX, COMPANIONS
+
+# Features of a position, in the order of the encoded vector
+FEATURE_NAMES = ([f'board_{house}' for house in HOUSES] + # Cards of every house on the board
+                 [f'player1_{house}' for house in HOUSES] + # Captured cards of every house
+                 [f'player2_{house}' for house in HOUSES] +
+                 [f'player1_banner_{house}' for house in HOUSES] + # Banners (0 or 1)
+                 [f'player2_banner_{house}' for house in HOUSES] +
+                 ['varys'] + # Square of Varys
+                 [f'companion_{companion}' for companion in COMPANIONS] + # Remaining companion cards (0 or 1)
+                 ['turn', 'choose_companion']) # Player to move (1 or 2) and the companion flag
+
+FEATURE_SIZE = len(FEATURE_NAMES)
+
+# Offsets of the feature groups
+BOARD_OFFSET = 0
+CAPTURED_OFFSET = len(HOUSES)
+BANNER_OFFSET = 3 * len(HOUSES)
+VARYS_OFFSET = 5 * len(HOUSES)
+COMPANION_OFFSET = VARYS_OFFSET + 1
+TURN_OFFSET = COMPANION_OFFSET + len(COMPANIONS)
+
+# Index of every companion feature
+COMPANION_FEATURES = {companion: COMPANION_OFFSET + index for index, companion in enumerate(COMPANIONS)}
+
+def encode_state(state, features=None):
+    '''
+    This function encodes a position as a vector of small integers (one byte each).
+
+    Parameters:
+        state (GameState): state of the game
+        features (np.ndarray/None): vector to write to (None for a new one)
+
+    Returns:
+        features (np.ndarray): the features (int8, FEATURE_SIZE values, see FEATURE_NAMES)
+    '''
+
+    if features is None:
+        features = np.zeros(FEATURE_SIZE, dtype=np.int8)
+
+    houses = len(HOUSES)
+
+    features[BOARD_OFFSET:BOARD_OFFSET + houses] = [mask.bit_count() for mask in state.houses]
+    features[CAPTURED_OFFSET:CAPTURED_OFFSET + 2 * houses] = state.captured[0] + state.captured[1]
+    features[BANNER_OFFSET:BANNER_OFFSET + 2 * houses] = state.banners[0] + state.banners[1]
+    features[VARYS_OFFSET] = state.varys
+    features[COMPANION_OFFSET:TURN_OFFSET] = [state.companions >> index & 1 for index in range(len(COMPANIONS))]
+    features[TURN_OFFSET] = state.turn
+    features[TURN_OFFSET + 1] = state.choose_companion
+
+    return features
+
+def position_features(cards, player1, player2, companion_cards, turn, choose_companion):
+    '''
+    This function gets the features of a position of the Card and Player objects (the
+    state of the search agents), in the order of encode_state.
+
+    Parameters:
+        cards (list): list of Card objects
+        player1 (Player): player 1
+        player2 (Player): player 2
+        companion_cards (dict): dictionary of companion cards
+        turn (int): player to move (1 or 2)
+        choose_companion (bool): flag to choose a companion card
+
+    Returns:
+        features (list): the features (FEATURE_SIZE values, see FEATURE_NAMES)
+    '''
+
+    features = [0] * FEATURE_SIZE
+    varys = -1
+
+    for card in cards:
+        house = HOUSE_INDEX.get(card.get_house())
+
+        if house is None:
+            varys = card.get_location()
+
+        else:
+            features[BOARD_OFFSET + house] += 1
+
+    # The dictionaries of the players are in the order of HOUSES
+    houses = len(HOUSES)
+
+    features[CAPTURED_OFFSET:CAPTURED_OFFSET + houses] = map(len, player1.get_cards().values())
+    features[CAPTURED_OFFSET + houses:BANNER_OFFSET] = map(len, player2.get_cards().values())
+    features[BANNER_OFFSET:BANNER_OFFSET + houses] = player1.get_banners().values()
+    features[BANNER_OFFSET + houses:VARYS_OFFSET] = player2.get_banners().values()
+    features[VARYS_OFFSET] = varys
+
+    for companion in companion_cards:
+        features[COMPANION_FEATURES[companion]] = 1
+
+    features[TURN_OFFSET] = turn
+    features[TURN_OFFSET + 1] = int(choose_companion)
+
+    return features
+
+def encode_states(states):
+    '''
+    This function encodes many positions.
+
+    Parameters:
+        states (list): states of the games
+
+    Returns:
+        features (np.ndarray): the features (int8, one row per state)
+    '''
+
+    features = np.zeros((len(states), FEATURE_SIZE), dtype=np.int8)
+
+    for row, state in enumerate(states):
+        encode_state(state, features[row])
+
+    return features
+
+def iterate_dataset(folder):
+    '''
+    This function reads the chunks of a dataset one at a time (see generate_dataset.py),
+    so a dataset larger than the memory can be streamed.
+
+    Parameters:
+        folder (str): folder of the chunks
+
+    Yields:
+        chunk (dict): arrays of the chunk: features, result, score, depth and game
+    '''
+
+    for filename in sorted(glob.glob(join(folder, 'chunk_*.npz'))):
+        with np.load(filename) as chunk:
+            yield {name: chunk[name] for name in chunk.files}
@@ -0,0 +1,314 @@
+import json
+import struct
+from os import makedirs, pardir
+from os.path import abspath, join, dirname
+
+from classes import Card
+from bitboard import GameState, COMPANIONS, COMPANION_CHOICES
+from rules import SQUARES
+
+# Get the path of the assets folder
+assets_path = join((abspath(join(dirname(abspath(__file__)), pardir))), "assets")
+
+# Load the cards (every card has the code of its place in characters.json)
+with open(join(assets_path, "characters.json"), 'r') as file:
+    CARDS = [(house, name) for house, names in json.load(file).items() if house != 'Companion' for name in names]
+
+CARD_CODES = {name: code for code, (_, name) in enumerate(CARDS)}
+COMPANION_CODES = {companion: code for code, companion in enumerate(COMPANIONS)}
+
+RECORD_MAGIC = b'HOTK' # First bytes of every record
+RECORD_VERSION = 1 # Version of the record format
+
+# Magic, version, winner (0 for no winner), seed flag and seed
+HEADER = struct.Struct('<4sBBBq')
+LENGTH = struct.Struct('<I') # Length of a record in a file of records
+
+EMPTY_CODE = 0xFF # Empty square of the board
+PASS_CODE = 0xFF # The agent did not answer in time (the turn changed)
+COMPANION_CODE = 0x40 # Added to the code of the companion of a companion move (its choices follow)
+
+class RecordError(Exception):
+    '''
+    This exception is raised when a record cannot be decoded.
+    '''
+
+def encode_move(move):
+    '''
+    This function encodes a move: one byte for a normal move (the location) or a pass,
+    and for a companion move one byte for the companion followed by one byte per choice
+    (a location, or the code of the companion that Jaqen removes).
+
+    Parameters:
+        move (int/list/None): normal move, companion move or None
+
+    Returns:
+        data (bytes): the encoded move
+    '''
+
+    if move is None:
+        return bytes([PASS_CODE])
+
+    if isinstance(move, int):
+        return bytes([move])
+
+    choices = [COMPANION_CODES[choice] if isinstance(choice, str) else choice for choice in move[1:]]
+
+    return bytes([COMPANION_CODE + COMPANION_CODES[move[0]]] + choices)
+
+def decode_moves(data):
+    '''
+    This function decodes the moves of a record.
+
+    Parameters:
+        data (bytes): the encoded moves
+
+    Returns:
+        moves (list): the moves in order (None for a pass)
+
+    Raises:
+        RecordError: if a move is not complete or has an unknown code
+    '''
+
+    moves = []
+    index = 0
+
+    while index < len(data):
+        code = data[index]
+        index += 1
+
+        if code == PASS_CODE:
+            moves.append(None)
+
+        elif code < SQUARES:
+            moves.append(code)
+
+        elif COMPANION_CODE <= code < COMPANION_CODE + len(COMPANIONS):
+            companion = COMPANIONS[code - COMPANION_CODE]
+            choices = COMPANION_CHOICES[companion]
+
+            if index + choices > len(data):
+                raise RecordError("The last companion move is not complete.")
+
+            move = [companion] + list(data[index:index + choices])
+            index += choices
+
+            # The last choice of Jaqen is a companion card
+            if companion == 'Jaqen':
+                move[-1] = COMPANIONS[move[-1]]
+
+            moves.append(move)
+
+        else:
+            raise RecordError(f"Unknown move code {code}.")
+
+    return moves
+
+class GameRecord:
+    '''
+    This class is the record of a game: the initial board, the seed, the agents, every move
+    (companion moves and passes included) and the winner. A record is about a hundred bytes,
+    and any position of the game is rebuilt by playing the moves on a GameState.
+    '''
+
+    def __init__(self, cards, agents, seed=None):
+        '''
+        This function starts the record of a game.
+
+        Parameters:
+            cards (list): list of Card objects of the initial board
+            agents (list): names of the agents of player 1 and player 2
+            seed (int/None): seed of the random generator of the game
+        '''
+
+        self.board = [EMPTY_CODE] * SQUARES # Code of the card on every square
+
+        for card in cards:
+            self.board[card.get_location()] = CARD_CODES[card.get_name()]
+
+        self.agents = list(agents)
+        self.seed = seed
+        self.moves = []
+        self.winner = None
+        self.start_state = None # State of the initial board (built on the first replay)
+
+    def add_move(self, move):
+        '''
+        This function adds a move to the record.
+
+        Parameters:
+            move (int/list/None): normal move, companion move or None if the agent did not answer in time
+        '''
+
+        self.moves.append(list(move) if isinstance(move, list) else move)
+
+    def get_cards(self):
+        '''
+        This function gets the initial board.
+
+        Returns:
+            cards (list): list of Card objects
+        '''
+
+        return [Card(*CARDS[code], location) for location, code in enumerate(self.board) if code != EMPTY_CODE]
+
+    def get_start_state(self):
+        '''
+        This function gets a copy of the state of the initial board.
+
+        Returns:
+            state (GameState): the state of the game before the first move
+        '''
+
+        if self.start_state is None:
+            self.start_state = GameState.from_cards(self.get_cards())
+
+        return self.start_state.copy()
+
+    def get_state(self, move_number=None):
+        '''
+        This function rebuilds the position after a number of moves.
+
+        Parameters:
+            move_number (int/None): number of moves played (None for the end of the game)
+
+        Returns:
+            state (GameState): the state of the game
+        '''
+
+        state = self.get_start_state()
+
+        for move in self.moves[:move_number]:
+            if move is None:
+                state.pass_turn()
+
+            else:
+                state.play(move)
+
+        return state
+
+    def get_states(self):
+        '''
+        This function yields the position after every move.
+
+        Yields:
+            move (int/list/None): the move
+            state (GameState): the state of the game after the move (the same object every time)
+        '''
+
+        state = self.get_start_state()
+
+        for move in self.moves:
+            if move is None:
+                state.pass_turn()
+
+            else:
+                state.play(move)
+
+            yield move, state
+
+    def to_bytes(self):
+        '''
+        This function encodes the record.
+
+        Returns:
+            data (bytes): the encoded record
+        '''
+
+        data = [HEADER.pack(RECORD_MAGIC, RECORD_VERSION, self.winner or 0, self.seed is not None, self.seed or 0)]
+
+        for agent in self.agents:
+            name = agent.encode('utf-8')[:255]
+            data.append(bytes([len(name)]) + name)
+
+        data.append(bytes(self.board))
+        data.extend(encode_move(move) for move in self.moves)
+
+        return b''.join(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        This function decodes a record.
+
+        Parameters:
+            data (bytes): the encoded record
+
+        Returns:
+            record (GameRecord): the record
+
+        Raises:
+            RecordError: if the data is not a record of this version
+        '''
+
+        if len(data) < HEADER.size or data[:len(RECORD_MAGIC)] != RECORD_MAGIC:
+            raise RecordError("The data is not a game record.")
+
+        _, version, winner, has_seed, seed = HEADER.unpack_from(data)
+
+        if version != RECORD_VERSION:
+            raise RecordError(f"Game records of version {version} are not supported.")
+
+        index = HEADER.size
+        agents = []
+
+        for _ in range(2):
+            length = data[index]
+            agents.append(data[index + 1:index + 1 + length].decode('utf-8'))
+            index += 1 + length
+
+        record = cls([], agents, seed if has_seed else None)
+        record.board = list(data[index:index + SQUARES])
+        record.moves = decode_moves(data[index + SQUARES:])
+        record.winner = winner or None
+
+        return record
+
+def save_record(record, filename):
+    '''
+    This function appends a record to a file of records.
+
+    Parameters:
+        record (GameRecord): the record
+        filename (str): path of the file
+    '''
+
+    makedirs(dirname(abspath(filename)), exist_ok=True)
+
+    data = record.to_bytes()
+
+    with open(filename, 'ab') as file:
+        file.write(LENGTH.pack(len(data)) + data)
+
+def load_records(filename):
+    '''
+    This function loads the records of a file.
+
+    Parameters:
+        filename (str): path of the file
+
+    Returns:
+        records (list): the records in the order they were saved
+
+    Raises:
+        RecordError: if a record cannot be decoded
+    '''
+
+    with open(filename, 'rb') as file:
+        data = file.read()
+
+    records = []
+    index = 0
+
+    # A record cut by a crash at the end of the file is skipped
+    while index + LENGTH.size <= len(data):
+        length, = LENGTH.unpack_from(data, index)
+        index += LENGTH.size
+
+        if index + length > len(data):
+            break
+
+        records.append(GameRecord.from_bytes(data[index:index + length]))
+        index += length
+
+    return records
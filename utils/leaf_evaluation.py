@@ -0,0 +1,189 @@
+from os.path import exists
+
+import numpy as np
+
+from bitboard import HOUSES
+from features import FEATURE_SIZE, CAPTURED_OFFSET, BANNER_OFFSET, iterate_dataset
+
+class LinearModel:
+    '''
+    This class is a linear evaluation of the features of positions (see features.py):
+    the score is the dot product of the features and the weights, plus the bias.
+    '''
+
+    def __init__(self, weights, bias=0.0):
+        '''
+        This function initializes the model.
+
+        Parameters:
+            weights (np.ndarray): weight of every feature
+            bias (float): score of a position without features
+        '''
+
+        self.weights = np.asarray(weights, dtype=np.float64).reshape(FEATURE_SIZE)
+        self.bias = float(bias)
+
+    @classmethod
+    def from_weights(cls, weights):
+        '''
+        This function makes the model of the evaluation of the minimax agents: the
+        difference of the captured cards and of the banners of the players.
+
+        Parameters:
+            weights (dict): weights of the cards and the banners (as gen_mini_max.WEIGHTS)
+
+        Returns:
+            model (LinearModel): the model
+        '''
+
+        houses = len(HOUSES)
+        vector = np.zeros(FEATURE_SIZE)
+
+        vector[CAPTURED_OFFSET:CAPTURED_OFFSET + houses] = weights['cards']
+        vector[CAPTURED_OFFSET + houses:BANNER_OFFSET] = -weights['cards']
+        vector[BANNER_OFFSET:BANNER_OFFSET + houses] = weights['banners']
+        vector[BANNER_OFFSET + houses:BANNER_OFFSET + 2 * houses] = -weights['banners']
+
+        return cls(vector)
+
+    def evaluate(self, features):
+        '''
+        This function scores positions.
+
+        Parameters:
+            features (np.ndarray): features of the positions (one row per position)
+
+        Returns:
+            scores (np.ndarray): the score of every position (positive is better for player 1)
+        '''
+
+        return features @ self.weights + self.bias
+
+    def get_layers(self):
+        '''
+        This function gets the layers of the model (for save_model).
+
+        Returns:
+            layers (list): the (weights, bias) pair of the layer
+        '''
+
+        return [(self.weights.reshape(FEATURE_SIZE, 1), np.array([self.bias]))]
+
+class MLPModel:
+    '''
+    This class is a small neural network evaluation of the features of positions: fully
+    connected layers with ReLU activations and one output.
+    '''
+
+    def __init__(self, layers):
+        '''
+        This function initializes the model.
+
+        Parameters:
+            layers (list): (weights, bias) pair of every layer, the weights of shape
+                (inputs, outputs) (FEATURE_SIZE inputs for the first layer, 1 output for the last)
+        '''
+
+        self.layers = [(np.asarray(weights, dtype=np.float64), np.asarray(bias, dtype=np.float64)) for weights, bias in layers]
+
+    def evaluate(self, features):
+        '''
+        This function scores positions.
+
+        Parameters:
+            features (np.ndarray): features of the positions (one row per position)
+
+        Returns:
+            scores (np.ndarray): the score of every position (positive is better for player 1)
+        '''
+
+        values = features
+
+        for weights, bias in self.layers[:-1]:
+            values = np.maximum(values @ weights + bias, 0.0)
+
+        weights, bias = self.layers[-1]
+
+        return (values @ weights + bias)[:, 0]
+
+    def get_layers(self):
+        '''
+        This function gets the layers of the model (for save_model).
+
+        Returns:
+            layers (list): the (weights, bias) pair of every layer
+        '''
+
+        return self.layers
+
+def save_model(model, path):
+    '''
+    This function writes a model to a weights file (weights_i and bias_i of every layer i).
+
+    Parameters:
+        model (LinearModel/MLPModel): the model
+        path (str): path of the .npz file
+    '''
+
+    arrays = {}
+
+    for index, (weights, bias) in enumerate(model.get_layers()):
+        arrays[f'weights_{index}'] = weights
+        arrays[f'bias_{index}'] = bias
+
+    with open(path, 'wb') as file:
+        np.savez(file, **arrays)
+
+def load_model(path):
+    '''
+    This function reads a model from a weights file (a file with one layer is a linear model).
+
+    Parameters:
+        path (str/None): path of the .npz file
+
+    Returns:
+        model (LinearModel/MLPModel/None): the model (None if there is no file)
+    '''
+
+    if path is None or not exists(path):
+        return None
+
+    with np.load(path) as file:
+        layers = [(file[f'weights_{index}'], file[f'bias_{index}']) for index in range(len(file.files) // 2)]
+
+    if len(layers) == 1:
+        weights, bias = layers[0]
+
+        return LinearModel(weights[:, 0], bias[0])
+
+    return MLPModel(layers)
+
+def fit_linear_model(folder, target='score', regularization=1e-3):
+    '''
+    This function fits a linear model to the labels of a self-play dataset (see
+    generate_dataset.py) by least squares, reading one chunk at a time.
+
+    Parameters:
+        folder (str): folder of the dataset
+        target (str): label to fit ('score' or 'result')
+        regularization (float): ridge penalty of the weights
+
+    Returns:
+        model (LinearModel): the model
+    '''
+
+    # Sums of the normal equations (the last column is the bias)
+    covariance = np.zeros((FEATURE_SIZE + 1, FEATURE_SIZE + 1))
+    correlation = np.zeros(FEATURE_SIZE + 1)
+
+    for chunk in iterate_dataset(folder):
+        features = np.hstack([chunk['features'].astype(np.float64), np.ones((len(chunk['features']), 1))])
+
+        covariance += features.T @ features
+        correlation += features.T @ chunk[target].astype(np.float64)
+
+    covariance[:FEATURE_SIZE, :FEATURE_SIZE] += regularization * np.eye(FEATURE_SIZE)
+
+    solution = np.linalg.lstsq(covariance, correlation, rcond=None)[0]
+
+    return LinearModel(solution[:FEATURE_SIZE], solution[FEATURE_SIZE])
@@ -0,0 +1,132 @@
+from rules import BETWEEN
+
+MAX_PLY = 64 # Highest ply with killer moves
+
+# Move classes, tried in this order
+BEST_MOVE = 3 # Best move of the previous search (from the transposition table)
+GOOD_CAPTURE = 2 # Move that captures more than one card or takes the last cards of a house
+KILLER_MOVE = 1 # Move that caused a beta cutoff at the same ply
+OTHER_MOVE = 0 # Any other move (ordered by the history table)
+
+# Cards given by the companion cards
+COMPANION_CAPTURES = {'Jon': 2, 'Gendry': 1}
+
+def history_key(move):
+    '''
+    This function gets the key of a move in the history table.
+
+    Parameters:
+        move (int/list): normal move (location) or companion move (list)
+
+    Returns:
+        key (int/tuple): hashable form of the move
+    '''
+
+    return move if isinstance(move, int) else tuple(move)
+
+class MoveOrderer:
+    '''
+    This class orders the moves of the minimax search so alpha-beta prunes early.
+    The best move of the previous (shallower) search comes first, then the moves
+    that capture the most cards or take the last cards of a house, then the killer
+    moves of the ply (moves that caused a beta cutoff in a sibling node), and the
+    rest by the history table (how often and how deep a move caused a cutoff).
+    '''
+
+    def __init__(self):
+        '''
+        This function initializes empty killer and history tables.
+        '''
+
+        self.killers = [[None, None] for _ in range(MAX_PLY)] # Two killer moves of every ply
+        self.history = {} # Move -> sum of the squared depths of its cutoffs
+
+    def new_search(self):
+        '''
+        This function starts the search of a new position. The killers belong to the
+        old position and are cleared, the history scores are halved.
+        '''
+
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {move: score // 2 for move, score in self.history.items() if score > 1}
+
+    def order_moves(self, cards, moves, best_move, ply):
+        '''
+        This function sorts the moves of a node.
+
+        Parameters:
+            cards (list): list of Card objects
+            moves (list): moves of the node (normal or companion moves)
+            best_move (int/list/None): best move from the transposition table
+            ply (int): distance of the node from the root
+
+        Returns:
+            moves (list): the moves, most promising first
+        '''
+
+        # House of every square and mask of the squares of every house
+        houses = {}
+        house_masks = {}
+        varys_location = None
+
+        for card in cards:
+            location, house = card.get_location(), card.get_house()
+
+            if card.get_name() == 'Varys':
+                varys_location = location
+
+            else:
+                houses[location] = house
+                house_masks[house] = house_masks.get(house, 0) | 1 << location
+
+        between = BETWEEN[varys_location] if varys_location is not None else None
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history
+
+        def move_score(move):
+            # Normal moves capture the selected card and the cards of its house in between
+            if isinstance(move, int):
+                house_mask = house_masks[houses[move]]
+                captured = 1 + (between[move] & house_mask).bit_count()
+                good_capture = captured > 1 or captured == house_mask.bit_count()
+
+            else:
+                captured = COMPANION_CAPTURES.get(move[0], 0)
+                good_capture = captured > 0
+
+            if move == best_move:
+                move_class = BEST_MOVE
+
+            elif good_capture:
+                move_class = GOOD_CAPTURE
+
+            elif move == killers[0] or move == killers[1]:
+                move_class = KILLER_MOVE
+
+            else:
+                move_class = OTHER_MOVE
+
+            return move_class, captured, history.get(history_key(move), 0)
+
+        # Stable sort, so equal moves keep their board order
+        return sorted(moves, key=move_score, reverse=True)
+
+    def record_cutoff(self, move, ply, depth):
+        '''
+        This function records a move that caused a beta cutoff.
+
+        Parameters:
+            move (int/list): the move
+            ply (int): distance of the node from the root
+            depth (int): remaining depth of the node
+        '''
+
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+
+            if move != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        key = history_key(move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+from os import pardir
+from os.path import abspath, join, dirname, exists
+
+from symmetry import board_values, canonicalize, transform_move, inverse_move
+
+# Path of the opening book on disk (filled by build_book.py)
+BOOK_PATH = join(abspath(join(dirname(abspath(__file__)), pardir)), "tables", "opening_book.json")
+
+BOOK_VERSION = 1 # Version of the book format (a book of another version is not used)
+
+def position_hash(state):
+    '''
+    This function gets the hash of a canonical position: the board, the captured cards and
+    the banners of both players, the remaining companion cards and the companion flag.
+    The turn is not part of the hash (in the first plies of a game it follows from the
+    captured cards), so an agent that does not know its turn still finds its positions.
+
+    Parameters:
+        state (GameState): state of the game in its canonical orientation
+
+    Returns:
+        key (str): the hash as 16 hexadecimal digits
+    '''
+
+    data = bytes(board_values(state) + [state.varys] + state.captured[0] + state.captured[1] +
+                 state.banners[0] + state.banners[1] + [state.companions, state.choose_companion])
+
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+class OpeningBook:
+    '''
+    This class is a book of deep-searched best moves of the first positions of boards.
+    Positions are stored in their canonical orientation (see symmetry.py), so every
+    symmetry of a board finds the same entry, and the move is mapped back to the board.
+    '''
+
+    def __init__(self, path=BOOK_PATH):
+        '''
+        This function initializes the book (the file is loaded on the first lookup).
+
+        Parameters:
+            path (str/None): path of the book on disk (None for an empty book)
+        '''
+
+        self.path = path
+        self.positions = {} # Position hash -> entry (move, turn, depth and cards on the board)
+        self.min_cards = None # Fewest cards on the board of the positions (None for an empty book)
+        self.loaded = False
+
+    def load(self):
+        '''
+        This function loads the book from the disk.
+        '''
+
+        self.loaded = True
+
+        if self.path is None or not exists(self.path):
+            return
+
+        with open(self.path, 'r') as file:
+            book = json.load(file)
+
+        if book.get('version') != BOOK_VERSION:
+            return
+
+        self.positions = book['positions']
+        self.min_cards = min((entry['cards'] for entry in self.positions.values()), default=None)
+
+    def save(self):
+        '''
+        This function writes the book to the disk (to a temporary file first, so agents
+        that load the book at the same time never see a part of it).
+        '''
+
+        os.makedirs(dirname(self.path), exist_ok=True)
+
+        temporary_path = self.path + '.tmp'
+
+        with open(temporary_path, 'w') as file:
+            json.dump({'version': BOOK_VERSION, 'positions': self.positions}, file)
+
+        os.replace(temporary_path, self.path)
+
+    def add(self, state, move, depth):
+        '''
+        This function adds the best move of a position (an entry of a deeper search is kept).
+
+        Parameters:
+            state (GameState): state of the game
+            move (int/list): best move
+            depth (int): depth of the search of the move
+        '''
+
+        if not self.loaded:
+            self.load()
+
+        canonical, symmetry = canonicalize(state)
+        key = position_hash(canonical)
+
+        if key in self.positions and self.positions[key]['depth'] > depth:
+            return
+
+        cards = state.card_count()
+
+        self.positions[key] = {'move': transform_move(move, symmetry), 'turn': state.turn, 'depth': depth, 'cards': cards}
+
+        self.min_cards = cards if self.min_cards is None else min(self.min_cards, cards)
+
+    def get_move(self, state):
+        '''
+        This function looks up the move of a position.
+
+        Parameters:
+            state (GameState): state of the game
+
+        Returns:
+            move (int/list/None): the move of the book (None if the position is not in the book)
+        '''
+
+        if not self.loaded:
+            self.load()
+
+        # Positions with fewer cards than every book position are not looked up
+        if self.min_cards is None or state.card_count() < self.min_cards:
+            return None
+
+        canonical, symmetry = canonicalize(state)
+        entry = self.positions.get(position_hash(canonical))
+
+        if entry is None:
+            return None
+
+        move = inverse_move(entry['move'], symmetry)
+
+        # A move that is not legal (a hash collision) is not played
+        if move not in state.get_legal_moves():
+            return None
+
+        return move
@@ -1,14 +1,17 @@
 import pygame
+import atexit
 import json
+import mmap
+import subprocess
 import time
-from moviepy.editor import ImageSequenceClip
-from numpy import rot90, flipud
-from os import pardir, environ
-from os.path import abspath, join, dirname
+import imageio_ffmpeg
+from os import pardir, environ, makedirs, register_at_fork, replace, stat
+from os.path import abspath, join, dirname, exists
 
 # Get the path of the assets and videos folder
 assets_path = join((abspath(join(dirname(abspath(__file__)), pardir))), "assets")
 videos_path = join((abspath(join(dirname(abspath(__file__)), pardir))), "videos")
+cache_path = join(assets_path, "cache") # Atlases of the scaled images (one per card size)
 
 ROWS = 6 # Number of rows in the board
 COLS = 6 # Number of columns in the board
@@ -19,12 +22,22 @@ BOARD_HEIGHT = ROWS * CARD_SIZE + (ROWS - 1) * MARGIN + FOOTER_SIZE  # Height of
 BOARD_WIDTH = (COLS + 3) * CARD_SIZE + (COLS + 3 - 1) * MARGIN # Width of the board
 WIN_WIDTH = COLS * CARD_SIZE + (COLS - 1) * MARGIN  # Width of the win screen
 WINNER_HEIGHT_OFFSET = 36  # Height offset of the winner text
+VIDEO_FPS = 30 # Frames per second of the video
+FRAME_RATE = 1 # Frames sent to the encoder per second of the game (the encoder repeats them up to VIDEO_FPS)
+ATLAS_WIDTH = 2048 # Width of the atlas of the scaled images in pixels
+ATLAS_VERSION = 1 # Version of the atlas format (a new version rebuilds the atlases)
 assets = {} # Dictionary to store every asset
-frames = [] # List to store the frames of the video
+atlas_buffer = None # Memory map of the atlas (the image assets share its pixels)
+video_process = None # Encoder of the video (the frames are written to it as the game goes)
+static_layer = None # Background, separator line and companions of the board (redrawn when the companions change)
+drawn_state = None # What the board shows (only the changes are drawn by draw_board)
 
-def load_assets():
+def get_image_assets():
     '''
-    This function loads the assets of the game.
+    This function gets the image assets of the game and their sizes.
+
+    Returns:
+        images (list): list of (name, path, width, height) tuples
     '''
 
     # Get the characters of the game
@@ -36,30 +49,124 @@ def load_assets():
     # Remove the companions from the characters
     del characters['Companion']
 
-    # Load the images of the companions
-    for companion in companions:
-        # Load the image of the companion
-        assets[companion] = pygame.image.load(join(assets_path, 'companions', companion + ".jpg"))
+    # The companions
+    images = [(companion, join(assets_path, 'companions', companion + ".jpg"), int(CARD_SIZE * 1.5), int(CARD_SIZE * 2.3))
+              for companion in companions]
 
-        # Resize the image of the companion
-        assets[companion] = pygame.transform.scale(assets[companion], (CARD_SIZE * 1.5, CARD_SIZE * 2.3))
+    # The cards
+    for house in characters.values():
+        for character in house:
+            images.append((character, join(assets_path, 'cards', character + ".jpg"), CARD_SIZE, CARD_SIZE))
 
-    house_characters = list(characters.values())
+    # The icon of the window and the background of the win screen
+    images.append(('icon', join(assets_path, 'icons', 'icon.jpg'), 256, 256))
+    images.append(('win_screen', join(assets_path, 'backgrounds', 'win_screen.jpg'), WIN_WIDTH, BOARD_HEIGHT))
 
-    # Load all the images of the cards
-    for house in house_characters:
-        for character in house:
-            # Load the image of the card
-            assets[character] = pygame.image.load(join(assets_path, 'cards', character + ".jpg"))
+    return images
 
-            # Resize the image of the card
-            assets[character] = pygame.transform.scale(assets[character], (CARD_SIZE, CARD_SIZE))
-    
-    # Load the icon of the window
-    assets['icon'] = pygame.image.load(join(assets_path, 'icons', 'icon.jpg'))
+def get_atlas_key(images):
+    '''
+    This function gets the key of an atlas: the format, the sizes of the images and the size and
+    modification time of their files. An atlas with another key is out of date.
+
+    Parameters:
+        images (list): list of (name, path, width, height) tuples
+
+    Returns:
+        key (list): the key (as stored in the index of the atlas)
+    '''
+
+    key = [ATLAS_VERSION]
 
-    # Resize the icon of the window
-    assets['icon'] = pygame.transform.scale(assets['icon'], (256, 256))
+    for name, path, width, height in images:
+        status = stat(path)
+        key.append([name, width, height, status.st_size, status.st_mtime_ns])
+
+    return key
+
+def build_atlas(images, atlas_file, index_file):
+    '''
+    This function loads and scales the images and packs them in rows into one atlas,
+    saved as raw RGB pixels with an index of the rectangle of every image.
+
+    Parameters:
+        images (list): list of (name, path, width, height) tuples
+        atlas_file (str): path of the raw pixels
+        index_file (str): path of the index
+    '''
+
+    rectangles = {}
+    x = y = row_height = 0
+
+    # Place the images from left to right, in rows
+    for name, _, width, height in images:
+        if x + width > ATLAS_WIDTH:
+            x, y, row_height = 0, y + row_height, 0
+
+        rectangles[name] = [x, y, width, height]
+        x += width
+        row_height = max(row_height, height)
+
+    atlas = pygame.Surface((ATLAS_WIDTH, y + row_height))
+
+    for name, path, width, height in images:
+        image = pygame.transform.scale(pygame.image.load(path), (width, height))
+        atlas.blit(image, rectangles[name][:2])
+
+    makedirs(cache_path, exist_ok=True)
+
+    # Write to temporary files first, so a half-written atlas is never used
+    with open(atlas_file + '.tmp', 'wb') as file:
+        file.write(pygame.image.tostring(atlas, 'RGB'))
+
+    with open(index_file + '.tmp', 'w') as file:
+        json.dump({'key': get_atlas_key(images), 'size': atlas.get_size(), 'rectangles': rectangles}, file)
+
+    replace(atlas_file + '.tmp', atlas_file)
+    replace(index_file + '.tmp', index_file)
+
+def load_atlas():
+    '''
+    This function loads the image assets from the atlas of the card size. The atlas is
+    memory-mapped and the images are parts of one surface that uses its pixels, so no
+    JPEG is decoded or scaled. The atlas is built again when an image file has changed.
+    '''
+
+    global atlas_buffer
+
+    images = get_image_assets()
+
+    atlas_file = join(cache_path, f'atlas_{CARD_SIZE}.rgb')
+    index_file = join(cache_path, f'atlas_{CARD_SIZE}.json')
+
+    index = None
+
+    if exists(atlas_file) and exists(index_file):
+        with open(index_file) as file:
+            index = json.load(file)
+
+    if index is None or index['key'] != get_atlas_key(images):
+        build_atlas(images, atlas_file, index_file)
+
+        with open(index_file) as file:
+            index = json.load(file)
+
+    # Copy-on-write map: pygame can use the pixels, the file is never changed
+    with open(atlas_file, 'rb') as file:
+        atlas_buffer = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_COPY)
+
+    atlas = pygame.image.frombuffer(atlas_buffer, tuple(index['size']), 'RGB')
+
+    for name, rectangle in index['rectangles'].items():
+        assets[name] = atlas.subsurface(rectangle)
+
+def load_assets():
+    '''
+    This function loads the assets of the game.
+    '''
+
+    # Load the images of the companions, the cards, the icon and the win screen (scaled to the card size)
+    load_atlas()
 
     # Set the font of the text (Arial, 20pt)
     font = pygame.font.SysFont('Arial', 20)
@@ -72,12 +179,6 @@ def load_assets():
     assets['BC1'] = font.render('Choose the first card', True, [0, 0, 0])
     assets['BC2'] = font.render('Choose the second card', True, [0, 0, 0])
 
-    # Load the background of win screen
-    assets['win_screen'] = pygame.image.load(join(assets_path, 'backgrounds', 'win_screen.jpg'))
-
-    # Resize the background of win screen to the size of the board
-    assets['win_screen'] = pygame.transform.scale(assets['win_screen'], (WIN_WIDTH, BOARD_HEIGHT))
-    
     separation_x = COLS * CARD_SIZE + (COLS - 1) * MARGIN + (MARGIN // 2)
     gray_color = (128, 128, 128, 128)  # (R, G, B, Alpha)
 
@@ -151,50 +252,103 @@ def init_board():
     # Set the background color of the board to white
     board.fill([255, 255, 255])
 
+    # The next drawing draws the whole board
+    global drawn_state
+    drawn_state = None
+
     return board
 
-def update():
+def update(rectangles = None):
     '''
     This function updates the display.
+
+    Parameters:
+        rectangles (list): parts of the display to update (None for the whole display)
     '''
 
-    pygame.display.update()
+    if rectangles is None:
+        pygame.display.update()
 
-def store_frame(board, needs_resize = False, FPS = 30):
+    else:
+        pygame.display.update(rectangles)
+
+def start_video(file_name):
     '''
-    This function stores the frame of the board.
+    This function starts the video of the game. The frames are encoded as they are
+    stored, so the memory does not grow with the length of the game.
+
+    Parameters:
+        file_name (str): name of the video file
+    '''
+
+    global video_process
+
+    # Finish the video of the previous game
+    save_video()
+
+    makedirs(videos_path, exist_ok=True)
+
+    # libx264 needs an even size for yuv420p (the board can have an odd height)
+    pix_fmt = 'yuv420p' if BOARD_WIDTH % 2 == 0 and BOARD_HEIGHT % 2 == 0 else 'yuv444p'
+
+    # ffmpeg reads raw RGB frames at FRAME_RATE and repeats them up to VIDEO_FPS
+    command = [imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{BOARD_WIDTH}x{BOARD_HEIGHT}', '-r', str(FRAME_RATE), '-i', '-',
+               '-an', '-vcodec', 'libx264', '-pix_fmt', pix_fmt, '-r', str(VIDEO_FPS),
+               join(videos_path, file_name + '.mp4')]
+
+    # Unbuffered, so a forked process can close its copy of the pipe without writing anything
+    video_process = subprocess.Popen(command, stdin = subprocess.PIPE, bufsize = 0)
+
+    # Finish the video if the window is closed during the game
+    atexit.register(save_video)
+
+def forget_video():
+    '''
+    This function closes the copy of the video pipe in a forked process (e.g. an agent worker).
+    ffmpeg finishes the video when every copy of the pipe is closed.
+    '''
+
+    global video_process
+
+    if video_process is not None:
+        video_process.stdin.close()
+        video_process = None
+
+register_at_fork(after_in_child = forget_video)
+
+def store_frame(board, needs_resize = False, seconds = 1):
+    '''
+    This function writes the frame of the board to the video.
 
     Parameters:
         board (pygame.Surface): the screen for the game
         needs_resize (bool): whether the frame needs to be resized
-        FPS (int): frames per second
+        seconds (float): how long the frame is shown in the video
     '''
 
-    frame = pygame.surfarray.array3d(board) # Get the frame
+    if video_process is None: # No video is recorded
+        return
 
     if needs_resize: # For the win screen
-        frame = pygame.transform.smoothscale(pygame.surfarray.make_surface(frame), (BOARD_WIDTH, BOARD_HEIGHT)) # Resize the frame
-        frame = pygame.surfarray.array3d(frame) # Get the frame
+        board = pygame.transform.smoothscale(board, (BOARD_WIDTH, BOARD_HEIGHT)) # Resize the frame
 
-    frame = rot90(frame) # Rotate the frame
-    frame = flipud(frame) # Flip the frame
+    frame = pygame.image.tostring(board, 'RGB') # Get the frame (rows of RGB pixels)
 
-    for _ in range(FPS):
-        frames.append(frame) # Store the frame
+    for _ in range(max(1, round(seconds * FRAME_RATE))):
+        video_process.stdin.write(frame) # Write the frame
 
-def save_video(file_name):
+def save_video():
     '''
-    This function saves the video of the game.
-
-    Parameters:
-        file_name (str): name of the video file
+    This function finishes the video of the game (the encoder writes the end of the file).
     '''
 
-    # Create a video of the game
-    clip = ImageSequenceClip(frames, fps = 30)
+    global video_process
 
-    # Save the video
-    clip.write_videofile(join(videos_path, file_name + '.mp4'), codec = 'libx264')
+    if video_process is not None:
+        video_process.stdin.close()
+        video_process.wait()
+        video_process = None
 
 def draw_footer(board, text):
     '''
@@ -241,9 +395,50 @@ def draw_companions(board, companions):
         # Draw the companion on the board
         board.blit(companion_img, (x, y))
 
+def draw_static_layer(companions):
+    '''
+    This function draws the parts of the board that do not change during a move:
+    the background, the line between the cards and the companions, and the companions.
+
+    Parameters:
+        companions (dict): dictionary of companions
+    '''
+
+    global static_layer
+
+    static_layer = pygame.Surface((BOARD_WIDTH, BOARD_HEIGHT))
+
+    # Clear the board
+    static_layer.fill([255, 255, 255])
+
+    # Draw a horizontal line to separate the companions from the cards
+    line_x = COLS * CARD_SIZE + (COLS - 1) * MARGIN + (MARGIN // 2)
+    pygame.draw.line(static_layer, [0, 0, 0], (line_x, 0), (line_x, BOARD_HEIGHT), 2)
+
+    # Draw the companions
+    draw_companions(static_layer, companions)
+
+def get_square_rect(location):
+    '''
+    This function gets the rectangle of a square of the board.
+
+    Parameters:
+        location (int): location of the square
+
+    Returns:
+        rect (pygame.Rect): the rectangle of the square
+    '''
+
+    # Calculate the row and column of the square
+    row, col = location // COLS, location % COLS
+
+    return pygame.Rect(col * CARD_SIZE + col * MARGIN, row * CARD_SIZE + row * MARGIN, CARD_SIZE, CARD_SIZE)
+
 def draw_board(board, cards, companions, banner_footer, is_cards_gray = False):
     '''
-    This function draws the cards on the board.
+    This function draws the cards on the board. Only the squares that changed since
+    the last drawing (captured, moved and swapped cards) and the footer are drawn again,
+    on top of the cached static layer, and only their rectangles are updated on the display.
 
     Parameters:
         board (pygame.Surface): the screen for the game
@@ -253,65 +448,76 @@ def draw_board(board, cards, companions, banner_footer, is_cards_gray = False):
         is_cards_gray (bool): whether the cards should be grayed out
     '''
 
-    # Clear the board
-    board.fill([255, 255, 255])
+    global drawn_state
 
-    for card in cards:
-        # Get the location of the card
-        location = card.get_location()
+    # Name of the card on every square
+    squares = {card.get_location(): card.get_name() for card in cards}
 
-        # Calculate the row and column of the card
-        row, col = location // COLS, location % COLS 
+    state = {'board': board, 'size': board.get_size(), 'companions': list(companions),
+             'squares': squares, 'footer': banner_footer, 'gray': is_cards_gray}
 
-        # Calculate the position of the card
-        x = col * CARD_SIZE + col * MARGIN
-        y = row * CARD_SIZE + row * MARGIN
+    line_x = COLS * CARD_SIZE + (COLS - 1) * MARGIN + (MARGIN // 2)
 
-        # Load the image of the card
-        card_img = assets[card.get_name()]
+    # Gray surfaces to draw over the cards and over the companions
+    # (True means companions must be chosen, None means both are grayed out)
+    cards_gray = is_cards_gray or is_cards_gray is None
+    companions_gray = not is_cards_gray
 
-        # Draw the card on the board
-        board.blit(card_img, (x, y))
-    
-    # Draw the footer
-    draw_footer(board, banner_footer)
+    # Anything but the cards and the footer changed: draw the whole board
+    if drawn_state is None or any(drawn_state[key] != state[key] for key in ('board', 'size', 'companions', 'gray')):
+        draw_static_layer(companions)
 
-    # Draw a horizontal line to separate the companions from the cards
-    line_x = COLS * CARD_SIZE + (COLS - 1) * MARGIN + (MARGIN // 2)
-    pygame.draw.line(board, [0, 0, 0], (line_x, 0), (line_x, BOARD_HEIGHT), 2)
+        board.blit(static_layer, (0, 0))
 
-    # Draw the companions
-    draw_companions(board, companions)
+        for location, name in squares.items():
+            # Draw the card on the board
+            board.blit(assets[name], get_square_rect(location))
 
-    if is_cards_gray: # True means companions must be chosen
-        # Get the gray surface to cover the cards
-        gray_surface = assets['cards_gray_surface']
+        # Draw the footer
+        draw_footer(board, banner_footer)
 
-        # Draw the gray surface on the board
-        board.blit(gray_surface, (0, 0))
-    
-    elif is_cards_gray is not None:
-        # Get the gray surface to cover the companions
-        gray_surface = assets['companions_gray_surface']
+        if cards_gray:
+            # Draw the gray surface over the cards
+            board.blit(assets['cards_gray_surface'], (0, 0))
 
-        # Draw the gray surface on the board
-        board.blit(gray_surface, (line_x, 0))
-    
-    else: # None means both cards and companions must be grayed out
-        # Get the gray surface to cover the cards
-        gray_surface = assets['cards_gray_surface']
+        if companions_gray:
+            # Draw the gray surface over the companions
+            board.blit(assets['companions_gray_surface'], (line_x, 0))
+
+        # Update the display
+        update()
 
-        # Draw the gray surface on the board
-        board.blit(gray_surface, (0, 0))
+    else:
+        dirty = [] # Rectangles drawn again
 
-        # Get the gray surface to cover the companions
-        gray_surface = assets['companions_gray_surface']
+        # The squares that have another card (or no card) than before
+        for location in set(squares) | set(drawn_state['squares']):
+            if squares.get(location) != drawn_state['squares'].get(location):
+                rect = get_square_rect(location)
 
-        # Draw the gray surface on the board
-        board.blit(gray_surface, (line_x, 0))
+                board.blit(static_layer, rect, rect) # Clear the square
 
-    # Update the display
-    update()
+                if location in squares:
+                    board.blit(assets[squares[location]], rect) # Draw the card
+
+                if cards_gray:
+                    board.blit(assets['cards_gray_surface'], rect, rect) # Gray the square
+
+                dirty.append(rect)
+
+        if banner_footer != drawn_state['footer']:
+            # The footer below the cards
+            rect = pygame.Rect(0, BOARD_HEIGHT - FOOTER_SIZE, line_x - 1, FOOTER_SIZE)
+
+            board.blit(static_layer, rect, rect) # Clear the footer
+            draw_footer(board, banner_footer)
+
+            dirty.append(rect)
+
+        # Update the changed parts of the display
+        update(dirty)
+
+    drawn_state = state
 
     store_frame(board) # Store the frame
 
@@ -327,6 +533,10 @@ def display_winner(board, winner, winner_agent):
 
     board = pygame.display.set_mode([WIN_WIDTH, BOARD_HEIGHT])
 
+    # The win screen covers the cards (a later drawing draws the whole board)
+    global drawn_state
+    drawn_state = None
+
     # Clear the board
     board.fill([255, 255, 255])
 
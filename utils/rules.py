@@ -0,0 +1,47 @@
+# Lookup tables of the board geometry, built once at import time.
+# For every pair of squares (a, b) of the board:
+#   SAME_LINE[a][b]: True if a and b are different squares of the same row or column
+#   BETWEEN[a][b]: mask of the squares strictly between a and b (0 if not on the same line)
+#   BETWEEN_SQUARES[a][b]: tuple of those squares, from a to b
+# A Varys move from a to b captures the cards of the selected house in BETWEEN[a][b].
+
+ROWS = 6 # Number of rows in the board
+COLS = 6 # Number of columns in the board
+SQUARES = ROWS * COLS # Number of squares in the board
+
+# Bit of every square
+SQUARE_BITS = [1 << square for square in range(SQUARES)]
+
+# Bits of every row and every column
+ROW_MASKS = [sum(SQUARE_BITS[row * COLS + col] for col in range(COLS)) for row in range(ROWS)]
+COL_MASKS = [sum(SQUARE_BITS[row * COLS + col] for row in range(ROWS)) for col in range(COLS)]
+
+# Squares in the same row or column as a square (not including the square itself)
+LINE_MASKS = [(ROW_MASKS[square // COLS] | COL_MASKS[square % COLS]) & ~SQUARE_BITS[square] for square in range(SQUARES)]
+
+def build_between(first, second):
+    '''
+    This function finds the squares strictly between two squares of the same row or column.
+
+    Parameters:
+        first (int): first square
+        second (int): second square
+
+    Returns:
+        squares (tuple): squares in between, from the first square to the second one
+    '''
+
+    first_row, first_col = first // COLS, first % COLS
+    second_row, second_col = second // COLS, second % COLS
+
+    if first == second or (first_row != second_row and first_col != second_col):
+        return ()
+
+    # Step along the row or the column towards the second square
+    step = (1 if second > first else -1) * (1 if first_row == second_row else COLS)
+
+    return tuple(range(first + step, second, step))
+
+SAME_LINE = [[bool(LINE_MASKS[first] & SQUARE_BITS[second]) for second in range(SQUARES)] for first in range(SQUARES)]
+BETWEEN_SQUARES = [[build_between(first, second) for second in range(SQUARES)] for first in range(SQUARES)]
+BETWEEN = [[sum(SQUARE_BITS[square] for square in squares) for squares in row] for row in BETWEEN_SQUARES]
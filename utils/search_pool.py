@@ -0,0 +1,50 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+def watch_parent(parent_pid):
+    '''
+    This function stops the worker process when its parent is gone. An agent that
+    overruns its time is killed by the game, and its pool workers would keep waiting
+    for tasks forever.
+
+    Parameters:
+        parent_pid (int): process id of the parent
+    '''
+
+    while os.getppid() == parent_pid:
+        time.sleep(0.5)
+
+    os._exit(0)
+
+def init_worker(parent_pid, initializer, initargs):
+    '''
+    This function initializes a worker process of the pool.
+
+    Parameters:
+        parent_pid (int): process id of the parent
+        initializer (function/None): initializer of the agent
+        initargs (tuple): arguments of the initializer
+    '''
+
+    threading.Thread(target=watch_parent, args=(parent_pid,), daemon=True).start()
+
+    if initializer is not None:
+        initializer(*initargs)
+
+def create_pool(workers, initializer=None, initargs=()):
+    '''
+    This function creates a process pool for a parallel search.
+
+    Parameters:
+        workers (int): number of worker processes
+        initializer (function/None): function to run in every worker when it starts
+        initargs (tuple): arguments of the initializer
+
+    Returns:
+        pool (ProcessPoolExecutor): the pool
+    '''
+
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                  initargs=(os.getpid(), initializer, initargs))
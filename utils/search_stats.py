@@ -0,0 +1,99 @@
+class SearchStats:
+    '''
+    This class counts what the search of one move did: the nodes (normal and companion),
+    the beta cutoffs, the transposition table probes and hits, and the moves of the
+    expanded nodes of every ply (for the branching factor).
+    '''
+
+    def __init__(self):
+        '''
+        This function initializes the counters.
+        '''
+
+        self.nodes = 0
+        self.normal_nodes = 0
+        self.companion_nodes = 0
+        self.cutoffs = 0
+        self.table_probes = 0
+        self.table_hits = 0
+        self.ply_nodes = [] # Expanded nodes of every ply
+        self.ply_moves = [] # Moves of the expanded nodes of every ply
+        self.solver = 'search' # Part of the agent that chose the move (search, endgame or book)
+        self.depth = 0 # Deepest finished search
+        self.elapsed = 0.0 # Time of the move in seconds
+
+    def count_node(self, choose_companion):
+        '''
+        This function counts a node of the search.
+
+        Parameters:
+            choose_companion (bool): flag to choose a companion card at the node
+        '''
+
+        self.nodes += 1
+
+        if choose_companion:
+            self.companion_nodes += 1
+
+        else:
+            self.normal_nodes += 1
+
+    def count_moves(self, ply, moves):
+        '''
+        This function counts the moves of an expanded node.
+
+        Parameters:
+            ply (int): distance of the node from the root
+            moves (int): number of moves of the node
+        '''
+
+        while len(self.ply_nodes) <= ply:
+            self.ply_nodes.append(0)
+            self.ply_moves.append(0)
+
+        self.ply_nodes[ply] += 1
+        self.ply_moves[ply] += moves
+
+    def merge(self, other):
+        '''
+        This function adds the counters of another search (e.g. of a process of the parallel search).
+
+        Parameters:
+            other (SearchStats): the other counters
+        '''
+
+        self.nodes += other.nodes
+        self.normal_nodes += other.normal_nodes
+        self.companion_nodes += other.companion_nodes
+        self.cutoffs += other.cutoffs
+        self.table_probes += other.table_probes
+        self.table_hits += other.table_hits
+
+        for _ in range(len(self.ply_nodes), len(other.ply_nodes)):
+            self.ply_nodes.append(0)
+            self.ply_moves.append(0)
+
+        for ply, (nodes, moves) in enumerate(zip(other.ply_nodes, other.ply_moves)):
+            self.ply_nodes[ply] += nodes
+            self.ply_moves[ply] += moves
+
+    def to_dict(self):
+        '''
+        This function gets the statistics of the move (as sent to the game engine).
+
+        Returns:
+            stats (dict): solver, depth, elapsed, nodes, nps, normal_nodes, companion_nodes,
+                cutoffs, table_probes, table_hits and branching (average moves of every ply)
+        '''
+
+        return {'solver': self.solver,
+                'depth': self.depth,
+                'elapsed': round(self.elapsed, 4),
+                'nodes': self.nodes,
+                'nps': round(self.nodes / self.elapsed) if self.elapsed > 0 else 0,
+                'normal_nodes': self.normal_nodes,
+                'companion_nodes': self.companion_nodes,
+                'cutoffs': self.cutoffs,
+                'table_probes': self.table_probes,
+                'table_hits': self.table_hits,
+                'branching': [round(moves / nodes, 2) for nodes, moves in zip(self.ply_nodes, self.ply_moves) if nodes]}
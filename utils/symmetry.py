@@ -0,0 +1,165 @@
+# Symmetries of the board (the dihedral group D4 of the square).
+# Rows and columns are mapped onto rows and columns and the squares between two
+# squares are mapped onto the squares between their images, so the rules (and the
+# winner of every position) do not change when a symmetry is applied to a position.
+#   SYMMETRIES[s][square]: image of a square under the symmetry s (0 is the identity)
+#   INVERSES[s]: the symmetry that undoes the symmetry s
+
+from bitboard import EMPTY
+from rules import ROWS, COLS, SQUARES, SQUARE_BITS
+
+def build_symmetry(transpose, flip_rows, flip_cols):
+    '''
+    This function builds the images of the squares under a symmetry.
+
+    Parameters:
+        transpose (bool): swap the rows and the columns (first)
+        flip_rows (bool): reverse the order of the rows
+        flip_cols (bool): reverse the order of the columns
+
+    Returns:
+        images (tuple): image of every square
+    '''
+
+    images = []
+
+    for square in range(SQUARES):
+        row, col = square // COLS, square % COLS
+
+        if transpose:
+            row, col = col, row
+
+        if flip_rows:
+            row = ROWS - 1 - row
+
+        if flip_cols:
+            col = COLS - 1 - col
+
+        images.append(row * COLS + col)
+
+    return tuple(images)
+
+SYMMETRIES = [build_symmetry(transpose, flip_rows, flip_cols) for transpose in (False, True) for flip_rows in (False, True) for flip_cols in (False, True)]
+INVERSES = [next(inverse for inverse, other in enumerate(SYMMETRIES) if all(other[image] == square for square, image in enumerate(symmetry))) for symmetry in SYMMETRIES]
+
+# Square of the original board shown on every square of the transformed board
+SOURCES = [tuple(SYMMETRIES[INVERSES[symmetry]]) for symmetry in range(len(SYMMETRIES))]
+
+def transform_move(move, symmetry):
+    '''
+    This function maps a move onto the transformed board.
+
+    Parameters:
+        move (int/list): normal move (location) or companion move (list)
+        symmetry (int): index of the symmetry
+
+    Returns:
+        move (int/list): the move on the transformed board
+    '''
+
+    images = SYMMETRIES[symmetry]
+
+    if isinstance(move, int):
+        return images[move]
+
+    # The choices of a companion move are locations, except the companion card that Jaqen removes
+    locations = [images[choice] for choice in move[1:] if isinstance(choice, int)]
+    others = [choice for choice in move[1:] if not isinstance(choice, int)]
+
+    # The two cards of Ramsay and Jaqen are in order, as in GameState.get_companion_moves
+    if move[0] in ('Ramsay', 'Jaqen'):
+        locations.sort()
+
+    return [move[0]] + locations + others
+
+def inverse_move(move, symmetry):
+    '''
+    This function maps a move of the transformed board back onto the original board
+    (e.g. a best move stored for the canonical position).
+
+    Parameters:
+        move (int/list): normal move (location) or companion move (list)
+        symmetry (int): index of the symmetry that made the transformed board
+
+    Returns:
+        move (int/list): the move on the original board
+    '''
+
+    return transform_move(move, INVERSES[symmetry])
+
+def transform_state(state, symmetry):
+    '''
+    This function applies a symmetry to a state. Only the board changes: the captured
+    cards, the banners, the companion cards and the turn are copied.
+
+    Parameters:
+        state (GameState): state of the game
+        symmetry (int): index of the symmetry
+
+    Returns:
+        state (GameState): the transformed state (a new object)
+    '''
+
+    transformed = state.copy()
+    sources = SOURCES[symmetry]
+
+    transformed.cells = [state.cells[source] for source in sources]
+    transformed.names = [state.names[source] for source in sources]
+    transformed.varys = SYMMETRIES[symmetry][state.varys]
+    transformed.houses = [0] * len(state.houses)
+
+    for square, house in enumerate(transformed.cells):
+        if house != EMPTY:
+            transformed.houses[house] |= SQUARE_BITS[square]
+
+    return transformed
+
+def canonical_board(board):
+    '''
+    This function finds the canonical form of a board: the smallest of its 8 images.
+
+    Parameters:
+        board (list): value of every square (e.g. house codes with a code for Varys)
+
+    Returns:
+        canonical (bytes): values of the squares of the canonical board
+        symmetry (int): index of the symmetry that maps the board onto the canonical board
+    '''
+
+    return min((bytes([board[source] for source in sources]), symmetry) for symmetry, sources in enumerate(SOURCES))
+
+def board_values(state):
+    '''
+    This function gets the value of every square of a state (as in endgame.position_key):
+    0 for an empty square, the house index plus one for a card, and one more for Varys.
+
+    Parameters:
+        state (GameState): state of the game
+
+    Returns:
+        board (list): value of every square
+    '''
+
+    board = [house + 1 for house in state.cells]
+    board[state.varys] = len(state.houses) + 1
+
+    return board
+
+def canonicalize(state):
+    '''
+    This function maps a state onto its canonical form. Positions that are symmetries of
+    each other have the same canonical form, so a cache (e.g. the endgame table or the
+    opening book) stores them once. The names of the cards do not matter for the rules.
+
+    Parameters:
+        state (GameState): state of the game
+
+    Returns:
+        state (GameState): the canonical state (a new object)
+        symmetry (int): index of the symmetry that maps the state onto the canonical state
+            (transform_move maps moves onto it and inverse_move maps them back)
+    '''
+
+    _, symmetry = canonical_board(board_values(state))
+
+    return transform_state(state, symmetry), symmetry
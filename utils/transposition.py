@@ -0,0 +1,267 @@
+import random
+
+from bitboard import SQUARES, HOUSES, HOUSE_INDEX, COMPANIONS
+
+MAX_COUNT = 24 # Highest number of captured cards of a house with its own key
+DEFAULT_SIZE_BITS = 18 # Default size of the transposition table (2 ** 18 entries)
+
+# Bound types of the stored scores
+EXACT = 0 # The score is exact
+LOWER_BOUND = 1 # The real score is at least the stored score (beta cutoff)
+UPPER_BOUND = 2 # The real score is at most the stored score (no move raised alpha)
+
+# Random keys (fixed seed, so keys are the same in every process)
+_generator = random.Random(0x5EED)
+
+CARD_KEYS = [[_generator.getrandbits(64) for _ in HOUSES] for _ in range(SQUARES)] # House card on a square
+VARYS_KEYS = [_generator.getrandbits(64) for _ in range(SQUARES)] # Varys on a square
+COUNT_KEYS = [[[_generator.getrandbits(64) for _ in range(MAX_COUNT + 1)] for _ in HOUSES] for _ in range(2)] # Captured cards of a house
+BANNER_KEYS = [[_generator.getrandbits(64) for _ in HOUSES] for _ in range(2)] # Banner of a house
+COMPANION_KEYS = {companion: _generator.getrandbits(64) for companion in COMPANIONS} # Remaining companion card
+SIDE_KEY = _generator.getrandbits(64) # Player 2 is to move
+CHOOSE_COMPANION_KEY = _generator.getrandbits(64) # A companion card must be chosen
+
+def card_key(house, location):
+    '''
+    This function gets the key of a card on a square.
+
+    Parameters:
+        house (str): house of the card ('No House' for Varys)
+        location (int): location of the card
+
+    Returns:
+        key (int): key of the card
+    '''
+
+    if house in HOUSE_INDEX:
+        return CARD_KEYS[location][HOUSE_INDEX[house]]
+
+    return VARYS_KEYS[location]
+
+def count_key(player_index, house, count):
+    '''
+    This function gets the key of the number of captured cards of a house.
+
+    Parameters:
+        player_index (int): 0 for player 1, 1 for player 2
+        house (str): house of the cards
+        count (int): number of captured cards
+
+    Returns:
+        key (int): key of the count
+    '''
+
+    return COUNT_KEYS[player_index][HOUSE_INDEX[house]][min(count, MAX_COUNT)]
+
+class ZobristHasher:
+    '''
+    This class keeps the Zobrist key of a search state (cards, captured cards, banners
+    and remaining companions) up to date while the search makes and unmakes moves.
+    '''
+
+    def __init__(self, cards, player1, player2, companion_cards):
+        '''
+        This function computes the key of the state from scratch.
+
+        Parameters:
+            cards (list): list of Card objects
+            player1 (Player): player 1
+            player2 (Player): player 2
+            companion_cards (dict): dictionary of remaining companion cards
+        '''
+
+        self.players = (player1, player2)
+
+        key = 0
+
+        for card in cards:
+            key ^= card_key(card.get_house(), card.get_location())
+
+        for index, player in enumerate(self.players):
+            player_cards = player.get_cards()
+            player_banners = player.get_banners()
+
+            for house in HOUSES:
+                key ^= count_key(index, house, len(player_cards[house]))
+
+                if player_banners[house]:
+                    key ^= BANNER_KEYS[index][HOUSE_INDEX[house]]
+
+        for companion in companion_cards:
+            key ^= COMPANION_KEYS[companion]
+
+        self.key = key
+
+    def position_key(self, maximizing_player, choose_companion):
+        '''
+        This function gets the key of the position including who is to move.
+
+        Parameters:
+            maximizing_player (bool): True if player 1 is to move
+            choose_companion (bool): flag to choose a companion card
+
+        Returns:
+            key (int): key of the position
+        '''
+
+        key = self.key
+
+        if not maximizing_player:
+            key ^= SIDE_KEY
+
+        if choose_companion:
+            key ^= CHOOSE_COMPANION_KEY
+
+        return key
+
+    def update(self, record, companion_cards):
+        '''
+        This function updates the key after a move from the move's undo record
+        (as pushed by the make_*_reversible functions of the agents).
+
+        Parameters:
+            record (dict): undo record of the move that has just been made
+            companion_cards (dict): dictionary of companion cards after the move
+        '''
+
+        record['key'] = self.key # Remember the key for the undo
+
+        key = self.key
+
+        # Cards removed from the board
+        for _, card in record['removed']:
+            key ^= card_key(card.get_house(), card.get_location())
+
+        # Cards that changed location (a removed card keeps its last location)
+        for card, old_location in record['moved']:
+            house = card.get_house()
+            key ^= card_key(house, old_location) ^ card_key(house, card.get_location())
+
+        # Captured cards of the player
+        if record['added']:
+            index = 0 if record['player'] is self.players[0] else 1
+            player_cards = record['player'].get_cards()
+
+            for house in set(record['added']):
+                count = len(player_cards[house])
+                key ^= count_key(index, house, count) ^ count_key(index, house, count - record['added'].count(house))
+
+        # Banners that changed hands
+        for player, house, _ in record['banners']:
+            key ^= BANNER_KEYS[0 if player is self.players[0] else 1][HOUSE_INDEX[house]]
+
+        # Companion cards that were used or removed
+        if record['companions'] is not None:
+            for companion, _ in record['companions']:
+                if companion not in companion_cards:
+                    key ^= COMPANION_KEYS[companion]
+
+        self.key = key
+
+    def restore(self, record):
+        '''
+        This function restores the key after a move has been undone.
+
+        Parameters:
+            record (dict): undo record of the move that has been undone
+        '''
+
+        self.key = record['key']
+
+class TranspositionTable:
+    '''
+    This class is a fixed-size transposition table. Every slot holds one entry
+    (key, depth, score, bound type, best move, search generation). A new entry
+    replaces an old one when the slot is empty, has the same key, was stored in
+    an older search, or was searched to a lower or equal depth.
+    '''
+
+    def __init__(self, size_bits=DEFAULT_SIZE_BITS):
+        '''
+        This function initializes the table.
+
+        Parameters:
+            size_bits (int): the table has 2 ** size_bits slots
+        '''
+
+        self.mask = (1 << size_bits) - 1
+        self.entries = [None] * (1 << size_bits)
+        self.generation = 0
+
+        # Statistics
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.rejected = 0
+
+    def new_search(self):
+        '''
+        This function starts a new search (entries of older searches become replaceable).
+        '''
+
+        self.generation += 1
+
+    def probe(self, key):
+        '''
+        This function looks up a position.
+
+        Parameters:
+            key (int): key of the position
+
+        Returns:
+            entry (tuple/None): (key, depth, score, bound, move, generation) or None if not found
+        '''
+
+        self.probes += 1
+
+        entry = self.entries[key & self.mask]
+
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        '''
+        This function stores the result of a search.
+
+        Parameters:
+            key (int): key of the position
+            depth (int): remaining depth of the search
+            score (float): score of the position
+            bound (int): EXACT, LOWER_BOUND or UPPER_BOUND
+            move (int/list): best move found (None if unknown)
+        '''
+
+        index = key & self.mask
+        entry = self.entries[index]
+
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.entries[index] = (key, depth, score, bound, move, self.generation)
+            self.stores += 1
+
+        else:
+            self.rejected += 1
+
+    def clear(self):
+        '''
+        This function removes every entry and resets the statistics.
+        '''
+
+        self.entries = [None] * len(self.entries)
+        self.probes = self.hits = self.stores = self.rejected = 0
+
+    def get_stats(self):
+        '''
+        This function gets the statistics of the table.
+
+        Returns:
+            stats (dict): probes, hits, hit rate, stores and rejected stores
+        '''
+
+        return {'probes': self.probes,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.probes if self.probes else 0.0,
+                'stores': self.stores,
+                'rejected': self.rejected}